@@ -0,0 +1,63 @@
+from __future__ import annotations
+from typing import Dict, List
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures the wall-clock cost of importing chiquito modules in a fresh interpreter, which is what
+# short-lived CLI invocations and spawned worker processes pay. The cost of starting an empty
+# interpreter is subtracted.
+
+MODULES = ["chiquito.dsl", "chiquito.cb", "chiquito.util"]
+
+
+def run(statement: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(module: str, top: int) -> List[Dict]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imports.append({"module": name.strip(), "cumulative_us": int(cumulative)})
+    imports.sort(key=lambda entry: entry["cumulative_us"], reverse=True)
+    return imports[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run("pass") for _ in range(args.repeat))
+    results = {"python": sys.version, "baseline_s": baseline, "modules": {}}
+    for module in MODULES:
+        seconds = statistics.median(run(f"import {module}") for _ in range(args.repeat))
+        results["modules"][module] = {
+            "import_s": seconds - baseline,
+            "slowest_imports": slowest_imports(module, args.top),
+        }
+        print(f"{module}: {(seconds - baseline) * 1000:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
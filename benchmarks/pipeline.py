@@ -0,0 +1,363 @@
+from __future__ import annotations
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional
+from time import perf_counter
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+from chiquito.util import F, SCALAR_MODULUS
+from chiquito.chiquito_ast import Last
+from chiquito.prover import PLACEMENT_STRATEGIES, Layout
+
+# Times each phase of the pipeline (setup, trace, serialization, Rust compilation, mock proving and
+# optionally key generation, proving and verification) for the Fibonacci circuit and for synthetic
+# circuits, sweeping num_steps over powers of two. Every (circuit, num_steps) case runs in a fresh
+# interpreter, so that ru_maxrss is the peak resident memory of that case alone.
+
+
+class FiboFirstStep(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a, 1))
+        self.constr(eq(self.circuit.b, 1))
+        self.constr(eq(self.circuit.a + self.circuit.b, self.c))
+        self.transition(eq(self.circuit.b, self.circuit.a.next()))
+        self.transition(eq(self.c, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+    def wg(self, args):
+        a_value, b_value, n_value = args
+        self.assign(self.circuit.a, F(a_value))
+        self.assign(self.circuit.b, F(b_value))
+        self.assign(self.c, F((a_value + b_value) % SCALAR_MODULUS))
+        self.assign(self.circuit.n, F(n_value))
+
+
+class FiboStep(FiboFirstStep):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a + self.circuit.b, self.c))
+        self.transition(eq(self.circuit.b, self.circuit.a.next()))
+        self.transition(eq(self.c, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+
+class Padding(StepType):
+    def setup(self):
+        self.transition(eq(self.circuit.b, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+    def wg(self, args):
+        a_value, b_value, n_value = args
+        self.assign(self.circuit.a, F(a_value))
+        self.assign(self.circuit.b, F(b_value))
+        self.assign(self.circuit.n, F(n_value))
+
+
+# Same circuit as examples/fibonacci.py, with a configurable number of steps. Values are reduced
+# modulo SCALAR_MODULUS, the field the circuit is proved over, so that large traces don't build
+# huge integers. `F` arithmetic would reduce them modulo the base field, which breaks a + b = c
+# once the values exceed the scalar field.
+class Fibonacci(Circuit):
+    def __init__(self, num_steps: int):
+        self.num_steps = num_steps
+        super().__init__()
+
+    def setup(self):
+        self.a = self.forward("a")
+        self.b = self.forward("b")
+        self.n = self.forward("n")
+
+        self.fibo_first_step = self.step_type(FiboFirstStep(self, "fibo_first_step"))
+        self.fibo_step = self.step_type(FiboStep(self, "fibo_step"))
+        self.padding = self.step_type(Padding(self, "padding"))
+
+        self.pragma_num_steps(self.num_steps)
+        self.pragma_first_step(self.fibo_first_step)
+        self.pragma_last_step(self.padding)
+
+        self.expose(self.b, Last())
+        self.expose(self.n, Last())
+
+    def trace(self, n):
+        self.add(self.fibo_first_step, (1, 1, n))
+        a = 1
+        b = 2
+        for i in range(1, n):
+            self.add(self.fibo_step, (a, b, n))
+            (a, b) = (b, (a + b) % SCALAR_MODULUS)
+        while self.needs_padding():
+            self.add(self.padding, (a, b, n))
+
+    def trace_args(self):
+        return self.num_steps - 1
+
+
+# Every step type constrains `degree`-fold products of the forward signals against its internal
+# signals, and every forward signal increments by one on each step. Step types are used round-robin.
+class SyntheticStep(StepType):
+    def setup(self):
+        signals = self.circuit.signals
+        self.products = []
+        for i in range(len(signals)):
+            product = self.internal(f"p{i}")
+            factors = [
+                signals[(i + j) % len(signals)] for j in range(self.circuit.degree)
+            ]
+            expr = factors[0]
+            for factor in factors[1:]:
+                expr = expr * factor
+            self.constr(eq(expr, product))
+            self.transition(eq(signals[i] + 1, signals[i].next()))
+            self.products.append((product, factors))
+
+    def wg(self, step):
+        values = {}
+        for i, signal in enumerate(self.circuit.signals):
+            values[signal] = F(step + i)
+            self.assign(signal, values[signal])
+        for product, factors in self.products:
+            value = F(1)
+            for factor in factors:
+                value = value * values[factor]
+            self.assign(product, value)
+
+
+class Synthetic(Circuit):
+    def __init__(self, num_steps: int, step_types: int, signals: int, degree: int):
+        self.num_steps = num_steps
+        self.num_step_types = step_types
+        self.num_signals = signals
+        self.degree = degree
+        super().__init__()
+
+    def setup(self):
+        self.signals = [self.forward(f"s{i}") for i in range(self.num_signals)]
+        self.synthetic_steps = [
+            self.step_type(SyntheticStep(self, f"synthetic_step_{i}"))
+            for i in range(self.num_step_types)
+        ]
+        self.pragma_num_steps(self.num_steps)
+
+    def trace(self, num_steps):
+        for step in range(num_steps):
+            self.add(self.synthetic_steps[step % len(self.synthetic_steps)], step)
+
+    def trace_args(self):
+        return self.num_steps
+
+
+# Setup and trace always run; these phases are optional.
+PHASES = ["serialize", "compile", "mock_prove", "prove"]
+DEFAULT_PHASES = ["serialize", "compile", "mock_prove"]
+
+
+def run_case(args) -> Dict:
+    num_steps = 2**args.log2_steps
+    if args.circuit == "fibonacci":
+        new_circuit = lambda: Fibonacci(num_steps)
+    else:
+        new_circuit = lambda: Synthetic(
+            num_steps, args.step_types, args.signals, args.degree
+        )
+    phases = set(args.phases)
+    timings: Dict[str, float] = {}
+    python_peak_bytes: Dict[str, int] = {}
+    sizes: Dict[str, int] = {}
+
+    def timed(phase: str, run: Callable):
+        if args.tracemalloc:
+            tracemalloc.start()
+        start = perf_counter()
+        result = run()
+        timings[phase] = perf_counter() - start
+        if args.tracemalloc:
+            python_peak_bytes[phase] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+    # Imports py_ecc, which would otherwise be attributed to setup.
+    F(0)
+    circuit = timed("setup", new_circuit)
+    circuit.set_placement(args.placement, args.max_width)
+    witness = timed("trace", lambda: circuit.gen_witness(circuit.trace_args()))
+    stats = circuit.stats()
+    if "serialize" in phases:
+        ast_json = timed("serialize_ast", circuit.get_ast_json)
+        compact_ast_json = timed("serialize_compact_ast", circuit.get_compact_ast_json)
+        witness_json = timed("serialize_witness", witness.get_witness_json)
+        sizes["ast_json_bytes"] = len(ast_json)
+        sizes["compact_ast_json_bytes"] = len(compact_ast_json)
+        sizes["witness_json_bytes"] = len(witness_json)
+        del ast_json, compact_ast_json, witness_json
+    rust_timings: Optional[Dict[str, float]] = None
+    layout: Optional[Layout] = None
+    if "compile" in phases:
+        timed("compile", circuit.get_rust_ast_id)
+        layout = circuit.layout()
+    if "mock_prove" in phases:
+        result = timed("mock_prove", lambda: circuit.halo2_mock_prover(witness))
+        # Cases must be valid witnesses, otherwise proving below would time an invalid proof.
+        assert result, f"Mock prover failed: {result}"
+        rust_timings = result.timings
+    if "prove" in phases:
+        layout = circuit.layout()
+        k = args.k if args.k is not None else layout.k
+        timed("setup_keys", lambda: circuit.setup_keys(k, args.cache_dir))
+        proof = timed("prove", lambda: circuit.prove(witness))
+        instances = circuit.instances(witness)
+        if not timed("verify", lambda: circuit.verify(proof, instances)):
+            raise ValueError("Proof verification failed.")
+        sizes["proof_bytes"] = len(proof)
+
+    return {
+        "circuit": args.circuit,
+        "num_steps": num_steps,
+        "timings_s": timings,
+        "rust_timings_s": rust_timings,
+        "python_peak_bytes": python_peak_bytes if args.tracemalloc else None,
+        # Kilobytes on Linux, bytes on macOS.
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "sizes": sizes,
+        # Inputs of the cost model fitted by `Circuit.stats(benchmark=...)`, from the compiled
+        # layout when available.
+        "stats": {
+            "columns": stats.columns() if layout is None else layout.columns(),
+            "advice_columns": stats.advice_columns,
+            "fixed_columns": stats.fixed_columns,
+            "max_gate_degree": stats.max_gate_degree,
+            "rows": stats.rows if layout is None else layout.rows,
+            "k": stats.k if layout is None else layout.k,
+        },
+        "layout": None if layout is None else asdict(layout),
+    }
+
+
+def case_command(args, circuit: str, log2_steps: int) -> List[str]:
+    command = [
+        sys.executable,
+        __file__,
+        "--case",
+        "--circuit",
+        circuit,
+        "--log2-steps",
+        str(log2_steps),
+        "--step-types",
+        str(args.step_types),
+        "--signals",
+        str(args.signals),
+        "--degree",
+        str(args.degree),
+        "--placement",
+        args.placement,
+        "--phases",
+        *args.phases,
+    ]
+    if args.max_width is not None:
+        command.extend(["--max-width", str(args.max_width)])
+    if args.tracemalloc:
+        command.append("--tracemalloc")
+    if args.k is not None:
+        command.extend(["--k", str(args.k)])
+    if args.cache_dir is not None:
+        command.extend(["--cache-dir", args.cache_dir])
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--circuits", nargs="+", default=["fibonacci", "synthetic"])
+    parser.add_argument("--min-log2-steps", type=int, default=8)
+    parser.add_argument("--max-log2-steps", type=int, default=20)
+    parser.add_argument("--step-types", type=int, default=4)
+    parser.add_argument("--signals", type=int, default=8)
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--phases", nargs="+", choices=PHASES, default=DEFAULT_PHASES)
+    parser.add_argument(
+        "--placement", choices=PLACEMENT_STRATEGIES, default="single_row"
+    )
+    parser.add_argument("--max-width", type=int, help="for --placement max_width")
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="record the Python peak memory of each phase (slows the phases down)",
+    )
+    parser.add_argument("--k", type=int, help="k for key generation and proving")
+    parser.add_argument("--cache-dir", help="key cache directory")
+    parser.add_argument("--timeout", type=float, help="seconds per case")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    # Internal: run a single case in this process and print its result as JSON.
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--circuit", help=argparse.SUPPRESS)
+    parser.add_argument("--log2-steps", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args)))
+        return
+
+    results = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "parameters": {
+            "step_types": args.step_types,
+            "signals": args.signals,
+            "degree": args.degree,
+            "placement": args.placement,
+            "max_width": args.max_width,
+            "phases": args.phases,
+        },
+        "cases": [],
+    }
+    for circuit in args.circuits:
+        for log2_steps in range(args.min_log2_steps, args.max_log2_steps + 1):
+            try:
+                completed = subprocess.run(
+                    case_command(args, circuit, log2_steps),
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                    timeout=args.timeout,
+                )
+            except subprocess.TimeoutExpired:
+                print(f"{circuit} 2^{log2_steps}: timed out")
+                results["cases"].append(
+                    {
+                        "circuit": circuit,
+                        "num_steps": 2**log2_steps,
+                        "error": "timeout",
+                    }
+                )
+                continue
+            except subprocess.CalledProcessError as e:
+                print(f"{circuit} 2^{log2_steps}: failed\n{e.stderr}")
+                results["cases"].append(
+                    {
+                        "circuit": circuit,
+                        "num_steps": 2**log2_steps,
+                        "error": e.stderr,
+                    }
+                )
+                continue
+            case = json.loads(completed.stdout.splitlines()[-1])
+            results["cases"].append(case)
+            timings_str = ", ".join(
+                f"{phase}={seconds:.3f}s"
+                for (phase, seconds) in case["timings_s"].items()
+            )
+            print(f"{circuit} 2^{log2_steps}: {timings_str}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
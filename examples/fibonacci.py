@@ -82,4 +82,4 @@ class Fibonacci(Circuit):
 
 fibo = Fibonacci()
 fibo_witness = fibo.gen_witness(7)
-fibo.halo2_mock_prover(fibo_witness)
+print(fibo.halo2_mock_prover(fibo_witness))
@@ -1,10 +1,13 @@
 from __future__ import annotations
+from collections import Counter
 from typing import Callable, List, Dict, Optional, Tuple
 from dataclasses import dataclass, field, asdict
+import hashlib
+import json
 
 from chiquito.wit_gen import FixedGenContext
-from chiquito.expr import Expr
-from chiquito.util import uuid
+from chiquito.expr import Expr, bind_params
+from chiquito.util import uuid, CustomEncoder, F
 from chiquito.query import Queriable
 
 
@@ -42,7 +45,7 @@ class ASTCircuit:
     last_step: Optional[int] = None
     num_steps: int = 0
     q_enable: bool = True
-    id: int = uuid()
+    id: int = field(default_factory=uuid)
 
     def __str__(self: ASTCircuit):
         step_types_str = (
@@ -116,6 +119,96 @@ class ASTCircuit:
             "id": self.id,
         }
 
+    # Signal and step type UUIDs differ on every run, so they are replaced by their order of
+    # appearance before hashing. Equal circuit definitions get equal fingerprints across runs.
+    def fingerprint(self: ASTCircuit) -> str:
+        ast_json = json.loads(json.dumps(self, cls=CustomEncoder))
+        del ast_json["id"]
+        ids: Dict[int, int] = {}
+
+        def canonical_id(value: int) -> int:
+            return ids.setdefault(value, len(ids))
+
+        for step_type in self.step_types.values():
+            canonical_id(step_type.id)
+            for signal in step_type.signals:
+                canonical_id(signal.id)
+        for signal in self.forward_signals + self.shared_signals + self.fixed_signals:
+            canonical_id(signal.id)
+
+        def canonicalize(value):
+            if isinstance(value, dict):
+                return {
+                    str(ids.get(int(k), k)) if k.isdigit() else k: canonicalize(v)
+                    for k, v in value.items()
+                }
+            elif isinstance(value, list):
+                return [canonicalize(v) for v in value]
+            elif isinstance(value, int) and not isinstance(value, bool):
+                return ids.get(value, value)
+            return value
+
+        canonical_json = json.dumps(canonicalize(ast_json), sort_keys=True)
+        return hashlib.sha256(canonical_json.encode()).hexdigest()
+
+    # Merges step types that are identical up to names: the same constraints and transition
+    # constraints over the same forward, shared and fixed signals, with internal signals matched
+    # by position. Every step type gets its own selector column and gates, so this shrinks
+    # circuits built from many copies of a step type (lanes, rounds). Merged step types take the
+    # id of the kept step type of their group and their internal signals take its signal ids, in
+    # place, so `StepType` objects keep generating valid witnesses. Instances of a template share
+    # their signals and annotations, so renaming one would rename all of them: a group keeps its
+    # first template instance if it has one, and instances of other templates are only merged
+    # into an instance sharing their signals. Must run before any witness is generated. Returns
+    # {merged step type id: kept step type id}.
+    def dedup_step_types(self: ASTCircuit) -> Dict[int, int]:
+        merged: Dict[int, int] = {}
+        # Counted before merging, merged instances still use the storage.
+        owners = Counter(id(st.signals) for st in self.step_types.values())
+        shared = lambda step_type: (
+            len(step_type.signals) > 0 and owners[id(step_type.signals)] > 1
+        )
+        while True:
+            groups: Dict[str, List[ASTStepType]] = {}
+            for step_type in self.step_types.values():
+                groups.setdefault(step_type.structure(), []).append(step_type)
+            duplicates: List[Tuple[ASTStepType, ASTStepType]] = []
+            for group in groups.values():
+                kept = next(filter(shared, group), group[0])
+                kept_by_signals = {id(kept.signals): kept}
+                for step_type in group:
+                    if shared(step_type):
+                        target = kept_by_signals.setdefault(
+                            id(step_type.signals), step_type
+                        )
+                    else:
+                        target = kept
+                    if target is not step_type:
+                        duplicates.append((step_type, target))
+            if not duplicates:
+                return merged
+
+            for step_type, kept in duplicates:
+                merged_id = step_type.id
+                for signal, kept_signal in zip(step_type.signals, kept.signals):
+                    # Instances of the same template share their signals.
+                    if signal is kept_signal:
+                        continue
+                    step_type.annotations.pop(signal.id, None)
+                    signal.id = kept_signal.id
+                    step_type.annotations[signal.id] = kept.annotations[signal.id]
+                step_type.id = kept.id
+                del self.step_types[merged_id]
+                self.annotations.pop(merged_id, None)
+                if self.first_step == merged_id:
+                    self.first_step = kept.id
+                if self.last_step == merged_id:
+                    self.last_step = kept.id
+                for previous, kept_id in merged.items():
+                    if kept_id == merged_id:
+                        merged[previous] = kept.id
+                merged[merged_id] = kept.id
+
     def add_forward(self: ASTCircuit, name: str, phase: int) -> ForwardSignal:
         signal = ForwardSignal(phase, name)
         self.forward_signals.append(signal)
@@ -174,6 +267,9 @@ class ASTStepType:
     constraints: List[ASTConstraint]
     transition_constraints: List[TransitionConstraint]
     annotations: Dict[int, str]
+    # Values of the `Param`s in the constraints, for instances of step type templates. Instances
+    # of the same template share their signal, constraint and annotation containers.
+    params: Dict[str, F] = field(default_factory=dict)
 
     def new(name: str) -> ASTStepType:
         return ASTStepType(uuid(), name, [], [], [], {})
@@ -224,13 +320,51 @@ class ASTStepType:
             "id": self.id,
             "name": self.name,
             "signals": [x.__json__() for x in self.signals],
-            "constraints": [x.__json__() for x in self.constraints],
+            "constraints": [
+                {"annotation": x.annotation, "expr": self.expr_json(x.expr)}
+                for x in self.constraints
+            ],
             "transition_constraints": [
-                x.__json__() for x in self.transition_constraints
+                {"annotation": x.annotation, "expr": self.expr_json(x.expr)}
+                for x in self.transition_constraints
             ],
             "annotations": self.annotations,
         }
 
+    def expr_json(self: ASTStepType, expr: Expr):
+        if self.params:
+            expr = bind_params(expr, self.params)
+        return expr.__json__()
+
+    # Constraint expressions without annotations, with internal signals replaced by their
+    # position. Equal for step types that only differ in names and UUIDs of internal signals.
+    def structure(self: ASTStepType) -> str:
+        positions = {signal.id: i for i, signal in enumerate(self.signals)}
+
+        def canonicalize(value):
+            if isinstance(value, dict):
+                if "id" in value:
+                    signal_id = value["id"]
+                    if signal_id in positions:
+                        return f"internal {positions[signal_id]}"
+                    return signal_id
+                return {k: canonicalize(v) for k, v in value.items()}
+            elif isinstance(value, list):
+                return [canonicalize(v) for v in value]
+            return value
+
+        return json.dumps(
+            [
+                len(self.signals),
+                [canonicalize(self.expr_json(c.expr)) for c in self.constraints],
+                [
+                    canonicalize(self.expr_json(c.expr))
+                    for c in self.transition_constraints
+                ],
+            ],
+            cls=CustomEncoder,
+        )
+
     def add_signal(self: ASTStepType, name: str) -> InternalSignal:
         signal = InternalSignal(name)
         self.signals.append(signal)
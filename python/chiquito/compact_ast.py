@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+
+from chiquito.expr import Expr, Const, Sum, Mul, Neg, Pow, Param
+from chiquito.query import Internal, Forward, Shared, Fixed, StepTypeNext
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit
+
+# Compact AST export, read by `compact_ast_to_halo2` (src/compact.rs). Strings are interned in a
+# string table and signals are referenced by their index in a signal table, instead of repeating
+# the full signal at every query:
+#
+#     {
+#         "strings": [string, ...],
+#         "signals": [[kind, id, phase, name], ...],
+#         "step_types": [
+#             [id, name, [signal, ...], constraints, transition constraints, params], ...
+#         ],
+#         "forward_signals": [signal, ...], "shared_signals": [...], "fixed_signals": [...],
+#         "exposed": [[signal, rotation, offset], ...],
+#         "annotations": [[id, string], ...],
+#         "first_step": step type or null, "last_step": ..., "num_steps": N, "q_enable": bool,
+#         "id": id,
+#     }
+#
+# Signal kinds are "f" (forward), "s" (shared), "x" (fixed) and "i" (internal); names and
+# annotations are string indexes, and `signal` and `step type` are table indexes. Constraints are
+# [[annotation, expr], ...] and expressions are {"k": small int}, {"c": [4 limbs]}, {"+": [...]},
+# {"*": [...]}, {"-": expr}, {"^": [expr, pow]}, {"q": [signal, rotation]}, {"n": step type} or
+# {"p": name}. Annotations of signals and step types are rebuilt from their names, so
+# "annotations" only lists circuit annotations that differ from them.
+#
+# Instances of a step type template share their constraints: the first instance in the table
+# encodes them with parameters unbound, and the others have its step type index instead of both
+# constraint lists. `params` binds the parameters of each instance, [[name, const expr], ...].
+
+SMALL_CONST_BOUND = 2**64
+
+
+class CompactEncoder:
+    def __init__(self: CompactEncoder, ast: ASTCircuit):
+        self.strings: List[str] = []
+        self.string_indexes: Dict[str, int] = {}
+        self.signals: List[List[Any]] = []
+        self.signal_indexes: Dict[int, int] = {}
+        self.step_type_indexes = {
+            step_type_id: i for i, step_type_id in enumerate(ast.step_types)
+        }
+
+    def string(self: CompactEncoder, value: str) -> int:
+        index = self.string_indexes.get(value)
+        if index is None:
+            index = self.string_indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def signal(self: CompactEncoder, kind: str, signal: Any) -> int:
+        index = self.signal_indexes.get(signal.id)
+        if index is None:
+            index = self.signal_indexes[signal.id] = len(self.signals)
+            self.signals.append(
+                [
+                    kind,
+                    signal.id,
+                    getattr(signal, "phase", 0),
+                    self.string(signal.annotation),
+                ]
+            )
+        return index
+
+    def query(self: CompactEncoder, queriable: Any) -> Tuple[int, int]:
+        match queriable:
+            case Internal():
+                return (self.signal_indexes[queriable.signal.id], 0)
+            case Forward() | Shared() | Fixed():
+                return (
+                    self.signal_indexes[queriable.signal.id],
+                    int(queriable.rotation),
+                )
+            case _:
+                raise TypeError(f"Cannot encode {type(queriable).__name__}.")
+
+    def expr(self: CompactEncoder, expr: Expr) -> Dict:
+        match expr:
+            case Const(value):
+                if value.n < SMALL_CONST_BOUND:
+                    return {"k": value.n}
+                return {"c": value.__json__()}
+            case Sum(exprs):
+                return {"+": [self.expr(sub_expr) for sub_expr in exprs]}
+            case Mul(exprs):
+                return {"*": [self.expr(sub_expr) for sub_expr in exprs]}
+            case Neg(sub_expr):
+                return {"-": self.expr(sub_expr)}
+            case Pow(sub_expr, pow):
+                return {"^": [self.expr(sub_expr), pow]}
+            case Param(name):
+                return {"p": self.string(name)}
+            case StepTypeNext():
+                return {"n": self.step_type_indexes[expr.step_type.id]}
+            case _:
+                return {"q": list(self.query(expr))}
+
+    def constraints(self: CompactEncoder, constraints: List) -> List[List[Any]]:
+        return [
+            [self.string(constraint.annotation), self.expr(constraint.expr)]
+            for constraint in constraints
+        ]
+
+    def params(self: CompactEncoder, params: Dict) -> List[List[Any]]:
+        return [
+            [self.string(name), self.expr(Const(value))]
+            for name, value in params.items()
+        ]
+
+
+def compact_ast(ast: ASTCircuit) -> Dict:
+    encoder = CompactEncoder(ast)
+    forward_signals = [encoder.signal("f", s) for s in ast.forward_signals]
+    shared_signals = [encoder.signal("s", s) for s in ast.shared_signals]
+    fixed_signals = [encoder.signal("x", s) for s in ast.fixed_signals]
+    step_type_signals = [
+        [encoder.signal("i", s) for s in step_type.signals]
+        for step_type in ast.step_types.values()
+    ]
+    # {(constraints, transition constraints) containers: index of their first step type}
+    first_owners: Dict[Tuple[int, int], int] = {}
+    step_types = []
+    for index, (step_type, signals) in enumerate(
+        zip(ast.step_types.values(), step_type_signals)
+    ):
+        owner = first_owners.setdefault(
+            (id(step_type.constraints), id(step_type.transition_constraints)), index
+        )
+        if owner == index:
+            constraints = encoder.constraints(step_type.constraints)
+            transition_constraints = encoder.constraints(
+                step_type.transition_constraints
+            )
+        else:
+            (constraints, transition_constraints) = (owner, owner)
+        step_types.append(
+            [
+                step_type.id,
+                encoder.string(step_type.name),
+                signals,
+                constraints,
+                transition_constraints,
+                encoder.params(step_type.params),
+            ]
+        )
+
+    derived = {
+        signal.id: signal.annotation
+        for signal in ast.forward_signals + ast.shared_signals + ast.fixed_signals
+    }
+    derived.update(
+        (step_type.id, step_type.name) for step_type in ast.step_types.values()
+    )
+    annotations = [
+        [annotated_id, encoder.string(annotation)]
+        for annotated_id, annotation in ast.annotations.items()
+        if derived.get(annotated_id) != annotation
+    ]
+    step_type_indexes = encoder.step_type_indexes
+
+    return {
+        "strings": encoder.strings,
+        "signals": encoder.signals,
+        "step_types": step_types,
+        "forward_signals": forward_signals,
+        "shared_signals": shared_signals,
+        "fixed_signals": fixed_signals,
+        "exposed": [
+            [*encoder.query(queriable), offset.__json__()]
+            for (queriable, offset) in ast.exposed
+        ],
+        "annotations": annotations,
+        "first_step": step_type_indexes.get(ast.first_step),
+        "last_step": step_type_indexes.get(ast.last_step),
+        "num_steps": ast.num_steps,
+        "q_enable": ast.q_enable,
+        "id": ast.id,
+    }
@@ -1,14 +1,55 @@
 from __future__ import annotations
+from collections import OrderedDict
 from enum import Enum
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Iterable, List, Optional, Tuple
+from time import perf_counter_ns
 import json
+import os
+import pickle
 
 from chiquito.chiquito_ast import ASTCircuit, ASTStepType, ExposeOffset
+from chiquito.expr import Param
 from chiquito.query import Internal, Forward, Queriable, Shared, Fixed
-from chiquito.wit_gen import FixedGenContext, StepInstance, TraceWitness
+from chiquito.wit_gen import (
+    DeferredAssignment,
+    FixedGenContext,
+    ResumePoint,
+    StepInstance,
+    TraceWitness,
+)
+from chiquito.compact_ast import compact_ast
 from chiquito.cb import Constraint, Typing, ToConstraint, to_constraint
-from chiquito.util import CustomEncoder, F
-from chiquito.rust_chiquito import ast_to_halo2, halo2_mock_prover
+from chiquito.util import (
+    CustomEncoder,
+    F,
+    default_cache_dir,
+    from_limbs,
+    to_field_column,
+    uuid,
+)
+from chiquito.prover import (
+    PLACEMENT_STRATEGIES,
+    Layout,
+    MockProverResult,
+    RustCircuit,
+    resolved,
+)
+from chiquito.equivalence import (
+    DEFAULT_POINTS,
+    EquivalenceReport,
+    check_equivalence,
+)
+from chiquito.solver import WitnessSolver
+from chiquito.memory import MemoryReport, ast_memory_report
+from chiquito.stats import CircuitStats, circuit_stats, fit_cost_model, predict
+from chiquito.witness_cache import WitnessCache
+from chiquito.witness_file import WitnessFile, WitnessFileTrace, WitnessFileWriter
+from chiquito import tracing
+
+
+# Prefix of `Circuit.freeze` snapshots, bumped whenever the pickled layout of `Circuit`,
+# `StepType` or the AST changes.
+SNAPSHOT_HEADER = b"CHIQUITO_SNAPSHOT_3\n"
 
 
 class CircuitMode(Enum):
@@ -21,9 +62,18 @@ class Circuit:
     def __init__(self: Circuit):
         self.ast = ASTCircuit()
         self.witness = TraceWitness()
-        self.rust_ast_id = 0
+        self.rust_circuit: Optional[RustCircuit] = None
+        self.placement: Tuple[str, Optional[int]] = ("single_row", None)
+        self.dedup_step_types = False
+        # {merged step type id: kept step type id}, see `pragma_dedup_step_types`.
+        self.merged_step_types: Dict[int, int] = {}
+        # First instance of each `StepTypeTemplate` subclass, which owns its definition.
+        self.templates: Dict[type, StepTypeTemplate] = {}
         self.mode = CircuitMode.SETUP
-        self.setup()
+        with tracing.span("setup", circuit=type(self).__name__):
+            self.setup()
+        if self.dedup_step_types:
+            self.merged_step_types = self.ast.dedup_step_types()
 
     def forward(self: Circuit, name: str) -> Forward:
         assert self.mode == CircuitMode.SETUP
@@ -80,6 +130,12 @@ class Circuit:
         assert self.mode == CircuitMode.SETUP
         self.ast.q_enable = False
 
+    # Merges structurally identical step types once `setup` returns, see
+    # `ASTCircuit.dedup_step_types`.
+    def pragma_dedup_step_types(self: Circuit) -> None:
+        assert self.mode == CircuitMode.SETUP
+        self.dedup_step_types = True
+
     def add(self: Circuit, step_type: StepType, args: Any):
         assert self.mode == CircuitMode.Trace
         if len(self.witness.step_instances) >= self.ast.num_steps:
@@ -87,6 +143,45 @@ class Circuit:
         step_instance: StepInstance = step_type.gen_step_instance(args)
         self.witness.step_instances.append(step_instance)
 
+    # Adds one step of `step_type` per row of `columns`, {signal: column}, without calling `wg`:
+    # the columns must hold every value `wg` would assign. Columns are NumPy or Arrow arrays or
+    # lists, of integers or of 4 u64 limbs per value (see `to_field_column`). Signals must be
+    # forward or shared signals without rotation, or internal signals of `step_type`. Signals
+    # derived by `pragma_solve_witness` are solved row by row.
+    def add_many(self: Circuit, step_type: StepType, columns: Dict[Queriable, Any]):
+        assert self.mode == CircuitMode.Trace
+        internal_ids = {signal.id for signal in step_type.step_type.signals}
+        for signal in columns:
+            match signal:
+                case Forward(rotation=False) | Shared(rotation=0):
+                    pass
+                case Internal() if signal.signal.id in internal_ids:
+                    pass
+                case _:
+                    raise ValueError(
+                        f"Cannot assign {signal} in bulk for step type {step_type.step_type.name}."
+                    )
+        with tracing.span("add_many", step_type=step_type.step_type.name):
+            values = [to_field_column(column) for column in columns.values()]
+            lengths = {len(column) for column in values}
+            if len(lengths) > 1:
+                raise ValueError(f"Columns have different lengths: {sorted(lengths)}.")
+            rows = lengths.pop() if lengths else 0
+            if len(self.witness.step_instances) + rows > self.ast.num_steps:
+                raise ValueError(
+                    f"Number of step instances exceeds {self.ast.num_steps}"
+                )
+            signals = list(columns.keys())
+            step_type_id = step_type.step_type.id
+            step_instances = [
+                StepInstance(step_type_id, dict(zip(signals, row)))
+                for row in zip(*values)
+            ]
+            if step_type.solver is not None:
+                for step_instance in step_instances:
+                    step_type.solver.solve(step_instance, step_type.step_type.params)
+            self.witness.step_instances.extend(step_instances)
+
     def needs_padding(self: Circuit) -> bool:
         return len(self.witness.step_instances) < self.ast.num_steps
 
@@ -94,24 +189,258 @@ class Circuit:
         while self.needs_padding():
             self.add(step_type, args)
 
-    def gen_witness(self: Circuit, args: Any) -> TraceWitness:
+    # With `cache`, witnesses are looked up by circuit and `args` before running `trace`, and
+    # stored after. Resume points are not cached, and neither are witnesses with deferred
+    # assignments, which depend on the challenges passed to `resolve`.
+    def gen_witness(
+        self: Circuit, args: Any, cache: Optional[WitnessCache] = None
+    ) -> TraceWitness:
+        if cache is not None:
+            witness = cache.get(self, args)
+            if witness is None:
+                witness = self.gen_witness(args)
+                if not witness.has_deferred():
+                    cache.put(self, args, witness)
+            return witness
         self.mode = CircuitMode.Trace
         self.witness = TraceWitness()
-        self.trace(args)
+        with tracing.span("trace", circuit=type(self).__name__):
+            self.trace(args)
+        self.mode = CircuitMode.NoMode
+        witness = self.witness
+        del self.witness
+        return witness
+
+    # Same as `gen_witness`, but writes each step instance to the witness file at `path` as it is
+    # added instead of keeping the trace in memory. The file can be inspected with `WitnessFile`,
+    # which the prover methods also accept.
+    def gen_witness_file(self: Circuit, args: Any, path: str) -> WitnessFile:
+        self.mode = CircuitMode.Trace
+        with WitnessFileWriter(path, self.ast) as writer:
+            self.witness = WitnessFileTrace(writer)
+            try:
+                with tracing.span("trace", circuit=type(self).__name__, path=path):
+                    self.trace(args)
+            finally:
+                self.mode = CircuitMode.NoMode
+                del self.witness
+        return WitnessFile(path)
+
+    # Called from `trace` to record a point where `trace_from` can continue the trace with
+    # `state`, for example the loop variables after each batch. States are stored by reference.
+    def resume_point(self: Circuit, state: Any):
+        assert self.mode == CircuitMode.Trace
+        self.witness.resume_points.append(
+            ResumePoint(len(self.witness.step_instances), state)
+        )
+
+    # Keeps the first `resume.step_index` steps of `previous` and calls
+    # `trace_from(resume.state, args)`, which circuits implement to add the remaining steps. Step
+    # instances before the resume point are shared with `previous`; use `TraceWitness.diff` to
+    # find the steps that changed.
+    def gen_witness_incremental(
+        self: Circuit, previous: TraceWitness, resume: ResumePoint, args: Any
+    ) -> TraceWitness:
+        if not hasattr(self, "trace_from"):
+            raise TypeError(
+                f"{type(self).__name__} must define trace_from(state, args) for incremental witness generation."
+            )
+        if not 0 <= resume.step_index <= len(previous.step_instances):
+            raise ValueError(
+                f"Resume point at step {resume.step_index} is outside the previous witness."
+            )
+        self.mode = CircuitMode.Trace
+        self.witness = TraceWitness(
+            previous.step_instances[: resume.step_index],
+            [r for r in previous.resume_points if r.step_index <= resume.step_index],
+        )
+        with tracing.span(
+            "trace_from", circuit=type(self).__name__, step=resume.step_index
+        ):
+            self.trace_from(resume.state, args)
         self.mode = CircuitMode.NoMode
         witness = self.witness
         del self.witness
         return witness
 
     def get_ast_json(self: Circuit) -> str:
-        return json.dumps(self.ast, cls=CustomEncoder, indent=4)
+        with tracing.span("get_ast_json"):
+            return json.dumps(self.ast, cls=CustomEncoder, indent=4)
+
+    # Smaller AST JSON, with signals and strings in tables, read by
+    # `rust_chiquito.compact_ast_to_halo2`. See compact_ast.py.
+    def get_compact_ast_json(self: Circuit) -> str:
+        with tracing.span("get_compact_ast_json"):
+            return json.dumps(compact_ast(self.ast), separators=(",", ":"))
+
+    # Estimated size of the compiled circuit. With `benchmark`, the path of a
+    # `benchmarks/pipeline.py` results file, also predicts the time of the halo2 phases.
+    def stats(self: Circuit, benchmark: Optional[str] = None) -> CircuitStats:
+        stats = circuit_stats(self.ast)
+        if benchmark is not None:
+            stats.predicted_s = predict(stats, fit_cost_model(benchmark))
+        return stats
+
+    # Compares the constraints with those of `other`, e.g. the same circuit before a refactor,
+    # by evaluating them at random points. See equivalence.py.
+    def check_equivalence(
+        self: Circuit,
+        other: Circuit,
+        points: int = DEFAULT_POINTS,
+        seed: Optional[int] = None,
+    ) -> EquivalenceReport:
+        with tracing.span("check_equivalence"):
+            return check_equivalence(self.ast, other.ast, points, seed)
+
+    def memory_report(self: Circuit) -> MemoryReport:
+        return ast_memory_report(self.ast)
+
+    def get_rust_circuit(self: Circuit) -> RustCircuit:
+        if self.rust_circuit is None:
+            self.rust_circuit = RustCircuit(self.ast, *self.placement)
+        return self.rust_circuit
+
+    # Selects how the Rust compiler places signals in advice columns:
+    # - "single_row" (default): one row per step, internal signals of different step types share
+    #   columns.
+    # - "max_width": steps span several rows of at most `max_width` columns. Doesn't support shared
+    #   or fixed signals.
+    # - "cost": the "max_width" width, or "single_row", with the smallest columns * 2^k.
+    # The circuit is compiled again, and keys must be set up again, on the next call that needs it.
+    def set_placement(
+        self: Circuit, strategy: str = "single_row", max_width: Optional[int] = None
+    ):
+        if strategy not in PLACEMENT_STRATEGIES:
+            raise ValueError(
+                f"Unknown placement strategy {strategy}, expected one of {PLACEMENT_STRATEGIES}."
+            )
+        if strategy == "max_width" and (max_width is None or max_width <= 0):
+            raise ValueError("The max_width placement needs a positive max_width.")
+        self.close()
+        self.placement = (strategy, max_width)
+
+    def layout(self: Circuit) -> Layout:
+        return Layout.from_rust(self.get_rust_circuit().call("halo2_layout"))
+
+    def get_rust_ast_id(self: Circuit) -> int:
+        return self.get_rust_circuit().register()
+
+    # Releases the compiled circuit held by the Rust extension. The circuit stays usable and is
+    # registered again on the next call that needs it.
+    def close(self: Circuit):
+        if self.rust_circuit is not None:
+            self.rust_circuit.close()
+            self.rust_circuit = None
+
+    def __enter__(self: Circuit) -> Circuit:
+        return self
+
+    def __exit__(self: Circuit, *exc_info):
+        self.close()
+
+    def halo2_mock_prover(self: Circuit, witness: TraceWitness) -> MockProverResult:
+        rust_circuit: RustCircuit = self.get_rust_circuit()
+        start_ns = perf_counter_ns()
+        with tracing.span("halo2_mock_prover", "rust"):
+            result = MockProverResult.from_rust(
+                rust_circuit.call("halo2_mock_prover", witness)
+            )
+        if tracing.tracer is not None:
+            phases = ("witness_deserialize", "synthesis", "verification")
+            tracing.tracer.add_rust_phases(
+                start_ns,
+                {p: t for (p, t) in result.timings.items() if p in phases},
+            )
+        return result
+
+    # Witnesses are converted as the Rust side consumes the iterable, so generators work; a witness
+    # with deferred assignments raises when it is reached. The compiled circuit is shared, but halo2
+    # synthesizes the circuit, fixed columns included, again for every witness: the batch saves
+    # round trips and checks witnesses in parallel.
+    def halo2_mock_prover_batch(
+        self: Circuit, witnesses: Iterable[TraceWitness]
+    ) -> List[MockProverResult]:
+        rust_circuit: RustCircuit = self.get_rust_circuit()
+        with tracing.span("halo2_mock_prover_batch", "rust"):
+            return [
+                MockProverResult.from_rust(result)
+                for result in rust_circuit.call(
+                    "halo2_mock_prover_batch", resolved(witnesses)
+                )
+            ]
+
+    # Checks every step against the constraints of its step type in parallel, directly on the AST,
+    # and reports the first `max_failures` failures. Constraints that query fixed signals are
+    # skipped, so passing is not a substitute for `halo2_mock_prover`. `steps` restricts the check
+    # to some steps, such as `WitnessDiff.affected_steps()` after an incremental update; for a
+    # `TraceWitness`, only the assignments of those steps and of the steps they query are converted.
+    def fast_check(
+        self: Circuit,
+        witness: TraceWitness,
+        max_failures: int = 10,
+        steps: Optional[List[int]] = None,
+    ) -> MockProverResult:
+        rust_circuit: RustCircuit = self.get_rust_circuit()
+        with tracing.span("halo2_fast_check", "rust"):
+            return MockProverResult.from_rust(
+                rust_circuit.call("halo2_fast_check", witness, max_failures, steps)
+            )
 
-    def halo2_mock_prover(self: Circuit, witness: TraceWitness):
-        if self.rust_ast_id == 0:
-            ast_json: str = self.get_ast_json()
-            self.rust_ast_id: int = ast_to_halo2(ast_json)
-        witness_json: str = witness.get_witness_json()
-        halo2_mock_prover(witness_json, self.rust_ast_id)
+    # Params and keys are cached in `cache_dir` (default `$CHIQUITO_CACHE_DIR` or
+    # `~/.cache/chiquito`) and reused by later runs of the same circuit.
+    def setup_keys(self: Circuit, k: int, cache_dir: Optional[str] = None):
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.get_rust_circuit().setup_keys(k, cache_dir, self.ast.fingerprint())
+
+    def instances(self: Circuit, witness: TraceWitness) -> List[List[F]]:
+        return [
+            [from_limbs(limbs) for limbs in column]
+            for column in self.get_rust_circuit().call("halo2_instances", witness)
+        ]
+
+    def prove(self: Circuit, witness: TraceWitness) -> bytes:
+        rust_circuit: RustCircuit = self.get_rust_circuit()
+        with tracing.span("halo2_prove", "rust"):
+            return rust_circuit.call("halo2_prove", witness)
+
+    def verify(self: Circuit, proof: bytes, instances: List[List[F]]) -> bool:
+        rust_circuit: RustCircuit = self.get_rust_circuit()
+        instances = [[F(value).__json__() for value in column] for column in instances]
+        with tracing.span("halo2_verify", "rust"):
+            return rust_circuit.call("halo2_verify", proof, instances)
+
+    # A snapshot holds the finished AST together with the circuit and step type objects, so that
+    # the signal and step type handles used by `trace` and `wg` are restored without re-running
+    # `setup`. Snapshots are pickles: only load snapshots from trusted sources, and the circuit
+    # and step type classes must be importable where the snapshot is loaded.
+    def freeze(self: Circuit, path: Optional[str] = None) -> bytes:
+        with tracing.span("freeze"):
+            snapshot = SNAPSHOT_HEADER + pickle.dumps(
+                self, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(snapshot)
+        return snapshot
+
+    def load(snapshot: bytes | str) -> Circuit:
+        if isinstance(snapshot, str):
+            with open(snapshot, "rb") as f:
+                snapshot = f.read()
+        if not snapshot.startswith(SNAPSHOT_HEADER):
+            raise ValueError("Not a circuit snapshot, or written by another version.")
+        with tracing.span("load"):
+            return pickle.loads(snapshot[len(SNAPSHOT_HEADER) :])
+
+    # The Rust registry is per process and witnesses are per trace, so neither is captured.
+    def __getstate__(self: Circuit):
+        state = self.__dict__.copy()
+        state["rust_circuit"] = None
+        if "witness" in state:
+            state["witness"] = TraceWitness()
+        return state
 
     def __str__(self: Circuit) -> str:
         return self.ast.__str__()
@@ -127,18 +456,78 @@ class StepType:
     def __init__(self: StepType, circuit: Circuit, step_type_name: str):
         self.step_type = ASTStepType.new(step_type_name)
         self.circuit = circuit
+        self.memo: Optional[OrderedDict[Any, StepInstance]] = None
+        self.memo_size = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.solve_witness = False
+        self.solver: Optional[WitnessSolver] = None
         self.mode = StepTypeMode.SETUP
-        self.setup()
+        with tracing.span("step_type_setup", step_type=step_type_name):
+            self.setup()
+        if self.solve_witness:
+            self.solver = WitnessSolver(self.step_type)
+
+    # Opt-in, usually from `setup`: step instances are cached by `args` in an LRU of `maxsize`
+    # entries and shared between steps, so `wg` must be a pure function of `args`. Unhashable
+    # args are never cached.
+    def memoize(self: StepType, maxsize: int = 128):
+        if maxsize <= 0:
+            raise ValueError(f"Memo size must be positive, got {maxsize}.")
+        self.memo = OrderedDict()
+        self.memo_size = maxsize
+
+    # Opt-in from `setup`: after `wg`, signals it left unassigned are derived from the constraints
+    # that are linear in them, so `wg` only needs to assign the inputs. See solver.py.
+    def pragma_solve_witness(self: StepType):
+        assert self.mode == StepTypeMode.SETUP
+        self.solve_witness = True
 
     def gen_step_instance(self: StepType, args: Any) -> StepInstance:
+        if self.memo is None:
+            return self.new_step_instance(args)
+        try:
+            step_instance = self.memo.get(args)
+        except TypeError:
+            return self.new_step_instance(args)
+        if step_instance is not None:
+            self.memo.move_to_end(args)
+            self.memo_hits += 1
+            return step_instance
+        self.memo_misses += 1
+        step_instance = self.new_step_instance(args)
+        self.memo[args] = step_instance
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+        return step_instance
+
+    def new_step_instance(self: StepType, args: Any) -> StepInstance:
         self.mode = StepTypeMode.WG
         self.step_instance = StepInstance.new(self.step_type.id)
-        self.wg(args)
+        if tracing.tracer is None:
+            self.wg(args)
+        else:
+            start_ns = perf_counter_ns()
+            self.wg(args)
+            tracing.tracer.record_wg(
+                self.step_type.name, start_ns, perf_counter_ns() - start_ns
+            )
+        if self.solver is not None:
+            self.solver.solve(self.step_instance, self.step_type.params)
         self.mode = StepTypeMode.NoMode
         step_instance = self.step_instance
         del self.step_instance
         return step_instance
 
+    def __getstate__(self: StepType):
+        state = self.__dict__.copy()
+        state.pop("step_instance", None)
+        if self.memo is not None:
+            state["memo"] = OrderedDict()
+        state["memo_hits"] = 0
+        state["memo_misses"] = 0
+        return state
+
     def internal(self: StepType, name: str) -> Internal:
         assert self.mode == StepTypeMode.SETUP
 
@@ -169,4 +558,70 @@ class StepType:
 
         self.step_instance.assign(lhs, rhs)
 
+    # For signals of a later phase (see `Circuit.forward_with_phase`), whose values depend on
+    # challenges: `compute` runs in `TraceWitness.resolve` instead of during `wg`.
+    def assign_deferred(self: StepType, lhs: Queriable, compute: DeferredAssignment):
+        assert self.mode == StepTypeMode.WG
+        if not isinstance(lhs, (Forward, Shared)) or lhs.signal.phase == 0:
+            raise ValueError(
+                f"Only signals of a later phase can be deferred, got {lhs}."
+            )
+        self.step_instance.assign_deferred(lhs, compute)
+
     # TODO: Implement add_lookup after lookup abstraction PR is merged.
+
+
+# Step types that only differ in constant parameters, such as rounds or lanes. The first instance
+# of a template class in a circuit runs `setup`, where `self.param(name)` stands for a parameter in
+# constraints. Later instances skip `setup`: they share the signals, constraint lists and solver of
+# the first one and only store their bindings, so setup time and Python memory grow with the number
+# of templates rather than instances. Bindings are passed as keyword arguments and read in `wg`
+# from `self.params`; the handles created in `setup` are read from the first instance.
+class StepTypeTemplate(StepType):
+    def __init__(
+        self: StepTypeTemplate, circuit: Circuit, step_type_name: str, **params: Any
+    ):
+        self.params: Dict[str, F] = {name: F(value) for name, value in params.items()}
+        self.param_names = set()
+        template = circuit.templates.get(type(self))
+        if template is None:
+            circuit.templates[type(self)] = self
+            self.template = None
+            StepType.__init__(self, circuit, step_type_name)
+            self.step_type.params = self.params
+        else:
+            self.template = template
+            self.step_type = ASTStepType(
+                uuid(),
+                step_type_name,
+                template.step_type.signals,
+                template.step_type.constraints,
+                template.step_type.transition_constraints,
+                template.step_type.annotations,
+                self.params,
+            )
+            self.circuit = circuit
+            self.memo = None if template.memo is None else OrderedDict()
+            self.memo_size = template.memo_size
+            self.memo_hits = 0
+            self.memo_misses = 0
+            self.solve_witness = template.solve_witness
+            self.solver = template.solver
+            self.mode = StepTypeMode.SETUP
+        param_names = (template or self).param_names
+        if set(self.params) != param_names:
+            raise ValueError(
+                f"Step type {step_type_name} binds {sorted(self.params)}, expected {sorted(param_names)}."
+            )
+
+    def param(self: StepTypeTemplate, name: str) -> Param:
+        assert self.mode == StepTypeMode.SETUP
+        self.param_names.add(name)
+        return Param(name)
+
+    # Handles created in `setup`, for instances after the first.
+    def __getattr__(self: StepTypeTemplate, name: str) -> Any:
+        template = self.__dict__.get("template")
+        if template is None:
+            raise AttributeError(name)
+        return getattr(template, name)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import random
+
+from chiquito.expr import Expr, Param
+from chiquito.query import Forward, Internal, Queriable, Shared, Fixed, StepTypeNext
+from chiquito.util import SCALAR_MODULUS
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit, ASTStepType
+
+# Compares the constraints of two versions of a circuit without proving. Step types are matched by
+# name and signals by annotation (and rotation), since ids change on every run of `setup`. Every
+# constraint is evaluated at `points` random assignments of the signals, shared by both circuits,
+# and scaled so that its first nonzero evaluation is 1: by the Schwartz-Zippel lemma, two
+# constraints of degree d with the same scaled evaluations are multiples of each other, so they
+# accept the same witnesses, except with probability about d / p per point. Step types are
+# equivalent if their constraints match as multisets, so reordering, rewriting (e.g. with `select`
+# or `when`) and negating constraints are accepted, but splitting or merging them is reported.
+# Signals with the same annotation in the same scope are not distinguished. Evaluations are done
+# modulo the scalar field of the prover.
+
+DEFAULT_POINTS = 4
+
+
+@dataclass
+class ConstraintMismatch:
+    step_type: str
+    # "constraint" or "transition".
+    kind: str
+    annotation: str
+    # "left" or "right": the circuit that has the constraint without a match in the other.
+    side: str
+
+    def __str__(self: ConstraintMismatch):
+        return f"{self.step_type}: {self.kind} `{self.annotation}` only in {self.side}"
+
+
+@dataclass
+class EquivalenceReport:
+    mismatches: List[ConstraintMismatch] = field(default_factory=list)
+    # Differences outside of step type constraints, e.g. missing step types or signals.
+    differences: List[str] = field(default_factory=list)
+
+    def __bool__(self: EquivalenceReport) -> bool:
+        return not self.mismatches and not self.differences
+
+    def __str__(self: EquivalenceReport):
+        items_str = "".join(
+            f"\n\t\t{item}," for item in self.differences + self.mismatches
+        )
+        return (
+            f"EquivalenceReport(\n"
+            f"\tequivalent={bool(self)},\n"
+            f"\tdifferences={{{items_str}\n\t}}\n"
+            f")"
+        )
+
+
+class RandomPoints:
+    def __init__(self: RandomPoints, points: int, seed: Optional[int]):
+        self.modulus = SCALAR_MODULUS
+        self.points = points
+        self.rng = random.Random(seed)
+        self.values: Dict[Tuple, List[int]] = {}
+
+    def key(self: RandomPoints, step_type: str, queriable: Queriable) -> Tuple:
+        match queriable:
+            case Internal():
+                return ("internal", step_type, queriable.signal.annotation)
+            case Forward():
+                return ("forward", queriable.signal.annotation, queriable.rotation)
+            case Shared():
+                return ("shared", queriable.signal.annotation, queriable.rotation)
+            case Fixed():
+                return ("fixed", queriable.signal.annotation, queriable.rotation)
+            case StepTypeNext():
+                return ("step_type_next", queriable.step_type.name)
+            case _:
+                raise TypeError(f"Cannot evaluate {type(queriable).__name__}.")
+
+    def value(self: RandomPoints, key: Tuple, point: int) -> int:
+        values = self.values.get(key)
+        if values is None:
+            values = self.values[key] = [
+                self.rng.randrange(self.modulus) for _ in range(self.points)
+            ]
+        return values[point]
+
+    # Evaluations of `expr` at every point, divided by the first nonzero one. Template
+    # parameters take their bound values.
+    def fingerprint(
+        self: RandomPoints, step_type: ASTStepType, expr: Expr
+    ) -> Tuple[int, ...]:
+        def lookup(expr: Expr, point: int) -> int:
+            if isinstance(expr, Param):
+                return step_type.params[expr.name].n
+            return self.value(self.key(step_type.name, expr), point)
+
+        evaluations = [
+            expr.evaluate(lambda expr: lookup(expr, point), self.modulus)
+            for point in range(self.points)
+        ]
+        pivot = next((e for e in evaluations if e != 0), 1)
+        inverse = pow(pivot, -1, self.modulus)
+        return tuple(e * inverse % self.modulus for e in evaluations)
+
+
+def compare_constraints(
+    points: RandomPoints,
+    kind: str,
+    attribute: str,
+    left_step_type: ASTStepType,
+    right_step_type: ASTStepType,
+) -> List[ConstraintMismatch]:
+    (left, right) = (
+        getattr(left_step_type, attribute),
+        getattr(right_step_type, attribute),
+    )
+    left_fingerprints = [points.fingerprint(left_step_type, c.expr) for c in left]
+    right_fingerprints = [points.fingerprint(right_step_type, c.expr) for c in right]
+    unmatched_left = Counter(left_fingerprints) - Counter(right_fingerprints)
+    unmatched_right = Counter(right_fingerprints) - Counter(left_fingerprints)
+
+    mismatches = []
+    for side, constraints, fingerprints, unmatched in (
+        ("left", left, left_fingerprints, unmatched_left),
+        ("right", right, right_fingerprints, unmatched_right),
+    ):
+        for constraint, fingerprint in zip(constraints, fingerprints):
+            if unmatched[fingerprint] > 0:
+                unmatched[fingerprint] -= 1
+                mismatches.append(
+                    ConstraintMismatch(
+                        left_step_type.name, kind, constraint.annotation, side
+                    )
+                )
+    return mismatches
+
+
+def compare_names(kind: str, left: List[str], right: List[str]) -> List[str]:
+    differences = [
+        f"{kind} `{name}` only in left" for name in left if name not in right
+    ]
+    differences.extend(
+        f"{kind} `{name}` only in right" for name in right if name not in left
+    )
+    return differences
+
+
+def step_type_name(ast: ASTCircuit, step_type_id: Optional[int]) -> Optional[str]:
+    if step_type_id is None or step_type_id not in ast.step_types:
+        return None
+    return ast.step_types[step_type_id].name
+
+
+def check_equivalence(
+    left: ASTCircuit,
+    right: ASTCircuit,
+    points: int = DEFAULT_POINTS,
+    seed: Optional[int] = None,
+) -> EquivalenceReport:
+    report = EquivalenceReport()
+    for kind, attribute in (
+        ("forward signal", "forward_signals"),
+        ("shared signal", "shared_signals"),
+        ("fixed signal", "fixed_signals"),
+    ):
+        report.differences.extend(
+            compare_names(
+                kind,
+                [signal.annotation for signal in getattr(left, attribute)],
+                [signal.annotation for signal in getattr(right, attribute)],
+            )
+        )
+    for pragma, (left_value, right_value) in {
+        "first_step": (
+            step_type_name(left, left.first_step),
+            step_type_name(right, right.first_step),
+        ),
+        "last_step": (
+            step_type_name(left, left.last_step),
+            step_type_name(right, right.last_step),
+        ),
+        "num_steps": (left.num_steps, right.num_steps),
+        "q_enable": (left.q_enable, right.q_enable),
+    }.items():
+        if left_value != right_value:
+            report.differences.append(
+                f"{pragma} is {left_value} in left and {right_value} in right"
+            )
+
+    left_step_types = {s.name: s for s in left.step_types.values()}
+    right_step_types = {s.name: s for s in right.step_types.values()}
+    report.differences.extend(
+        compare_names("step type", list(left_step_types), list(right_step_types))
+    )
+
+    random_points = RandomPoints(points, seed)
+    for name, left_step_type in left_step_types.items():
+        right_step_type = right_step_types.get(name)
+        if right_step_type is None:
+            continue
+        for kind, attribute in (
+            ("constraint", "constraints"),
+            ("transition", "transition_constraints"),
+        ):
+            report.mismatches.extend(
+                compare_constraints(
+                    random_points, kind, attribute, left_step_type, right_step_type
+                )
+            )
+    return report
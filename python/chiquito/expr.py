@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List
+from typing import Callable, Dict, List
 from dataclasses import dataclass
 
 from chiquito.util import F
@@ -26,21 +26,21 @@ class Expr:
         return Sum([self, rhs])
 
     def __radd__(self: Expr, lhs: ToExpr) -> Sum:
-        return Expr.__add__(lhs, self)
+        return Sum([to_expr(lhs), self])
 
     def __sub__(self: Expr, rhs: ToExpr) -> Sum:
         rhs = to_expr(rhs)
         return Sum([self, Neg(rhs)])
 
     def __rsub__(self: Expr, lhs: ToExpr) -> Sum:
-        return Expr.__sub__(lhs, self)
+        return Sum([to_expr(lhs), Neg(self)])
 
     def __mul__(self: Expr, rhs: ToExpr) -> Mul:
         rhs = to_expr(rhs)
         return Mul([self, rhs])
 
     def __rmul__(self: Expr, lhs: ToExpr) -> Mul:
-        return Expr.__mul__(lhs, self)
+        return Mul([to_expr(lhs), self])
 
     def __pow__(self: Expr, rhs: int) -> Pow:
         return Pow(self, rhs)
@@ -56,6 +56,12 @@ class Const(Expr):
     def __json__(self):
         return {"Const": self.value}
 
+    def degree(self: Const) -> int:
+        return 0
+
+    def evaluate(self: Const, values: Callable[[Expr], int], modulus: int) -> int:
+        return self.value.n % modulus
+
 
 @dataclass
 class Sum(Expr):
@@ -79,19 +85,25 @@ class Sum(Expr):
     def __json__(self):
         return {"Sum": [expr.__json__() for expr in self.exprs]}
 
+    def degree(self: Sum) -> int:
+        return max((expr.degree() for expr in self.exprs), default=0)
+
+    def evaluate(self: Sum, values: Callable[[Expr], int], modulus: int) -> int:
+        return sum(expr.evaluate(values, modulus) for expr in self.exprs) % modulus
+
     def __add__(self: Sum, rhs: ToExpr) -> Sum:
         rhs = to_expr(rhs)
         return Sum(self.exprs + [rhs])
 
     def __radd__(self: Sum, lhs: ToExpr) -> Sum:
-        return Sum.__add__(lhs, self)
+        return Sum([to_expr(lhs)] + self.exprs)
 
     def __sub__(self: Sum, rhs: ToExpr) -> Sum:
         rhs = to_expr(rhs)
         return Sum(self.exprs + [Neg(rhs)])
 
     def __rsub__(self: Sum, lhs: ToExpr) -> Sum:
-        return Sum.__sub__(lhs, self)
+        return Sum([to_expr(lhs), Neg(self)])
 
 
 @dataclass
@@ -104,12 +116,21 @@ class Mul(Expr):
     def __json__(self):
         return {"Mul": [expr.__json__() for expr in self.exprs]}
 
+    def degree(self: Mul) -> int:
+        return sum(expr.degree() for expr in self.exprs)
+
+    def evaluate(self: Mul, values: Callable[[Expr], int], modulus: int) -> int:
+        result = 1
+        for expr in self.exprs:
+            result = result * expr.evaluate(values, modulus) % modulus
+        return result
+
     def __mul__(self: Mul, rhs: ToExpr) -> Mul:
         rhs = to_expr(rhs)
         return Mul(self.exprs + [rhs])
 
     def __rmul__(self: Mul, lhs: ToExpr) -> Mul:
-        return Mul.__mul__(lhs, self)
+        return Mul([to_expr(lhs)] + self.exprs)
 
 
 @dataclass
@@ -122,6 +143,12 @@ class Neg(Expr):
     def __json__(self):
         return {"Neg": self.expr.__json__()}
 
+    def degree(self: Neg) -> int:
+        return self.expr.degree()
+
+    def evaluate(self: Neg, values: Callable[[Expr], int], modulus: int) -> int:
+        return -self.expr.evaluate(values, modulus) % modulus
+
     def __neg__(self: Neg) -> Expr:
         return self.expr
 
@@ -137,6 +164,49 @@ class Pow(Expr):
     def __json__(self):
         return {"Pow": [self.expr.__json__(), self.pow]}
 
+    def degree(self: Pow) -> int:
+        return self.expr.degree() * self.pow
+
+    def evaluate(self: Pow, values: Callable[[Expr], int], modulus: int) -> int:
+        return pow(self.expr.evaluate(values, modulus), self.pow, modulus)
+
+
+# Parameter of a step type template (see `StepTypeTemplate`), replaced by the value bound in each
+# instance when the AST is exported.
+@dataclass
+class Param(Expr):
+    name: str
+
+    def __str__(self: Param) -> str:
+        return self.name
+
+    def __json__(self):
+        return {"Param": self.name}
+
+    def degree(self: Param) -> int:
+        return 0
+
+    def evaluate(self: Param, values: Callable[[Expr], int], modulus: int) -> int:
+        return values(self) % modulus
+
+
+def bind_params(expr: Expr, params: Dict[str, F]) -> Expr:
+    match expr:
+        case Param(name):
+            if name not in params:
+                raise ValueError(f"Parameter {name} is not bound.")
+            return Const(params[name])
+        case Sum(exprs):
+            return Sum([bind_params(sub_expr, params) for sub_expr in exprs])
+        case Mul(exprs):
+            return Mul([bind_params(sub_expr, params) for sub_expr in exprs])
+        case Neg(sub_expr):
+            return Neg(bind_params(sub_expr, params))
+        case Pow(sub_expr, pow):
+            return Pow(bind_params(sub_expr, params), pow)
+        case _:
+            return expr
+
 
 ToExpr = Expr | int | F
 
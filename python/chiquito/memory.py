@@ -0,0 +1,195 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+import sys
+
+from chiquito.expr import Expr, Const, Sum, Mul, Neg, Pow
+from chiquito.query import StepTypeNext
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit
+# from chiquito.wit_gen import TraceWitness
+
+# Memory use of the Python AST and witness objects, measured with `sys.getsizeof` on every object
+# reachable from them (including instance `__dict__`s). Every object is counted once, in the
+# category of the first structure that reaches it, so shared objects (signals queried by many
+# expressions, memoized step instances) are not double counted. Sizes are shallow CPython sizes:
+# they exclude allocator overhead, and interned or cached objects such as small ints are counted
+# as if owned.
+
+# Categories: circuit (ASTCircuit, its lists and dicts), step_type (ASTStepType objects, their
+# lists and dicts), constraint, expr (Expr nodes and the lists of Sum and Mul), signal, annotation
+# (names and annotation strings), field (F objects and their integers), trace (TraceWitness and its
+# step instance list), step_instance and assignments (assignment dicts of step instances).
+
+
+@dataclass
+class StepTypeMemory:
+    name: str
+    # Steps of this type in a witness, 1 for a step type definition.
+    count: int = 0
+    # Objects, counted once even if shared by several steps.
+    nodes: int = 0
+    bytes: int = 0
+
+    def bytes_per_step(self: StepTypeMemory) -> float:
+        return self.bytes / self.count if self.count else 0.0
+
+
+@dataclass
+class MemoryReport:
+    nodes: Dict[str, int] = field(default_factory=dict)
+    bytes: Dict[str, int] = field(default_factory=dict)
+    step_types: Dict[int, StepTypeMemory] = field(default_factory=dict)
+
+    def total_nodes(self: MemoryReport) -> int:
+        return sum(self.nodes.values())
+
+    def total_bytes(self: MemoryReport) -> int:
+        return sum(self.bytes.values())
+
+    def __str__(self: MemoryReport):
+        categories_str = "".join(
+            f"\n\t\t{category}: {self.nodes[category]} nodes, {self.bytes[category]} bytes,"
+            for category in self.bytes
+        )
+        step_types_str = "".join(
+            f"\n\t\t{m.name}: {m.count} steps, {m.nodes} nodes, {m.bytes} bytes, "
+            f"{m.bytes_per_step():.1f} bytes/step,"
+            for m in self.step_types.values()
+        )
+        return (
+            f"MemoryReport(\n"
+            f"\ttotal_nodes={self.total_nodes()},\n"
+            f"\ttotal_bytes={self.total_bytes()},\n"
+            f"\tcategories={{{categories_str}\n\t}},\n"
+            f"\tstep_types={{{step_types_str}\n\t}}\n"
+            f")"
+        )
+
+
+class MemoryWalker:
+    def __init__(self: MemoryWalker):
+        self.report = MemoryReport()
+        self.seen = set()
+
+    # Counts `obj` under `category` unless it was counted before; returns whether it was new.
+    def add(self: MemoryWalker, category: str, obj: Any) -> bool:
+        if id(obj) in self.seen:
+            return False
+        self.seen.add(id(obj))
+        size = sys.getsizeof(obj)
+        if hasattr(obj, "__dict__"):
+            size += sys.getsizeof(obj.__dict__)
+        self.report.nodes[category] = self.report.nodes.get(category, 0) + 1
+        self.report.bytes[category] = self.report.bytes.get(category, 0) + size
+        return True
+
+    def totals(self: MemoryWalker) -> Tuple[int, int]:
+        return (self.report.total_nodes(), self.report.total_bytes())
+
+    def add_annotations(self: MemoryWalker, category: str, annotations: Dict):
+        if self.add(category, annotations):
+            for annotation in annotations.values():
+                self.add("annotation", annotation)
+
+    def add_field(self: MemoryWalker, value: Any):
+        if self.add("field", value) and hasattr(value, "n"):
+            self.add("field", value.n)
+
+    def add_signal(self: MemoryWalker, signal: Any):
+        if self.add("signal", signal):
+            self.add("annotation", signal.annotation)
+
+    def add_expr(self: MemoryWalker, expr: Expr):
+        if not self.add("expr", expr):
+            return
+        match expr:
+            case Const(value):
+                self.add_field(value)
+            case Sum(exprs) | Mul(exprs):
+                self.add("expr", exprs)
+                for sub_expr in exprs:
+                    self.add_expr(sub_expr)
+            case Neg(sub_expr) | Pow(sub_expr, _):
+                self.add_expr(sub_expr)
+            case StepTypeNext():
+                pass
+            case _:
+                if hasattr(expr, "signal"):
+                    self.add_signal(expr.signal)
+
+    def add_constraints(self: MemoryWalker, constraints: list):
+        self.add("step_type", constraints)
+        for constraint in constraints:
+            if self.add("constraint", constraint):
+                self.add("annotation", constraint.annotation)
+                self.add_expr(constraint.expr)
+
+    def add_step_type(self: MemoryWalker, step_type: Any):
+        (start_nodes, start_bytes) = self.totals()
+        if self.add("step_type", step_type):
+            self.add("annotation", step_type.name)
+            self.add("step_type", step_type.signals)
+            for signal in step_type.signals:
+                self.add_signal(signal)
+            self.add_constraints(step_type.constraints)
+            self.add_constraints(step_type.transition_constraints)
+            self.add_annotations("step_type", step_type.annotations)
+        (end_nodes, end_bytes) = self.totals()
+        self.report.step_types[step_type.id] = StepTypeMemory(
+            step_type.name, 1, end_nodes - start_nodes, end_bytes - start_bytes
+        )
+
+    def add_circuit(self: MemoryWalker, ast: Any):
+        self.add("circuit", ast)
+        self.add("circuit", ast.step_types)
+        for step_type in ast.step_types.values():
+            self.add_step_type(step_type)
+        for signals in (ast.forward_signals, ast.shared_signals, ast.fixed_signals):
+            self.add("circuit", signals)
+            for signal in signals:
+                self.add_signal(signal)
+        self.add("circuit", ast.exposed)
+        for exposed in ast.exposed:
+            self.add("circuit", exposed)
+            self.add_expr(exposed[0])
+            self.add("circuit", exposed[1])
+        self.add_annotations("circuit", ast.annotations)
+
+    # Queriables used as assignment keys belong to the circuit and are not counted.
+    def add_witness(self: MemoryWalker, witness: Any, ast: Optional[Any] = None):
+        self.add("trace", witness)
+        self.add("trace", witness.step_instances)
+        step_types = self.report.step_types
+        for step_instance in witness.step_instances:
+            uuid = step_instance.step_type_uuid
+            if uuid not in step_types:
+                name = (
+                    ast.step_types[uuid].name
+                    if ast is not None and uuid in ast.step_types
+                    else str(uuid)
+                )
+                step_types[uuid] = StepTypeMemory(name)
+            step_types[uuid].count += 1
+            (start_nodes, start_bytes) = self.totals()
+            if self.add("step_instance", step_instance):
+                self.add("assignments", step_instance.assignments)
+                for value in step_instance.assignments.values():
+                    self.add_field(value)
+            (end_nodes, end_bytes) = self.totals()
+            step_types[uuid].nodes += end_nodes - start_nodes
+            step_types[uuid].bytes += end_bytes - start_bytes
+
+
+def ast_memory_report(ast: Any) -> MemoryReport:
+    walker = MemoryWalker()
+    walker.add_circuit(ast)
+    return walker.report
+
+
+# `ast` is only used to name step types.
+def witness_memory_report(witness: Any, ast: Optional[Any] = None) -> MemoryReport:
+    walker = MemoryWalker()
+    walker.add_witness(witness, ast)
+    return walker.report
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from chiquito.chiquito_ast import ASTCircuit
+from chiquito.util import rust_chiquito
+from chiquito import tracing
+
+
+@dataclass
+class ConstraintFailure:
+    kind: str
+    message: str
+    row: Optional[int] = None
+    region: Optional[str] = None
+    step_index: Optional[int] = None
+    step_type_uuid: Optional[int] = None
+    step_type: Optional[str] = None
+    annotation: Optional[str] = None
+
+    def from_rust(failure: Dict) -> ConstraintFailure:
+        return ConstraintFailure(**failure)
+
+    def __str__(self: ConstraintFailure):
+        location = (
+            f"step {self.step_index} ({self.step_type}), row {self.row}"
+            if self.step_index is not None
+            else f"row {self.row}"
+        )
+        return f"{self.kind} at {location}: {self.message}"
+
+
+# Timings are in seconds, keyed by phase: ast_deserialize, compile, witness_deserialize, synthesis
+# and verification. AST deserialization and compilation happen once per registered circuit. When
+# the AST and witness are passed as objects, the deserialize phases time their conversion.
+# `Circuit.fast_check` reports witness_deserialize and check instead.
+@dataclass
+class MockProverResult:
+    passed: bool
+    failures: List[ConstraintFailure] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def from_rust(result: Dict) -> MockProverResult:
+        return MockProverResult(
+            result["passed"],
+            [ConstraintFailure.from_rust(failure) for failure in result["failures"]],
+            dict(result["timings"]),
+        )
+
+    def __bool__(self: MockProverResult) -> bool:
+        return self.passed
+
+    def __str__(self: MockProverResult):
+        failures_str = (
+            "\n\t\t"
+            + ",\n\t\t".join(str(failure) for failure in self.failures)
+            + "\n\t"
+            if self.failures
+            else ""
+        )
+        timings_str = ", ".join(
+            f"{phase}={seconds:.6f}s" for (phase, seconds) in self.timings.items()
+        )
+        return (
+            f"MockProverResult(\n"
+            f"\tpassed={self.passed},\n"
+            f"\tfailures=[{failures_str}],\n"
+            f"\ttimings={{{timings_str}}}\n"
+            f")"
+        )
+
+
+# Witnesses with deferred assignments can't be converted, the Rust side only reads assignments.
+def check_resolved(witness: Any) -> Any:
+    if hasattr(witness, "has_deferred") and witness.has_deferred():
+        raise ValueError(
+            "Witness has deferred assignments, call resolve(challenges) first."
+        )
+    return witness
+
+
+# Checks each witness with `check_resolved` as the Rust side consumes the iterable.
+def resolved(witnesses: Iterable[Any]) -> Iterator[Any]:
+    for witness in witnesses:
+        yield check_resolved(witness)
+
+
+# Handle to a circuit compiled and registered in the Rust extension. The Rust registry is bounded
+# (see `set_rust_registry_capacity`) and evicts the least recently used circuit when full; calls
+# through the handle register the AST again, and set up its keys again, when that happens. The AST
+# and witnesses are read directly from the Python objects, without serializing them to JSON.
+class RustCircuit:
+    def __init__(
+        self: RustCircuit,
+        ast: ASTCircuit,
+        strategy: str = "single_row",
+        max_width: Optional[int] = None,
+    ):
+        self.ast = ast
+        self.placement = (strategy, max_width)
+        self.id = 0
+        self.keys: Optional[Tuple[int, str, str]] = None
+        self.closed = False
+
+    def register(self: RustCircuit) -> int:
+        if self.closed:
+            raise ValueError("RustCircuit is closed.")
+        if self.id == 0:
+            with tracing.span("ast_to_halo2", "rust"):
+                self.id = rust_chiquito().ast_object_to_halo2(self.ast, *self.placement)
+            if self.keys is not None:
+                with tracing.span("halo2_setup_keys", "rust", k=self.keys[0]):
+                    rust_chiquito().halo2_setup_keys(*self.keys, self.id)
+        return self.id
+
+    # Calls `rust_chiquito.<function>(*args, rust_ast_id)`. Only CircuitNotRegistered is retried:
+    # Rust raises it before reading the other arguments, so iterables passed to the call are not
+    # consumed yet. Witness arguments are checked with `check_resolved`; iterables of witnesses
+    # are not, pass them through `resolved`.
+    def call(self: RustCircuit, function: str, *args: Any) -> Any:
+        for arg in args:
+            check_resolved(arg)
+        rust_ast_id = self.register()
+        try:
+            return getattr(rust_chiquito(), function)(*args, rust_ast_id)
+        except rust_chiquito().CircuitNotRegistered:
+            self.release()
+            return getattr(rust_chiquito(), function)(*args, self.register())
+
+    def setup_keys(self: RustCircuit, k: int, cache_dir: str, fingerprint: str):
+        with tracing.span("halo2_setup_keys", "rust", k=k):
+            self.call("halo2_setup_keys", k, cache_dir, fingerprint)
+        self.keys = (k, cache_dir, fingerprint)
+
+    # Releases the registered circuit, if any; the next call registers it again.
+    def release(self: RustCircuit):
+        if self.id != 0:
+            rust_chiquito().release_rust_ast(self.id)
+            self.id = 0
+
+    def close(self: RustCircuit):
+        self.release()
+        self.closed = True
+
+    def __enter__(self: RustCircuit) -> RustCircuit:
+        return self
+
+    def __exit__(self: RustCircuit, *exc_info):
+        self.close()
+
+
+PLACEMENT_STRATEGIES = ["single_row", "max_width", "cost"]
+
+
+# Placement of signals in columns chosen by the Rust compiler, see `Circuit.set_placement`.
+@dataclass
+class Layout:
+    strategy: str
+    max_width: Optional[int]
+    step_height: int
+    advice_columns: int
+    fixed_columns: int
+    rows: int
+    k: int
+
+    def from_rust(layout: Dict) -> Layout:
+        return Layout(**layout)
+
+    def columns(self: Layout) -> int:
+        return self.advice_columns + self.fixed_columns
+
+
+@dataclass
+class RustRegistryStats:
+    capacity: int
+    evictions: int
+    # (rust_ast_id, estimated AST bytes, proving key bytes) per registered circuit.
+    entries: List[Tuple[int, int, int]]
+
+    def total_bytes(self: RustRegistryStats) -> int:
+        return sum(
+            ast_bytes + keys_bytes for (_, ast_bytes, keys_bytes) in self.entries
+        )
+
+
+def rust_registry_stats() -> RustRegistryStats:
+    stats = rust_chiquito().rust_registry_stats()
+    return RustRegistryStats(stats["capacity"], stats["evictions"], stats["entries"])
+
+
+def set_rust_registry_capacity(capacity: int):
+    rust_chiquito().set_rust_registry_capacity(capacity)
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from typing import Callable
 
 from chiquito.expr import Expr
 
@@ -28,6 +29,15 @@ class Queriable(Expr):
     def uuid(self: Queriable) -> int:
         pass
 
+    def degree(self: Queriable) -> int:
+        return 1
+
+    # Integer evaluation modulo `modulus`, with `values` giving the value of each queriable.
+    def evaluate(
+        self: Queriable, values: Callable[[Queriable], int], modulus: int
+    ) -> int:
+        return values(self) % modulus
+
 
 # Not defined as @dataclass, because inherited __hash__ will be set to None.
 class Internal(Queriable):
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from chiquito.expr import Expr, Const, Sum, Mul, Neg, Pow, Param
+from chiquito.query import Queriable, Internal, Forward, Shared
+from chiquito.util import F, SCALAR_MODULUS
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTStepType
+# from chiquito.wit_gen import StepInstance
+
+# Derives the signals `wg` leaves unassigned from the step type's constraints. At setup, every
+# constraint `coeff * x + rest = 0` that is linear in a signal `x` becomes a rule solving
+# `x = -rest / coeff`. At witness generation, the rules that have exactly one unknown are applied
+# until no rule applies; the resulting order is compiled into a plan once per set of signals
+# assigned by `wg`; if a planned coefficient is zero for a step, the other rules solving the same
+# signal are tried for that step. Only internal signals and forward and shared signals on the
+# step's own row are solved; constraints querying other rows, fixed signals or step type selectors are not used.
+# Values are solved modulo the scalar field of the prover, not the modulus of `F`.
+
+# Forward(a, False) and Forward(a, True) have the same uuid, so queriables are compared by key.
+QueriableKey = Tuple[str, int, Optional[int | bool]]
+
+
+def queriable_key(queriable: Queriable) -> QueriableKey:
+    return (
+        type(queriable).__name__,
+        queriable.uuid(),
+        getattr(queriable, "rotation", None),
+    )
+
+
+def is_solvable(queriable: Queriable) -> bool:
+    match queriable:
+        case Internal() | Forward(rotation=False) | Shared(rotation=0):
+            return True
+        case _:
+            return False
+
+
+def queriables(expr: Expr) -> List[Queriable]:
+    match expr:
+        case Const() | Param():
+            return []
+        case Sum(exprs) | Mul(exprs):
+            return [q for sub_expr in exprs for q in queriables(sub_expr)]
+        case Neg(sub_expr) | Pow(sub_expr, _):
+            return queriables(sub_expr)
+        case _:
+            return [expr]
+
+
+# (coeff, rest) such that `expr = coeff * x + rest`, where x is the queriable with key `key`, with
+# coeff None if expr doesn't depend on x. None if expr is not linear in x.
+def split_linear(
+    expr: Expr, key: QueriableKey
+) -> Optional[Tuple[Optional[Expr], Expr]]:
+    match expr:
+        case Const() | Param():
+            return (None, expr)
+        case Sum(exprs):
+            parts = [split_linear(sub_expr, key) for sub_expr in exprs]
+            if None in parts:
+                return None
+            coeffs = [coeff for (coeff, _) in parts if coeff is not None]
+            return (Sum(coeffs) if coeffs else None, Sum([rest for (_, rest) in parts]))
+        case Mul(exprs):
+            parts = [split_linear(sub_expr, key) for sub_expr in exprs]
+            if None in parts:
+                return None
+            linear = [i for (i, (coeff, _)) in enumerate(parts) if coeff is not None]
+            if not linear:
+                return (None, expr)
+            if len(linear) > 1:
+                return None
+            (coeff, rest) = parts[linear[0]]
+            others = exprs[: linear[0]] + exprs[linear[0] + 1 :]
+            return (Mul(others + [coeff]), Mul(others + [rest]))
+        case Neg(sub_expr):
+            part = split_linear(sub_expr, key)
+            if part is None:
+                return None
+            (coeff, rest) = part
+            return (None if coeff is None else Neg(coeff), Neg(rest))
+        case Pow(sub_expr, pow):
+            part = split_linear(sub_expr, key)
+            if part is None:
+                return None
+            if part[0] is None or pow == 0:
+                return (None, expr)
+            return part if pow == 1 else None
+        case _:
+            if queriable_key(expr) == key:
+                return (Const(F(1)), Const(F(0)))
+            return (None, expr)
+
+
+@dataclass
+class SolverRule:
+    target: Queriable
+    coeff: Expr
+    rest: Expr
+    inputs: FrozenSet[QueriableKey]
+    annotation: str
+
+
+class WitnessSolver:
+    def __init__(self: WitnessSolver, step_type: ASTStepType):
+        self.step_type_name = step_type.name
+        self.rules: List[SolverRule] = []
+        self.plans: Dict[FrozenSet[QueriableKey], List[SolverRule]] = {}
+        for constraint in step_type.constraints:
+            constraint_queriables = queriables(constraint.expr)
+            if not all(is_solvable(q) for q in constraint_queriables):
+                continue
+            targets = {queriable_key(q): q for q in constraint_queriables}
+            for key, target in targets.items():
+                part = split_linear(constraint.expr, key)
+                if part is None or part[0] is None:
+                    continue
+                (coeff, rest) = part
+                self.rules.append(
+                    SolverRule(
+                        target,
+                        coeff,
+                        rest,
+                        frozenset(targets.keys() - {key}),
+                        constraint.annotation,
+                    )
+                )
+
+    def plan(
+        self: WitnessSolver, assigned: FrozenSet[QueriableKey]
+    ) -> List[SolverRule]:
+        plan = self.plans.get(assigned)
+        if plan is not None:
+            return plan
+        plan = []
+        known = set(assigned)
+        progress = True
+        while progress:
+            progress = False
+            for rule in self.rules:
+                target = queriable_key(rule.target)
+                if target not in known and rule.inputs <= known:
+                    plan.append(rule)
+                    known.add(target)
+                    progress = True
+        self.plans[assigned] = plan
+        return plan
+
+    # `params` binds the `Param`s of step type templates.
+    def solve(
+        self: WitnessSolver, step_instance: StepInstance, params: Dict[str, F] = {}
+    ):
+        if not self.rules:
+            return
+        values = {
+            queriable_key(lhs): F(rhs).n % SCALAR_MODULUS
+            for (lhs, rhs) in step_instance.assignments.items()
+        }
+        plan = self.plan(frozenset(values.keys()))
+        lookup = lambda expr: (
+            params[expr.name].n
+            if isinstance(expr, Param)
+            else values[queriable_key(expr)]
+        )
+        for i, rule in enumerate(plan):
+            coeff = rule.coeff.evaluate(lookup, SCALAR_MODULUS)
+            if coeff == 0:
+                self.solve_remaining(step_instance, values, lookup, plan[i:])
+                return
+            self.apply(step_instance, values, lookup, rule, coeff)
+
+    def apply(
+        self: WitnessSolver,
+        step_instance: StepInstance,
+        values: Dict[QueriableKey, int],
+        lookup: Callable[[Expr], int],
+        rule: SolverRule,
+        coeff: int,
+    ):
+        modulus = SCALAR_MODULUS
+        value = -rule.rest.evaluate(lookup, modulus) * pow(coeff, -1, modulus) % modulus
+        values[queriable_key(rule.target)] = value
+        step_instance.assign(rule.target, F(value))
+
+    # When a planned rule's coefficient is zero for these values, another constraint may still
+    # solve its target: the targets of the `remaining` plan are solved by any rule with known
+    # inputs and a non-zero coefficient, until no rule applies. The plan stays cached.
+    def solve_remaining(
+        self: WitnessSolver,
+        step_instance: StepInstance,
+        values: Dict[QueriableKey, int],
+        lookup: Callable[[Expr], int],
+        remaining: List[SolverRule],
+    ):
+        targets = {queriable_key(rule.target) for rule in remaining}
+        progress = True
+        while progress:
+            progress = False
+            for rule in self.rules:
+                target = queriable_key(rule.target)
+                if (
+                    target not in targets
+                    or target in values
+                    or not rule.inputs.issubset(values)
+                ):
+                    continue
+                coeff = rule.coeff.evaluate(lookup, SCALAR_MODULUS)
+                if coeff != 0:
+                    self.apply(step_instance, values, lookup, rule, coeff)
+                    progress = True
+        for rule in remaining:
+            if queriable_key(rule.target) not in values:
+                raise ValueError(
+                    f"Cannot solve {rule.target} in step type {self.step_type_name}: its "
+                    f"coefficient is zero in `{rule.annotation}` and in every other constraint "
+                    f"that could solve it, assign it in wg."
+                )
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List
+import json
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit
+
+# Mirrors the Rust side (src/registry.rs): halo2 reserves UNUSABLE_ROWS rows for blinding
+# factors, and circuits are compiled with at least MIN_K.
+UNUSABLE_ROWS = 10
+MIN_K = 7
+
+
+def k_for_rows(rows: int) -> int:
+    k = MIN_K
+    while 2**k < rows + UNUSABLE_ROWS:
+        k += 1
+    return k
+
+
+@dataclass
+class StepTypeStats:
+    name: str
+    constraints: int
+    transition_constraints: int
+    internal_signals: int
+    max_degree: int
+
+
+# Estimates for the placement used by the Rust compiler (SingleRowCellManager and
+# SimpleStepSelectorBuilder): one advice column per forward and shared signal, internal signal
+# columns shared between step types, one advice selector column per step type, and one fixed column
+# per fixed signal plus the q_enable, q_first and q_last selectors. Every step takes one row.
+# Gates multiply each constraint by its step selector and by q_enable.
+@dataclass
+class CircuitStats:
+    step_types: Dict[int, StepTypeStats]
+    forward_signals: int
+    shared_signals: int
+    fixed_signals: int
+    internal_signals: int
+    max_degree: int
+    max_gate_degree: int
+    advice_columns: int
+    fixed_columns: int
+    instance_columns: int
+    step_height: int
+    rows: int
+    k: int
+    # Predicted seconds per benchmark phase, see `fit_cost_model`.
+    predicted_s: Dict[str, float] = field(default_factory=dict)
+
+    def constraints(self: CircuitStats) -> int:
+        return sum(
+            step_type.constraints + step_type.transition_constraints
+            for step_type in self.step_types.values()
+        )
+
+    # Advice and fixed columns, like `Layout.columns`, which the cost model is fitted on.
+    def columns(self: CircuitStats) -> int:
+        return self.advice_columns + self.fixed_columns
+
+    def __str__(self: CircuitStats):
+        step_types_str = "".join(
+            f"\n\t\t{s.name}: {s.constraints} constraints, "
+            f"{s.transition_constraints} transition constraints, "
+            f"{s.internal_signals} internal signals, max degree {s.max_degree},"
+            for s in self.step_types.values()
+        )
+        predicted_str = ", ".join(
+            f"{phase}={seconds:.3f}s" for (phase, seconds) in self.predicted_s.items()
+        )
+        return (
+            f"CircuitStats(\n"
+            f"\tstep_types={{{step_types_str}\n\t}},\n"
+            f"\tsignals=(forward={self.forward_signals}, shared={self.shared_signals}, "
+            f"fixed={self.fixed_signals}, internal={self.internal_signals}),\n"
+            f"\tmax_degree={self.max_degree},\n"
+            f"\tmax_gate_degree={self.max_gate_degree},\n"
+            f"\tcolumns=(advice={self.advice_columns}, fixed={self.fixed_columns}, "
+            f"instance={self.instance_columns}),\n"
+            f"\trows={self.rows},\n"
+            f"\tk={self.k},\n"
+            f"\tpredicted_s={{{predicted_str}}}\n"
+            f")"
+        )
+
+
+def circuit_stats(ast: ASTCircuit) -> CircuitStats:
+    step_types = {
+        step_type.id: StepTypeStats(
+            step_type.name,
+            len(step_type.constraints),
+            len(step_type.transition_constraints),
+            len(step_type.signals),
+            max(
+                (
+                    constraint.expr.degree()
+                    for constraint in step_type.constraints
+                    + step_type.transition_constraints
+                ),
+                default=0,
+            ),
+        )
+        for step_type in ast.step_types.values()
+    }
+    max_degree = max((s.max_degree for s in step_types.values()), default=0)
+    internal_columns = max((s.internal_signals for s in step_types.values()), default=0)
+    step_height = 1
+    rows = ast.num_steps * step_height
+
+    return CircuitStats(
+        step_types,
+        len(ast.forward_signals),
+        len(ast.shared_signals),
+        len(ast.fixed_signals),
+        sum(s.internal_signals for s in step_types.values()),
+        max_degree,
+        max_degree + 1 + int(ast.q_enable),
+        len(ast.forward_signals)
+        + len(ast.shared_signals)
+        + internal_columns
+        + len(step_types),
+        len(ast.fixed_signals)
+        + int(ast.q_enable)
+        + int(ast.first_step is not None)
+        + int(ast.last_step is not None),
+        int(len(ast.exposed) > 0),
+        step_height,
+        rows,
+        k_for_rows(rows),
+    )
+
+
+# Proving work grows with the number of columns times the evaluation domain, so each phase is
+# modeled as `seconds = c * columns * k * 2^k`, with `c` fitted by least squares to the cases of a
+# `benchmarks/pipeline.py` results file. Only the phases that run halo2 are modeled.
+MODELED_PHASES = ["mock_prove", "setup_keys", "prove", "verify"]
+
+
+def cost_model_feature(columns: int, k: int) -> float:
+    return columns * k * 2**k
+
+
+def fit_cost_model(benchmark_path: str) -> Dict[str, float]:
+    with open(benchmark_path) as f:
+        cases: List[Dict] = json.load(f)["cases"]
+
+    sums: Dict[str, List[float]] = {}
+    for case in cases:
+        if "stats" not in case:
+            continue
+        x = cost_model_feature(case["stats"]["columns"], case["stats"]["k"])
+        for phase, seconds in case["timings_s"].items():
+            if phase not in MODELED_PHASES:
+                continue
+            (xy, xx) = sums.setdefault(phase, [0.0, 0.0])
+            sums[phase] = [xy + x * seconds, xx + x * x]
+    return {phase: xy / xx for (phase, (xy, xx)) in sums.items() if xx > 0}
+
+
+def predict(stats: CircuitStats, coefficients: Dict[str, float]) -> Dict[str, float]:
+    x = cost_model_feature(stats.columns(), stats.k)
+    return {phase: c * x for (phase, c) in coefficients.items()}
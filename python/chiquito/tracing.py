@@ -0,0 +1,144 @@
+from __future__ import annotations
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from time import perf_counter_ns
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import threading
+
+# Tracing is opt-in: call `enable()` before building circuits and `export_chrome_trace()` at the
+# end of the run. While disabled, `tracer` is None and instrumented code pays a single attribute
+# check.
+
+
+@dataclass
+class Span:
+    name: str
+    cat: str
+    start_ns: int
+    duration_ns: int
+    tid: int
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    def __json__(self: Span):
+        return {
+            "name": self.name,
+            "cat": self.cat,
+            "ph": "X",
+            "ts": self.start_ns / 1000,
+            "dur": self.duration_ns / 1000,
+            "pid": os.getpid(),
+            "tid": self.tid,
+            "args": self.args,
+        }
+
+
+@dataclass
+class WgStats:
+    calls: int = 0
+    total_ns: int = 0
+
+    def __json__(self: WgStats):
+        return {
+            "calls": self.calls,
+            "total_ms": self.total_ns / 1e6,
+            "mean_us": self.total_ns / self.calls / 1e3 if self.calls else 0.0,
+        }
+
+
+@dataclass
+class Tracer:
+    wg_spans: bool = False
+    origin_ns: int = field(default_factory=perf_counter_ns)
+    spans: List[Span] = field(default_factory=list)
+    wg_stats: Dict[str, WgStats] = field(default_factory=dict)
+
+    def add_span(
+        self: Tracer,
+        name: str,
+        cat: str,
+        start_ns: int,
+        duration_ns: int,
+        args: Optional[Dict[str, Any]] = None,
+    ):
+        self.spans.append(
+            Span(
+                name,
+                cat,
+                start_ns - self.origin_ns,
+                duration_ns,
+                threading.get_ident(),
+                dict(args or {}),
+            )
+        )
+
+    @contextmanager
+    def span(self: Tracer, name: str, cat: str, args: Dict[str, Any]) -> Iterator[None]:
+        start_ns = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, cat, start_ns, perf_counter_ns() - start_ns, args)
+
+    def record_wg(self: Tracer, step_type_name: str, start_ns: int, duration_ns: int):
+        stats = self.wg_stats.get(step_type_name)
+        if stats is None:
+            stats = self.wg_stats[step_type_name] = WgStats()
+        stats.calls += 1
+        stats.total_ns += duration_ns
+        if self.wg_spans:
+            self.add_span(
+                "wg", "wg", start_ns, duration_ns, {"step_type": step_type_name}
+            )
+
+    # Rust phases are reported as durations, so they are laid out back to back from `start_ns`.
+    def add_rust_phases(self: Tracer, start_ns: int, timings: Dict[str, float]):
+        for phase, seconds in timings.items():
+            duration_ns = int(seconds * 1e9)
+            self.add_span(phase, "rust", start_ns, duration_ns)
+            start_ns += duration_ns
+
+    def __json__(self: Tracer):
+        return {
+            "traceEvents": [span.__json__() for span in self.spans],
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "wg_stats": {
+                    name: stats.__json__() for (name, stats) in self.wg_stats.items()
+                }
+            },
+        }
+
+    def export_chrome_trace(self: Tracer, path: str):
+        with open(path, "w") as f:
+            json.dump(self.__json__(), f)
+
+
+tracer: Optional[Tracer] = None
+
+_disabled_span = nullcontext()
+
+
+def enable(wg_spans: bool = False) -> Tracer:
+    global tracer
+    tracer = Tracer(wg_spans)
+    return tracer
+
+
+def disable() -> Optional[Tracer]:
+    global tracer
+    disabled, tracer = tracer, None
+    return disabled
+
+
+def span(name: str, cat: str = "chiquito", **args: Any):
+    if tracer is None:
+        return _disabled_span
+    return tracer.span(name, cat, args)
+
+
+def export_chrome_trace(path: str):
+    if tracer is None:
+        raise ValueError("Tracing is not enabled.")
+    tracer.export_chrome_trace(path)
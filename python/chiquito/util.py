@@ -1,9 +1,10 @@
 from __future__ import annotations
-from py_ecc import bn128
+from typing import Any, List
 from uuid import uuid1
+import importlib
 import json
-
-F = bn128.FQ
+import os
+import sys
 
 
 def json_method(self: F):
@@ -16,13 +17,90 @@ def json_method(self: F):
     return ints
 
 
-F.__json__ = json_method
+# Importing py_ecc takes most of a second (it precomputes pairing constants for several curves), so
+# `F` is a stand-in for `py_ecc.bn128.FQ` that imports it on first use. `F(...)`, `isinstance(x, F)`
+# and class attributes such as `F.zero` and `F.field_modulus` behave as on `FQ`.
+field_class = None
+
+
+def load_field_class():
+    global field_class
+    if field_class is None:
+        from py_ecc import bn128
+
+        field_class = bn128.FQ
+        field_class.__json__ = json_method
+    return field_class
+
+
+class LazyField(type):
+    def __call__(cls, *args, **kwargs):
+        return load_field_class()(*args, **kwargs)
+
+    def __instancecheck__(cls, instance) -> bool:
+        # No FQ instance can exist before py_ecc.bn128 has been imported by someone.
+        if field_class is None and "py_ecc.bn128" not in sys.modules:
+            return False
+        return isinstance(instance, load_field_class())
+
+    def __subclasscheck__(cls, subclass) -> bool:
+        if field_class is None and "py_ecc.bn128" not in sys.modules:
+            return False
+        return issubclass(subclass, load_field_class())
+
+    def __getattr__(cls, name: str):
+        return getattr(load_field_class(), name)
+
+
+class F(metaclass=LazyField):
+    pass
+
+
+# Modulus of the BN254 scalar field Fr, over which the circuit is proved. `F` is the bn128 base
+# field, so arithmetic that has to agree with the prover is done modulo this instead.
+SCALAR_MODULUS = (
+    21888242871839275222246405745257275088548364400416034343698204186575808495617
+)
+
+
+def from_limbs(limbs: List[int]) -> F:
+    return F(sum(limb << (64 * i) for i, limb in enumerate(limbs)))
+
+
+# Converts a column of values to field elements. Accepts anything with `to_pylist` (Arrow arrays),
+# `tolist` (NumPy arrays) or any iterable, of integers or of four little-endian u64 limbs per value
+# (e.g. a NumPy array of shape (n, 4)), so that NumPy and Arrow are not dependencies.
+def to_field_column(column: Any) -> List[F]:
+    if hasattr(column, "to_pylist"):
+        values = column.to_pylist()
+    elif hasattr(column, "tolist"):
+        values = column.tolist()
+    else:
+        values = list(column)
+    if values and isinstance(values[0], (list, tuple)):
+        if any(len(limbs) != 4 for limbs in values):
+            raise ValueError("Limb columns must have 4 limbs per value.")
+        return [from_limbs(limbs) for limbs in values]
+    return [F(value) for value in values]
+
+
+# Root of the on-disk caches (keys, witnesses): `$CHIQUITO_CACHE_DIR` or `~/.cache/chiquito`.
+def default_cache_dir() -> str:
+    return os.environ.get("CHIQUITO_CACHE_DIR", os.path.expanduser("~/.cache/chiquito"))
+
+
+# The compiled extension is only needed once a circuit is sent to Rust, so it is imported on
+# first use rather than when `chiquito.dsl` is imported.
+def rust_chiquito():
+    return importlib.import_module("chiquito.rust_chiquito")
 
 
 class CustomEncoder(json.JSONEncoder):
     def default(self, obj):
         if hasattr(obj, "__json__"):
             return obj.__json__()
+        if isinstance(obj, F):
+            return json_method(obj)
         return super().default(obj)
 
 
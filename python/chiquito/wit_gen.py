@@ -1,19 +1,29 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional
 import json
 
 from chiquito.query import Queriable, Fixed
 from chiquito.util import F, CustomEncoder
+from chiquito.memory import MemoryReport, witness_memory_report
+from chiquito.witness_encoding import CompressedWitness, compress_witness
+from chiquito import tracing
 
 # Commented out to avoid circular reference
 # from dsl import Circuit, StepType
 
 
+# Computes the value of a later-phase signal once the challenges are known, from the challenges
+# and the resolved previous step instance (None for the first step), e.g. to accumulate a random
+# linear combination across steps. Phase 1 values are captured by the callback.
+DeferredAssignment = Callable[[List[F], Optional["StepInstance"]], F]
+
+
 @dataclass
 class StepInstance:
     step_type_uuid: int = 0
     assignments: Dict[Queriable, F] = field(default_factory=dict)
+    deferred: Dict[Queriable, DeferredAssignment] = field(default_factory=dict)
 
     def new(step_type_uuid: int) -> StepInstance:
         return StepInstance(step_type_uuid, {})
@@ -21,6 +31,11 @@ class StepInstance:
     def assign(self: StepInstance, lhs: Queriable, rhs: F):
         self.assignments[lhs] = rhs
 
+    def assign_deferred(
+        self: StepInstance, lhs: Queriable, compute: DeferredAssignment
+    ):
+        self.deferred[lhs] = compute
+
     def __str__(self: StepInstance):
         assignments_str = (
             "\n\t\t\t\t"
@@ -51,9 +66,38 @@ class StepInstance:
 Witness = List[StepInstance]
 
 
+# Where `Circuit.gen_witness_incremental` can resume a trace: the number of steps already added and
+# the state `trace_from` needs to continue, as recorded by `Circuit.resume_point` during `trace`.
+@dataclass
+class ResumePoint:
+    step_index: int
+    state: Any = None
+
+
+# Steps that differ between two witnesses of the same circuit. `changed` includes steps that only
+# exist in the newer witness; `removed` are steps that only exist in the older one.
+@dataclass
+class WitnessDiff:
+    changed: List[int] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+
+    def __bool__(self: WitnessDiff) -> bool:
+        return bool(self.changed or self.removed)
+
+    # Steps whose constraints can change result: the changed steps, and the steps before them,
+    # whose transition constraints query the next step. Constraints on shared signals with
+    # rotations beyond the next step are not covered.
+    def affected_steps(self: WitnessDiff) -> List[int]:
+        steps = set(self.changed)
+        steps.update(step - 1 for step in self.changed if step > 0)
+        steps.update(step - 1 for step in self.removed if step > 0)
+        return sorted(steps)
+
+
 @dataclass
 class TraceWitness:
     step_instances: Witness = field(default_factory=list)
+    resume_points: List[ResumePoint] = field(default_factory=list)
 
     def __str__(self: TraceWitness):
         step_instances_str = (
@@ -67,7 +111,33 @@ class TraceWitness:
         )
         return f"TraceWitness(\n" f"\tstep_instances={{{step_instances_str}}},\n" f")"
 
+    def has_deferred(self: TraceWitness) -> bool:
+        return any(step_instance.deferred for step_instance in self.step_instances)
+
+    # Runs the deferred assignments with `challenges`, in step order. Step instances without
+    # deferred assignments are shared with this witness, so resolving the same phase 1 trace for
+    # another challenge only recomputes the later-phase values.
+    def resolve(self: TraceWitness, challenges: List[F]) -> TraceWitness:
+        step_instances = []
+        previous = None
+        with tracing.span("resolve", steps=len(self.step_instances)):
+            for step_instance in self.step_instances:
+                if step_instance.deferred:
+                    resolved = StepInstance(
+                        step_instance.step_type_uuid, dict(step_instance.assignments)
+                    )
+                    for lhs, compute in step_instance.deferred.items():
+                        resolved.assign(lhs, F(compute(challenges, previous)))
+                    step_instance = resolved
+                step_instances.append(step_instance)
+                previous = step_instance
+        return TraceWitness(step_instances, list(self.resume_points))
+
     def __json__(self: TraceWitness):
+        if self.has_deferred():
+            raise ValueError(
+                "Cannot serialize deferred assignments, resolve the witness first."
+            )
         return {
             "step_instances": [
                 step_instance.__json__() for step_instance in self.step_instances
@@ -75,7 +145,46 @@ class TraceWitness:
         }
 
     def get_witness_json(self: TraceWitness) -> str:
-        return json.dumps(self, cls=CustomEncoder, indent=4)
+        with tracing.span("get_witness_json", steps=len(self.step_instances)):
+            return json.dumps(self, cls=CustomEncoder, indent=4)
+
+    # Columnar JSON with a per-column encoding (constant, run-length, dictionary, small-int or
+    # raw), much smaller than `get_witness_json` for constant or slowly changing signals. See
+    # witness_encoding.py.
+    def compress(self: TraceWitness) -> CompressedWitness:
+        return compress_witness(self)
+
+    # Step instances are compared by identity first, so steps kept by
+    # `Circuit.gen_witness_incremental` and memoized step instances are cheap to compare.
+    def diff(self: TraceWitness, previous: TraceWitness) -> WitnessDiff:
+        (steps, previous_steps) = (self.step_instances, previous.step_instances)
+        changed = [
+            i
+            for i in range(min(len(steps), len(previous_steps)))
+            if steps[i] is not previous_steps[i] and steps[i] != previous_steps[i]
+        ]
+        changed.extend(range(len(previous_steps), len(steps)))
+        return WitnessDiff(changed, list(range(len(steps), len(previous_steps))))
+
+    # For witnesses generated before `ASTCircuit.dedup_step_types`, with the mapping it returned.
+    # Assignment dicts are rebuilt because the merged internal signals changed ids.
+    def remap_step_types(self: TraceWitness, merged: Dict[int, int]) -> TraceWitness:
+        return TraceWitness(
+            [
+                StepInstance(
+                    merged.get(
+                        step_instance.step_type_uuid, step_instance.step_type_uuid
+                    ),
+                    dict(step_instance.assignments.items()),
+                    dict(step_instance.deferred),
+                )
+                for step_instance in self.step_instances
+            ]
+        )
+
+    # Pass the circuit AST to name step types in the report.
+    def memory_report(self: TraceWitness, ast=None) -> MemoryReport:
+        return witness_memory_report(self, ast)
 
     def evil_witness_test(
         self: TraceWitness,
@@ -87,10 +196,17 @@ class TraceWitness:
             raise ValueError(f"`evil_witness_test` inputs have different lengths.")
         new_step_instances = self.step_instances.copy()
         for i in range(len(step_instance_indices)):
-            keys = list(new_step_instances[step_instance_indices[i]].assignments.keys())
-            new_step_instances[step_instance_indices[i]].assignments[
-                keys[assignment_indices[i]]
-            ] = rhs[i]
+            # Step instances may be shared between steps (see `StepType.memoize`), so the
+            # modified step instance is copied rather than mutated.
+            step_instance = new_step_instances[step_instance_indices[i]]
+            step_instance = StepInstance(
+                step_instance.step_type_uuid,
+                dict(step_instance.assignments),
+                dict(step_instance.deferred),
+            )
+            keys = list(step_instance.assignments.keys())
+            step_instance.assignments[keys[assignment_indices[i]]] = rhs[i]
+            new_step_instances[step_instance_indices[i]] = step_instance
         return TraceWitness(new_step_instances)
 
 
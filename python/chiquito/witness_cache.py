@@ -0,0 +1,192 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import pickle
+import zlib
+
+from chiquito.util import default_cache_dir
+from chiquito.wit_gen import StepInstance, TraceWitness
+from chiquito.witness_encoding import decode_column, decode_values, encode_witness
+from chiquito.witness_file import witness_queriables
+from chiquito import tracing
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit
+# from chiquito.dsl import Circuit
+
+# Persistent cache of `Circuit.gen_witness` results. Entries are keyed by the circuit class, the
+# AST fingerprint, `namespace` and a hash of the pickled trace args, so args must pickle
+# deterministically (plain data: ints, strings, tuples, lists, dicts). Changes to `trace` or `wg`
+# that don't change the AST are not detected: change `namespace` or `clear` the cache after them.
+#
+# Witnesses are stored as zlib-compressed columnar JSON (see witness_encoding.py), with signals and
+# step types referenced by their position in the AST, since ids change on every run of `setup`.
+# Files are written through a temporary file and renamed, so concurrent processes sharing the
+# directory never read partial entries, and unreadable entries are treated as misses. When the
+# directory grows beyond `max_bytes`, the least recently used entries are removed.
+
+DEFAULT_MAX_BYTES = 1 << 30
+SUFFIX = ".witness"
+
+
+@dataclass
+class WitnessCacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    def hit_rate(self: WitnessCacheStats) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self: WitnessCacheStats):
+        return (
+            f"WitnessCacheStats(hits={self.hits}, misses={self.misses}, "
+            f"hit_rate={self.hit_rate():.2f}, writes={self.writes}, "
+            f"evictions={self.evictions})"
+        )
+
+
+class WitnessCache:
+    def __init__(
+        self: WitnessCache,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        namespace: str = "",
+    ):
+        if cache_dir is None:
+            cache_dir = os.path.join(default_cache_dir(), "witnesses")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.stats = WitnessCacheStats()
+        # {AST id: fingerprint}, ASTs don't change after setup.
+        self.fingerprints: Dict[int, str] = {}
+
+    def key(self: WitnessCache, circuit: Circuit, args: Any) -> str:
+        fingerprint = self.fingerprints.get(circuit.ast.id)
+        if fingerprint is None:
+            fingerprint = self.fingerprints[circuit.ast.id] = circuit.ast.fingerprint()
+        digest = hashlib.sha256()
+        for part in (
+            f"{type(circuit).__module__}.{type(circuit).__qualname__}",
+            fingerprint,
+            self.namespace,
+        ):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        digest.update(pickle.dumps(args, protocol=4))
+        return digest.hexdigest()
+
+    def path(self: WitnessCache, key: str) -> str:
+        return os.path.join(self.cache_dir, key + SUFFIX)
+
+    def get(self: WitnessCache, circuit: Circuit, args: Any) -> Optional[TraceWitness]:
+        path = self.path(self.key(circuit, args))
+        with tracing.span("witness_cache_get"):
+            try:
+                with open(path, "rb") as f:
+                    encoded = json.loads(zlib.decompress(f.read()))
+                witness = decode(circuit.ast, encoded)
+            except FileNotFoundError:
+                self.stats.misses += 1
+                return None
+            except (OSError, ValueError, KeyError, IndexError, zlib.error):
+                self.stats.misses += 1
+                remove(path)
+                return None
+        self.stats.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return witness
+
+    def put(self: WitnessCache, circuit: Circuit, args: Any, witness: TraceWitness):
+        path = self.path(self.key(circuit, args))
+        with tracing.span("witness_cache_put", steps=len(witness.step_instances)):
+            data = zlib.compress(
+                json.dumps(encode(circuit.ast, witness), separators=(",", ":")).encode()
+            )
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self.stats.writes += 1
+        self.evict()
+
+    def entries(self: WitnessCache) -> List[os.DirEntry]:
+        with os.scandir(self.cache_dir) as it:
+            return [entry for entry in it if entry.name.endswith(SUFFIX)]
+
+    def evict(self: WitnessCache):
+        sized = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            sized.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for (_, size, _) in sized)
+        for _, size, path in sorted(sized):
+            if total <= self.max_bytes:
+                break
+            if remove(path):
+                self.stats.evictions += 1
+            total -= size
+
+    def size(self: WitnessCache) -> int:
+        total = 0
+        for entry in self.entries():
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def clear(self: WitnessCache):
+        for entry in self.entries():
+            remove(entry.path)
+
+
+def remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def encode(ast: ASTCircuit, witness: TraceWitness) -> Dict:
+    signal_indexes = {
+        signal_id: i for i, signal_id in enumerate(witness_queriables(ast))
+    }
+    step_type_indexes = {
+        step_type_id: i for i, step_type_id in enumerate(ast.step_types)
+    }
+    return encode_witness(
+        witness, signal_indexes.__getitem__, step_type_indexes.__getitem__
+    )
+
+
+def decode(ast: ASTCircuit, encoded: Dict) -> TraceWitness:
+    num_steps = encoded["num_steps"]
+    queriables = list(witness_queriables(ast).values())
+    step_type_ids = list(ast.step_types)
+    step_instances = [
+        StepInstance(step_type_ids[index], {})
+        for index in decode_column(encoded["step_types"], num_steps)
+    ]
+    for index, column in encoded["signals"]:
+        queriable = queriables[index]
+        for step_instance, value in zip(
+            step_instances, decode_values(column, num_steps)
+        ):
+            if value is not None:
+                step_instance.assignments[queriable] = value
+    return TraceWitness(step_instances)
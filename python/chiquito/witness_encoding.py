@@ -0,0 +1,151 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import json
+
+from chiquito.util import F, from_limbs, json_method
+from chiquito import tracing
+
+# Commented out to avoid circular reference
+# from chiquito.wit_gen import TraceWitness
+
+# Columnar witness encoding, decoded by the Rust side (src/witness_encoding.rs):
+#
+#     {"num_steps": N, "step_types": column, "signals": [[signal id, column], ...]}
+#
+# Columns hold one value per step, `null` where the step doesn't assign the signal, and are encoded
+# as one of:
+#
+# - {"Constant": value}: the same value on every step.
+# - {"RunLength": [[value, count], ...]}
+# - {"Dictionary": [[value, ...], [index, ...]]}: distinct values, and their index per step.
+# - {"SmallInt": [int, ...]}: values below 2^64 as plain integers.
+# - {"Raw": [value, ...]}
+#
+# Values are field elements as four u64 limbs, like `F.__json__`, or step type ids. Signals are
+# referenced by id and resolved against the circuit registered in Rust.
+
+SMALL_INT_BOUND = 2**64
+# RunLength and Dictionary are used when they take at most this fraction of the values.
+COMPRESSION_RATIO = 4
+
+
+def runs(values: List[Any]) -> List[List[Any]]:
+    result = []
+    for value in values:
+        if result and result[-1][0] == value:
+            result[-1][1] += 1
+        else:
+            result.append([value, 1])
+    return result
+
+
+# `values` are ints or None; `encode_value` turns the ints of Constant, RunLength, Dictionary and
+# Raw columns into their JSON values.
+def encode_column(values: List[Optional[int]], encode_value=lambda n: n) -> Dict:
+    encode = lambda n: None if n is None else encode_value(n)
+    distinct = set(values)
+    if len(distinct) == 1:
+        return {"Constant": encode(values[0])}
+    column_runs = runs(values)
+    if len(column_runs) * COMPRESSION_RATIO <= len(values):
+        return {"RunLength": [[encode(value), count] for value, count in column_runs]}
+    if all(value is None or value < SMALL_INT_BOUND for value in values):
+        return {"SmallInt": values}
+    if len(distinct) * COMPRESSION_RATIO <= len(values):
+        dictionary = list(distinct)
+        indexes = {value: i for i, value in enumerate(dictionary)}
+        return {
+            "Dictionary": [
+                [encode(value) for value in dictionary],
+                [indexes[value] for value in values],
+            ]
+        }
+    return {"Raw": [encode(value) for value in values]}
+
+
+def decode_column(column: Dict, num_steps: int) -> List[Any]:
+    match column:
+        case {"Constant": value}:
+            return [value] * num_steps
+        case {"RunLength": column_runs}:
+            return [value for value, count in column_runs for _ in range(count)]
+        case {"Dictionary": [dictionary, indexes]}:
+            return [dictionary[index] for index in indexes]
+        case {"SmallInt": values} | {"Raw": values}:
+            return values
+        case _:
+            raise ValueError(f"Unknown column encoding {list(column)}.")
+
+
+def limbs(n: int) -> List[int]:
+    return json_method(F(n))
+
+
+# Built by `TraceWitness.compress`. The prover methods accept it in place of the witness.
+@dataclass
+class CompressedWitness:
+    json: str
+
+    def __len__(self: CompressedWitness) -> int:
+        return len(self.json)
+
+    def save(self: CompressedWitness, path: str):
+        with open(path, "w") as f:
+            f.write(self.json)
+
+    def load(path: str) -> CompressedWitness:
+        with open(path) as f:
+            return CompressedWitness(f.read())
+
+
+# Columns of `witness` as encoded above, with signals and step types referenced by
+# `signal_ref(signal id)` and `step_type_ref(step type id)`.
+def encode_witness(
+    witness: TraceWitness,
+    signal_ref: Callable[[int], Any] = lambda signal_id: signal_id,
+    step_type_ref: Callable[[int], Any] = lambda step_type_id: step_type_id,
+) -> Dict:
+    if witness.has_deferred():
+        raise ValueError(
+            "Cannot encode deferred assignments, resolve the witness first."
+        )
+    step_instances = witness.step_instances
+    columns: Dict[int, List[Optional[int]]] = {}
+    for step, step_instance in enumerate(step_instances):
+        for lhs, rhs in step_instance.assignments.items():
+            if getattr(lhs, "rotation", 0):
+                raise ValueError(f"Cannot encode assignments to {lhs}, a later row.")
+            column = columns.get(lhs.uuid())
+            if column is None:
+                column = columns[lhs.uuid()] = [None] * len(step_instances)
+            column[step] = F(rhs).n
+    return {
+        "num_steps": len(step_instances),
+        "step_types": encode_column(
+            [step_type_ref(s.step_type_uuid) for s in step_instances]
+        ),
+        "signals": [
+            [signal_ref(signal_id), encode_column(values, limbs)]
+            for signal_id, values in columns.items()
+        ],
+    }
+
+
+# Inverse of `encode_column` for value columns: field elements, or None where unassigned.
+def decode_values(column: Dict, num_steps: int) -> List[Optional[F]]:
+    return [
+        None
+        if value is None
+        else from_limbs(value)
+        if isinstance(value, list)
+        else F(value)
+        for value in decode_column(column, num_steps)
+    ]
+
+
+def compress_witness(witness: TraceWitness) -> CompressedWitness:
+    with tracing.span("compress_witness", steps=len(witness.step_instances)):
+        return CompressedWitness(
+            json.dumps(encode_witness(witness), separators=(",", ":"))
+        )
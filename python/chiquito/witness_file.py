@@ -0,0 +1,221 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional
+import mmap
+import os
+import struct
+
+from chiquito.query import Forward, Internal, Queriable, Shared
+from chiquito.util import F
+from chiquito.wit_gen import StepInstance, TraceWitness
+
+# Commented out to avoid circular reference
+# from chiquito.chiquito_ast import ASTCircuit
+
+# On-disk witness format, read through mmap here and by the Rust prover (src/witness_file.rs), so
+# that trace generation in Python is bounded by disk rather than RAM. The Rust prover still loads
+# the whole witness to assign it. All integers are little-endian, and sections
+# start at multiples of SECTION_ALIGN bytes:
+#
+# - header (HEADER_SIZE bytes): MAGIC, version u32, reserved u32, number of signals S u64,
+#   capacity N u64 (maximum number of steps), number of steps u64, circuit id u128.
+# - signal ids: S u128, the order of the value columns.
+# - step type column: N u128 step type ids.
+# - S presence bitmaps of N bits: bit i of bitmap j is set if step i assigns signal j.
+# - S value columns of N 32-byte little-endian field elements.
+#
+# The file is created at full size and is sparse until written.
+
+MAGIC = b"CHQWITNS"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ16s")
+HEADER_SIZE = 64
+SECTION_ALIGN = 64
+VALUE_SIZE = 32
+
+
+def align(offset: int) -> int:
+    return (offset + SECTION_ALIGN - 1) // SECTION_ALIGN * SECTION_ALIGN
+
+
+# Byte offsets of the sections for `signals` signals and `capacity` steps.
+class Layout:
+    def __init__(self: Layout, signals: int, capacity: int):
+        self.signals = signals
+        self.capacity = capacity
+        self.signal_ids = HEADER_SIZE
+        self.step_types = align(self.signal_ids + 16 * signals)
+        self.bitmap_size = align((capacity + 7) // 8)
+        self.bitmaps = align(self.step_types + 16 * capacity)
+        self.values = align(self.bitmaps + self.bitmap_size * signals)
+        self.size = self.values + VALUE_SIZE * capacity * signals
+
+    def bitmap(self: Layout, signal: int) -> int:
+        return self.bitmaps + self.bitmap_size * signal
+
+    def value(self: Layout, signal: int, step: int) -> int:
+        return self.values + VALUE_SIZE * (self.capacity * signal + step)
+
+
+# Queriables that can be assigned in a witness, keyed by signal id, in file column order.
+def witness_queriables(ast: ASTCircuit) -> Dict[int, Queriable]:
+    queriables: Dict[int, Queriable] = {}
+    for signal in ast.forward_signals:
+        queriables[signal.id] = Forward(signal, False)
+    for signal in ast.shared_signals:
+        queriables[signal.id] = Shared(signal, 0)
+    for step_type in ast.step_types.values():
+        for signal in step_type.signals:
+            queriables[signal.id] = Internal(signal)
+    return queriables
+
+
+class WitnessFileWriter:
+    def __init__(self: WitnessFileWriter, path: str, ast: ASTCircuit):
+        self.path = path
+        self.columns = {
+            signal_id: i for i, signal_id in enumerate(witness_queriables(ast))
+        }
+        self.layout = Layout(len(self.columns), ast.num_steps)
+        self.num_steps = 0
+        with open(path, "wb") as f:
+            f.truncate(self.layout.size)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), self.layout.size)
+        self.map[: HEADER.size] = HEADER.pack(
+            MAGIC,
+            VERSION,
+            0,
+            len(self.columns),
+            ast.num_steps,
+            0,
+            ast.id.to_bytes(16, "little"),
+        )
+        for signal_id, i in self.columns.items():
+            offset = self.layout.signal_ids + 16 * i
+            self.map[offset : offset + 16] = signal_id.to_bytes(16, "little")
+
+    def append(self: WitnessFileWriter, step_instance: StepInstance):
+        step = self.num_steps
+        if step_instance.deferred:
+            raise ValueError(
+                "Cannot write deferred assignments, resolve the witness first."
+            )
+        if step >= self.layout.capacity:
+            raise ValueError(f"Number of step instances exceeds {self.layout.capacity}")
+        offset = self.layout.step_types + 16 * step
+        self.map[offset : offset + 16] = step_instance.step_type_uuid.to_bytes(
+            16, "little"
+        )
+        for lhs, rhs in step_instance.assignments.items():
+            column = self.columns.get(lhs.uuid())
+            # Values are stored by signal, without the rotation of the target.
+            if column is None or getattr(lhs, "rotation", 0):
+                raise ValueError(f"Signal {lhs} cannot be assigned in a witness file.")
+            offset = self.layout.value(column, step)
+            self.map[offset : offset + VALUE_SIZE] = F(rhs).n.to_bytes(
+                VALUE_SIZE, "little"
+            )
+            bitmap = self.layout.bitmap(column) + step // 8
+            self.map[bitmap] |= 1 << (step % 8)
+        self.num_steps += 1
+
+    def extend(self: WitnessFileWriter, step_instances: Iterable[StepInstance]):
+        for step_instance in step_instances:
+            self.append(step_instance)
+
+    def __len__(self: WitnessFileWriter) -> int:
+        return self.num_steps
+
+    def close(self: WitnessFileWriter):
+        if self.map.closed:
+            return
+        self.map[32:40] = struct.pack("<Q", self.num_steps)
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self: WitnessFileWriter) -> WitnessFileWriter:
+        return self
+
+    def __exit__(self: WitnessFileWriter, *exc_info):
+        self.close()
+
+
+# Stands in for the `TraceWitness` being built while `Circuit.gen_witness_file` runs `trace`, so
+# that `Circuit.add` writes step instances to the file.
+class WitnessFileTrace:
+    def __init__(self: WitnessFileTrace, writer: WitnessFileWriter):
+        self.step_instances = writer
+        self.resume_points = []
+
+
+class WitnessFile:
+    def __init__(self: WitnessFile, path: str):
+        self.path = os.fspath(path)
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, signals, capacity, num_steps, circuit_id) = HEADER.unpack(
+            self.map[: HEADER.size]
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a chiquito witness file.")
+        if version != VERSION:
+            raise ValueError(
+                f"{self.path} has witness file version {version}, expected {VERSION}."
+            )
+        self.layout = Layout(signals, capacity)
+        if len(self.map) < self.layout.size:
+            raise ValueError(f"{self.path} is truncated.")
+        self.num_steps = num_steps
+        self.circuit_id = int.from_bytes(circuit_id, "little")
+        self.signal_ids: List[int] = [
+            self.read_u128(self.layout.signal_ids + 16 * i) for i in range(signals)
+        ]
+        self.columns = {signal_id: i for i, signal_id in enumerate(self.signal_ids)}
+
+    def read_u128(self: WitnessFile, offset: int) -> int:
+        return int.from_bytes(self.map[offset : offset + 16], "little")
+
+    def __len__(self: WitnessFile) -> int:
+        return self.num_steps
+
+    def step_type_uuid(self: WitnessFile, step: int) -> int:
+        return self.read_u128(self.layout.step_types + 16 * step)
+
+    def value(self: WitnessFile, step: int, signal_id: int) -> Optional[F]:
+        column = self.columns[signal_id]
+        if not self.map[self.layout.bitmap(column) + step // 8] & (1 << (step % 8)):
+            return None
+        offset = self.layout.value(column, step)
+        return F(int.from_bytes(self.map[offset : offset + VALUE_SIZE], "little"))
+
+    def step_instance(self: WitnessFile, step: int, ast: ASTCircuit) -> StepInstance:
+        if ast.id != self.circuit_id:
+            raise ValueError(
+                f"{self.path} was written for circuit {self.circuit_id}, not {ast.id}."
+            )
+        if not 0 <= step < self.num_steps:
+            raise IndexError(f"Step {step} is outside the witness file.")
+        queriables = witness_queriables(ast)
+        step_instance = StepInstance.new(self.step_type_uuid(step))
+        for signal_id in self.signal_ids:
+            value = self.value(step, signal_id)
+            if value is not None:
+                step_instance.assign(queriables[signal_id], value)
+        return step_instance
+
+    # Loads the whole witness into memory, for small files and tests.
+    def to_trace_witness(self: WitnessFile, ast: ASTCircuit) -> TraceWitness:
+        return TraceWitness(
+            [self.step_instance(step, ast) for step in range(self.num_steps)]
+        )
+
+    def close(self: WitnessFile):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self: WitnessFile) -> WitnessFile:
+        return self
+
+    def __exit__(self: WitnessFile, *exc_info):
+        self.close()
@@ -0,0 +1,366 @@
+use chiquito::{
+    ast::{
+        expr::{query::Queriable, Expr},
+        Circuit,
+    },
+    util::UUID,
+    wit_gen::TraceWitness,
+};
+use halo2_proofs::halo2curves::{bn256::Fr, group::ff::Field};
+use pyo3::prelude::*;
+use rayon::prelude::*;
+use std::{
+    collections::{HashMap, HashSet},
+    time::{Duration, Instant},
+};
+
+use crate::prover::{FailureReport, MockProverReport};
+
+// Steps checked per rayon task.
+const CHUNK_STEPS: usize = 1024;
+
+// A fast, parallel pre-check of a witness against the circuit constraints, evaluated directly on
+// the AST instead of the compiled halo2 circuit. Step constraints are checked on every step and
+// transition constraints on every step but the last, the same as the compiled selectors. Fixed
+// signals are only known to the halo2 backend, so constraints that query them are skipped; the
+// mock prover remains the complete check.
+
+struct CheckConstraint {
+    annotation: String,
+    expr: Expr<Fr>,
+}
+
+struct CheckStepType {
+    name: String,
+    constraints: Vec<CheckConstraint>,
+    transition_constraints: Vec<CheckConstraint>,
+}
+
+// Owns a copy of the constraints without the `Rc`s of the AST, so that it can be shared between
+// rayon threads.
+pub struct CheckPlan {
+    step_types: HashMap<UUID, CheckStepType>,
+    first_step: Option<UUID>,
+    last_step: Option<UUID>,
+    // Smallest and largest step offsets queried by a constraint: forward signals and the next
+    // step type query the next step, shared signals any rotation.
+    rotations: (i64, i64),
+}
+
+// Assignments of one step, keyed by signal UUID.
+struct CheckStep {
+    step_type_uuid: UUID,
+    values: HashMap<UUID, Fr>,
+}
+
+fn uses_fixed(expr: &Expr<Fr>) -> bool {
+    match expr {
+        Expr::Sum(exprs) | Expr::Mul(exprs) => exprs.iter().any(uses_fixed),
+        Expr::Neg(expr) | Expr::Pow(expr, _) => uses_fixed(expr),
+        Expr::Query(Queriable::Fixed(..)) => true,
+        _ => false,
+    }
+}
+
+fn rotations(expr: &Expr<Fr>, range: &mut (i64, i64)) {
+    match expr {
+        Expr::Sum(exprs) | Expr::Mul(exprs) => exprs.iter().for_each(|expr| rotations(expr, range)),
+        Expr::Neg(expr) | Expr::Pow(expr, _) => rotations(expr, range),
+        Expr::Query(Queriable::Shared(_, rotation)) => {
+            range.0 = range.0.min(*rotation as i64);
+            range.1 = range.1.max(*rotation as i64);
+        }
+        _ => {}
+    }
+}
+
+fn check_constraints<'a>(
+    constraints: impl Iterator<Item = (&'a String, &'a Expr<Fr>)>,
+) -> Vec<CheckConstraint> {
+    constraints
+        .filter(|(_, expr)| !uses_fixed(expr))
+        .map(|(annotation, expr)| CheckConstraint {
+            annotation: annotation.clone(),
+            expr: expr.clone(),
+        })
+        .collect()
+}
+
+impl CheckPlan {
+    pub fn new(ast: &Circuit<Fr, ()>) -> Self {
+        let step_types = ast
+            .step_types
+            .iter()
+            .map(|(uuid, step_type)| {
+                (
+                    *uuid,
+                    CheckStepType {
+                        name: step_type.name.clone(),
+                        constraints: check_constraints(
+                            step_type
+                                .constraints
+                                .iter()
+                                .map(|c| (&c.annotation, &c.expr)),
+                        ),
+                        transition_constraints: check_constraints(
+                            step_type
+                                .transition_constraints
+                                .iter()
+                                .map(|c| (&c.annotation, &c.expr)),
+                        ),
+                    },
+                )
+            })
+            .collect();
+
+        let mut range = (0, 1);
+        for step_type in ast.step_types.values() {
+            for expr in step_type
+                .constraints
+                .iter()
+                .map(|c| &c.expr)
+                .chain(step_type.transition_constraints.iter().map(|c| &c.expr))
+            {
+                rotations(expr, &mut range);
+            }
+        }
+
+        CheckPlan {
+            step_types,
+            first_step: ast.first_step,
+            last_step: ast.last_step,
+            rotations: range,
+        }
+    }
+
+    // Steps whose assignments are read when checking `steps`: each of them and the steps their
+    // constraints query. The other steps only need their step type.
+    pub fn queried_steps(&self, steps: &[usize]) -> HashSet<usize> {
+        let (min, max) = self.rotations;
+        steps
+            .iter()
+            .flat_map(|step| (min..=max).map(move |rotation| *step as i64 + rotation))
+            .filter_map(|step| usize::try_from(step).ok())
+            .collect()
+    }
+
+    fn step_type_name(&self, step_type_uuid: UUID) -> Option<String> {
+        self.step_types
+            .get(&step_type_uuid)
+            .map(|step_type| step_type.name.clone())
+    }
+}
+
+// Unassigned cells are zero in the halo2 assignment, so missing values evaluate to zero. Returns
+// None for queries the check cannot evaluate.
+fn eval(expr: &Expr<Fr>, steps: &[CheckStep], index: usize) -> Option<Fr> {
+    let value = |step: Option<&CheckStep>, uuid: UUID| {
+        step.and_then(|step| step.values.get(&uuid).copied())
+            .unwrap_or(Fr::ZERO)
+    };
+
+    match expr {
+        Expr::Const(value) => Some(*value),
+        Expr::Sum(exprs) => exprs
+            .iter()
+            .try_fold(Fr::ZERO, |acc, expr| Some(acc + eval(expr, steps, index)?)),
+        Expr::Mul(exprs) => exprs
+            .iter()
+            .try_fold(Fr::ONE, |acc, expr| Some(acc * eval(expr, steps, index)?)),
+        Expr::Neg(expr) => Some(-eval(expr, steps, index)?),
+        Expr::Pow(expr, pow) => Some(eval(expr, steps, index)?.pow_vartime([*pow as u64])),
+        Expr::Query(queriable) => match queriable {
+            Queriable::Internal(signal) => Some(value(steps.get(index), signal.uuid())),
+            Queriable::Forward(signal, next) => {
+                Some(value(steps.get(index + usize::from(*next)), signal.uuid()))
+            }
+            Queriable::Shared(signal, rotation) => {
+                let step = (index as i64 + *rotation as i64)
+                    .try_into()
+                    .ok()
+                    .and_then(|index: usize| steps.get(index));
+                Some(value(step, signal.uuid()))
+            }
+            Queriable::StepTypeNext(step_type) => Some(match steps.get(index + 1) {
+                Some(next) if next.step_type_uuid == step_type.uuid() => Fr::ONE,
+                _ => Fr::ZERO,
+            }),
+            _ => None,
+        },
+        _ => None,
+    }
+}
+
+fn failure(
+    plan: &CheckPlan,
+    step_height: usize,
+    index: usize,
+    step_type_uuid: UUID,
+    annotation: Option<String>,
+    message: String,
+) -> FailureReport {
+    FailureReport {
+        kind: "ConstraintNotSatisfied",
+        message,
+        row: Some(index * step_height),
+        region: None,
+        step_index: Some(index),
+        step_type_uuid: Some(step_type_uuid),
+        step_type: plan.step_type_name(step_type_uuid),
+        annotation,
+    }
+}
+
+fn check_step(
+    plan: &CheckPlan,
+    step_height: usize,
+    steps: &[CheckStep],
+    index: usize,
+    failures: &mut Vec<FailureReport>,
+) {
+    let step_type_uuid = steps[index].step_type_uuid;
+    let step_type = match plan.step_types.get(&step_type_uuid) {
+        Some(step_type) => step_type,
+        None => {
+            failures.push(failure(
+                plan,
+                step_height,
+                index,
+                step_type_uuid,
+                None,
+                format!("Step type {} is not in the circuit.", step_type_uuid),
+            ));
+            return;
+        }
+    };
+    let transition_constraints = if index + 1 < steps.len() {
+        step_type.transition_constraints.as_slice()
+    } else {
+        &[]
+    };
+
+    for constraint in step_type
+        .constraints
+        .iter()
+        .chain(transition_constraints.iter())
+    {
+        match eval(&constraint.expr, steps, index) {
+            Some(value) if value != Fr::ZERO => failures.push(failure(
+                plan,
+                step_height,
+                index,
+                step_type_uuid,
+                Some(constraint.annotation.clone()),
+                format!(
+                    "Constraint '{}' in step type '{}' evaluates to {:?} at step {}.",
+                    constraint.annotation, step_type.name, value, index
+                ),
+            )),
+            _ => {}
+        }
+    }
+}
+
+fn check_pragmas(
+    plan: &CheckPlan,
+    step_height: usize,
+    steps: &[CheckStep],
+    failures: &mut Vec<FailureReport>,
+) {
+    let pragmas = [
+        ("first", plan.first_step, 0),
+        ("last", plan.last_step, steps.len().saturating_sub(1)),
+    ];
+    for (position, expected, index) in pragmas {
+        match (expected, steps.get(index)) {
+            (Some(expected), Some(step)) if step.step_type_uuid != expected => {
+                failures.push(failure(
+                    plan,
+                    step_height,
+                    index,
+                    step.step_type_uuid,
+                    None,
+                    format!(
+                        "The {} step must be of step type '{}'.",
+                        position,
+                        plan.step_type_name(expected)
+                            .unwrap_or_else(|| expected.to_string())
+                    ),
+                ))
+            }
+            _ => {}
+        }
+    }
+}
+
+fn check_steps(witness: TraceWitness<Fr>) -> Vec<CheckStep> {
+    witness
+        .step_instances
+        .into_par_iter()
+        .map(|step_instance| CheckStep {
+            step_type_uuid: step_instance.step_type_uuid,
+            values: step_instance
+                .assignments
+                .into_iter()
+                .map(|(queriable, value)| (queriable.uuid(), value))
+                .collect(),
+        })
+        .collect()
+}
+
+// Steps are checked in parallel chunks. Every chunk stops after `max_failures`, and the first
+// `max_failures` failures in step order are reported. `steps` restricts the check to some steps,
+// e.g. those affected by a change; the other steps are still read by transition constraints.
+pub fn check(
+    py: Python,
+    plan: &CheckPlan,
+    step_height: usize,
+    witness: TraceWitness<Fr>,
+    witness_deserialize: Duration,
+    max_failures: usize,
+    steps: Option<Vec<usize>>,
+) -> MockProverReport {
+    let (failures, check) = py.allow_threads(|| {
+        let start = Instant::now();
+        let check_steps = check_steps(witness);
+        let indices: Vec<usize> = match steps {
+            Some(mut steps) => {
+                steps.sort_unstable();
+                steps.dedup();
+                steps.retain(|index| *index < check_steps.len());
+                steps
+            }
+            None => (0..check_steps.len()).collect(),
+        };
+        let mut failures = vec![];
+        check_pragmas(plan, step_height, &check_steps, &mut failures);
+
+        let chunks: Vec<Vec<FailureReport>> = indices
+            .par_chunks(CHUNK_STEPS)
+            .map(|chunk| {
+                let mut failures = vec![];
+                for index in chunk {
+                    if failures.len() >= max_failures {
+                        break;
+                    }
+                    check_step(plan, step_height, &check_steps, *index, &mut failures);
+                }
+                failures
+            })
+            .collect();
+        failures.extend(chunks.into_iter().flatten());
+        failures.sort_by_key(|failure| failure.step_index);
+        failures.truncate(max_failures);
+
+        (failures, start.elapsed())
+    });
+
+    MockProverReport {
+        passed: failures.is_empty(),
+        failures,
+        timings: vec![
+            ("witness_deserialize", witness_deserialize.as_secs_f64()),
+            ("check", check.as_secs_f64()),
+        ],
+    }
+}
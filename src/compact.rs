@@ -0,0 +1,381 @@
+use chiquito::{
+    ast::{
+        expr::{query::Queriable, Expr},
+        Circuit, Constraint, ExposeOffset, FixedSignal, ForwardSignal, InternalSignal,
+        SharedSignal, StepType, TransitionConstraint,
+    },
+    frontend::dsl::StepTypeHandler,
+    util::UUID,
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use pyo3::{exceptions::PyValueError, prelude::*};
+use serde::Deserialize;
+use std::{collections::HashMap, rc::Rc};
+
+use crate::fr_from_limbs;
+
+// Decodes the compact AST of python/chiquito/compact_ast.py, which documents the format. Signals
+// and strings are built once from their tables and cloned at every query. The constraints of
+// template instances are decoded once per instance, with its parameters bound.
+
+#[derive(Deserialize)]
+enum CompactExpr {
+    #[serde(rename = "k")]
+    Small(u64),
+    #[serde(rename = "c")]
+    Const([u64; 4]),
+    #[serde(rename = "+")]
+    Sum(Vec<CompactExpr>),
+    #[serde(rename = "*")]
+    Mul(Vec<CompactExpr>),
+    #[serde(rename = "-")]
+    Neg(Box<CompactExpr>),
+    #[serde(rename = "^")]
+    Pow(Box<CompactExpr>, u32),
+    #[serde(rename = "q")]
+    Query(usize, i32),
+    #[serde(rename = "n")]
+    Next(usize),
+    #[serde(rename = "p")]
+    Param(usize),
+}
+
+#[derive(Deserialize)]
+enum CompactOffset {
+    First(i64),
+    Last(i64),
+    Step(usize),
+}
+
+type CompactConstraint = (usize, CompactExpr);
+
+#[derive(Deserialize)]
+#[serde(untagged)]
+enum CompactConstraints {
+    Inline(Vec<CompactConstraint>),
+    // Index of the step type that encodes the constraints, for instances of templates.
+    Shared(usize),
+}
+
+#[derive(Deserialize)]
+struct CompactStepType(
+    UUID,
+    usize,
+    Vec<usize>,
+    CompactConstraints,
+    CompactConstraints,
+    Vec<(usize, CompactExpr)>,
+);
+
+#[derive(Deserialize)]
+struct CompactCircuit {
+    strings: Vec<String>,
+    signals: Vec<(String, UUID, usize, usize)>,
+    step_types: Vec<CompactStepType>,
+    forward_signals: Vec<usize>,
+    shared_signals: Vec<usize>,
+    fixed_signals: Vec<usize>,
+    exposed: Vec<(usize, i32, CompactOffset)>,
+    annotations: Vec<(UUID, usize)>,
+    first_step: Option<usize>,
+    last_step: Option<usize>,
+    num_steps: usize,
+    q_enable: bool,
+    id: UUID,
+}
+
+enum Signal {
+    Forward(ForwardSignal),
+    Shared(SharedSignal),
+    Fixed(FixedSignal),
+    Internal(InternalSignal),
+}
+
+type Params = HashMap<usize, Fr>;
+
+fn out_of_range(table: &str, index: usize) -> PyErr {
+    PyValueError::new_err(format!("{} index {} out of range.", table, index))
+}
+
+struct Tables {
+    strings: Vec<String>,
+    signals: Vec<Signal>,
+    signal_names: Vec<String>,
+    step_types: Vec<StepTypeHandler>,
+}
+
+impl Tables {
+    fn string(&self, index: usize) -> PyResult<String> {
+        self.strings
+            .get(index)
+            .cloned()
+            .ok_or_else(|| out_of_range("String", index))
+    }
+
+    fn signal(&self, index: usize) -> PyResult<&Signal> {
+        self.signals
+            .get(index)
+            .ok_or_else(|| out_of_range("Signal", index))
+    }
+
+    fn signal_name(&self, index: usize) -> String {
+        self.signal_names[index].clone()
+    }
+
+    fn queriable(&self, index: usize, rotation: i32) -> PyResult<Queriable<Fr>> {
+        Ok(match self.signal(index)? {
+            Signal::Forward(signal) => Queriable::Forward(signal.clone(), rotation != 0),
+            Signal::Shared(signal) => Queriable::Shared(signal.clone(), rotation),
+            Signal::Fixed(signal) => Queriable::Fixed(signal.clone(), rotation),
+            Signal::Internal(signal) => Queriable::Internal(signal.clone()),
+        })
+    }
+
+    fn exprs(&self, exprs: &[CompactExpr], params: &Params) -> PyResult<Vec<Expr<Fr>>> {
+        exprs.iter().map(|expr| self.expr(expr, params)).collect()
+    }
+
+    // `params` binds the parameters of template instances, by name string index.
+    fn expr(&self, expr: &CompactExpr, params: &Params) -> PyResult<Expr<Fr>> {
+        Ok(match expr {
+            CompactExpr::Small(value) => Expr::Const(Fr::from(*value)),
+            CompactExpr::Const(limbs) => Expr::Const(fr_from_limbs(*limbs)),
+            CompactExpr::Sum(exprs) => Expr::Sum(self.exprs(exprs, params)?),
+            CompactExpr::Mul(exprs) => Expr::Mul(self.exprs(exprs, params)?),
+            CompactExpr::Neg(expr) => Expr::Neg(Box::new(self.expr(expr, params)?)),
+            CompactExpr::Pow(expr, pow) => Expr::Pow(Box::new(self.expr(expr, params)?), *pow),
+            CompactExpr::Query(index, rotation) => Expr::Query(self.queriable(*index, *rotation)?),
+            CompactExpr::Next(index) => Expr::Query(Queriable::StepTypeNext(
+                self.step_types
+                    .get(*index)
+                    .cloned()
+                    .ok_or_else(|| out_of_range("Step type", *index))?,
+            )),
+            CompactExpr::Param(name) => match params.get(name) {
+                Some(value) => Expr::Const(*value),
+                None => {
+                    return Err(PyValueError::new_err(format!(
+                        "Parameter {} is not bound.",
+                        self.string(*name)?
+                    )))
+                }
+            },
+        })
+    }
+
+    fn params(&self, params: &[(usize, CompactExpr)]) -> PyResult<Params> {
+        params
+            .iter()
+            .map(|(name, value)| match self.expr(value, &Params::new())? {
+                Expr::Const(value) => Ok((*name, value)),
+                _ => Err(PyValueError::new_err(format!(
+                    "Parameter {} is not a constant.",
+                    self.string(*name)?
+                ))),
+            })
+            .collect()
+    }
+
+    fn forward_signal(&self, index: usize) -> PyResult<ForwardSignal> {
+        match self.signal(index)? {
+            Signal::Forward(signal) => Ok(signal.clone()),
+            _ => Err(PyValueError::new_err(format!(
+                "Signal {} is not a forward signal.",
+                index
+            ))),
+        }
+    }
+
+    fn shared_signal(&self, index: usize) -> PyResult<SharedSignal> {
+        match self.signal(index)? {
+            Signal::Shared(signal) => Ok(signal.clone()),
+            _ => Err(PyValueError::new_err(format!(
+                "Signal {} is not a shared signal.",
+                index
+            ))),
+        }
+    }
+
+    fn fixed_signal(&self, index: usize) -> PyResult<FixedSignal> {
+        match self.signal(index)? {
+            Signal::Fixed(signal) => Ok(signal.clone()),
+            _ => Err(PyValueError::new_err(format!(
+                "Signal {} is not a fixed signal.",
+                index
+            ))),
+        }
+    }
+
+    fn internal_signal(&self, index: usize) -> PyResult<InternalSignal> {
+        match self.signal(index)? {
+            Signal::Internal(signal) => Ok(signal.clone()),
+            _ => Err(PyValueError::new_err(format!(
+                "Signal {} is not an internal signal.",
+                index
+            ))),
+        }
+    }
+
+    fn step_type_id(&self, index: usize) -> PyResult<UUID> {
+        self.step_types
+            .get(index)
+            .map(|handler| handler.uuid())
+            .ok_or_else(|| out_of_range("Step type", index))
+    }
+}
+
+// The constraints of `constraints`, or of the step type it references.
+fn shared_constraints<'a>(
+    step_types: &'a [CompactStepType],
+    constraints: &'a CompactConstraints,
+    field: fn(&CompactStepType) -> &CompactConstraints,
+) -> PyResult<&'a [CompactConstraint]> {
+    match constraints {
+        CompactConstraints::Inline(constraints) => Ok(constraints),
+        CompactConstraints::Shared(index) => match step_types.get(*index).map(field) {
+            Some(CompactConstraints::Inline(constraints)) => Ok(constraints),
+            Some(CompactConstraints::Shared(_)) => Err(PyValueError::new_err(format!(
+                "Step type {} doesn't encode its constraints.",
+                index
+            ))),
+            None => Err(out_of_range("Step type", *index)),
+        },
+    }
+}
+
+fn step_type_from_compact(
+    tables: &Tables,
+    step_types: &[CompactStepType],
+    step_type: &CompactStepType,
+) -> PyResult<StepType<Fr>> {
+    let CompactStepType(id, name, signals, constraints, transition_constraints, params) = step_type;
+    let mut result = StepType::new(*id, tables.string(*name)?);
+    let params = tables.params(params)?;
+
+    for index in signals {
+        let signal = tables.internal_signal(*index)?;
+        result
+            .annotations
+            .insert(signal.uuid(), tables.signal_name(*index));
+        result.signals.push(signal);
+    }
+    for (annotation, expr) in shared_constraints(step_types, constraints, |s| &s.3)? {
+        result.constraints.push(Constraint {
+            annotation: tables.string(*annotation)?,
+            expr: tables.expr(expr, &params)?,
+        });
+    }
+    for (annotation, expr) in shared_constraints(step_types, transition_constraints, |s| &s.4)? {
+        result.transition_constraints.push(TransitionConstraint {
+            annotation: tables.string(*annotation)?,
+            expr: tables.expr(expr, &params)?,
+        });
+    }
+
+    Ok(result)
+}
+
+pub fn parse_compact_ast(ast_json: &str) -> PyResult<Circuit<Fr, ()>> {
+    let compact: CompactCircuit = serde_json::from_str(ast_json)
+        .map_err(|e| PyValueError::new_err(format!("Invalid compact AST: {}.", e)))?;
+    let strings = compact.strings;
+    let get_string = |index: usize| {
+        strings
+            .get(index)
+            .cloned()
+            .ok_or_else(|| out_of_range("String", index))
+    };
+
+    let mut signals = Vec::with_capacity(compact.signals.len());
+    let mut signal_names = Vec::with_capacity(compact.signals.len());
+    for (kind, id, phase, name) in compact.signals {
+        let name = get_string(name)?;
+        signal_names.push(name.clone());
+        signals.push(match kind.as_str() {
+            "f" => Signal::Forward(ForwardSignal::new_with_id(id, phase, name)),
+            "s" => Signal::Shared(SharedSignal::new_with_id(id, phase, name)),
+            "x" => Signal::Fixed(FixedSignal::new_with_id(id, name)),
+            "i" => Signal::Internal(InternalSignal::new_with_id(id, name)),
+            _ => {
+                return Err(PyValueError::new_err(format!(
+                    "Unknown signal kind {}.",
+                    kind
+                )))
+            }
+        });
+    }
+    let step_types = compact
+        .step_types
+        .iter()
+        .map(|step_type| {
+            Ok(StepTypeHandler::new_with_id(
+                step_type.0,
+                get_string(step_type.1)?,
+            ))
+        })
+        .collect::<PyResult<_>>()?;
+    let tables = Tables {
+        strings,
+        signals,
+        signal_names,
+        step_types,
+    };
+
+    let mut circuit = Circuit::<Fr, ()>::default();
+    for step_type in compact.step_types.iter() {
+        circuit
+            .annotations
+            .insert(step_type.0, tables.string(step_type.1)?);
+        let step_type = step_type_from_compact(&tables, &compact.step_types, step_type)?;
+        circuit
+            .step_types
+            .insert(step_type.uuid(), Rc::new(step_type));
+    }
+    for index in compact.forward_signals {
+        let signal = tables.forward_signal(index)?;
+        circuit
+            .annotations
+            .insert(signal.uuid(), tables.signal_name(index));
+        circuit.forward_signals.push(signal);
+    }
+    for index in compact.shared_signals {
+        let signal = tables.shared_signal(index)?;
+        circuit
+            .annotations
+            .insert(signal.uuid(), tables.signal_name(index));
+        circuit.shared_signals.push(signal);
+    }
+    for index in compact.fixed_signals {
+        let signal = tables.fixed_signal(index)?;
+        circuit
+            .annotations
+            .insert(signal.uuid(), tables.signal_name(index));
+        circuit.fixed_signals.push(signal);
+    }
+    for (index, rotation, offset) in compact.exposed {
+        let offset = match offset {
+            CompactOffset::First(_) => ExposeOffset::First,
+            CompactOffset::Last(_) => ExposeOffset::Last,
+            CompactOffset::Step(step) => ExposeOffset::Step(step),
+        };
+        circuit
+            .exposed
+            .push((tables.queriable(index, rotation)?, offset));
+    }
+    for (id, annotation) in compact.annotations {
+        circuit.annotations.insert(id, tables.string(annotation)?);
+    }
+    circuit.first_step = compact
+        .first_step
+        .map(|index| tables.step_type_id(index))
+        .transpose()?;
+    circuit.last_step = compact
+        .last_step
+        .map(|index| tables.step_type_id(index))
+        .transpose()?;
+    circuit.num_steps = compact.num_steps;
+    circuit.q_enable = compact.q_enable;
+    circuit.id = compact.id;
+
+    Ok(circuit)
+}
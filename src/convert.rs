@@ -0,0 +1,312 @@
+use chiquito::{
+    ast::{
+        expr::{query::Queriable, Expr},
+        Circuit, Constraint, ExposeOffset, FixedSignal, ForwardSignal, InternalSignal,
+        SharedSignal, StepType, TransitionConstraint,
+    },
+    frontend::dsl::StepTypeHandler,
+    util::UUID,
+    wit_gen::{StepInstance, TraceWitness},
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use pyo3::{
+    exceptions::{PyKeyError, PyTypeError, PyValueError},
+    prelude::*,
+    types::{PyBytes, PyDict, PyList},
+};
+use std::{collections::HashMap, rc::Rc};
+
+use crate::fr_from_bytes;
+
+// Converts the Python AST and witness objects (chiquito_ast.py, expr.py, query.py, wit_gen.py)
+// directly into their Rust counterparts, without going through JSON. Field elements are read from
+// the integer `n` of `F` as 32 little-endian bytes.
+
+fn class_name(obj: &PyAny) -> PyResult<&str> {
+    obj.get_type().name()
+}
+
+// Reduced modulo the Fr modulus, see `fr_from_limbs`.
+pub fn fr_from_py(value: &PyAny) -> PyResult<Fr> {
+    let n = if value.hasattr("n")? {
+        value.getattr("n")?
+    } else {
+        value
+    };
+    let bytes: &PyBytes = n.call_method1("to_bytes", (32, "little"))?.downcast()?;
+
+    Ok(fr_from_bytes(bytes.as_bytes().try_into().unwrap()))
+}
+
+fn id(signal: &PyAny) -> PyResult<UUID> {
+    signal.getattr("id")?.extract()
+}
+
+fn annotation(signal: &PyAny) -> PyResult<String> {
+    signal.getattr("annotation")?.extract()
+}
+
+fn forward_signal(signal: &PyAny) -> PyResult<ForwardSignal> {
+    Ok(ForwardSignal::new_with_id(
+        id(signal)?,
+        signal.getattr("phase")?.extract()?,
+        annotation(signal)?,
+    ))
+}
+
+fn shared_signal(signal: &PyAny) -> PyResult<SharedSignal> {
+    Ok(SharedSignal::new_with_id(
+        id(signal)?,
+        signal.getattr("phase")?.extract()?,
+        annotation(signal)?,
+    ))
+}
+
+fn fixed_signal(signal: &PyAny) -> PyResult<FixedSignal> {
+    Ok(FixedSignal::new_with_id(id(signal)?, annotation(signal)?))
+}
+
+fn internal_signal(signal: &PyAny) -> PyResult<InternalSignal> {
+    Ok(InternalSignal::new_with_id(
+        id(signal)?,
+        annotation(signal)?,
+    ))
+}
+
+fn queriable_from_py(queriable: &PyAny) -> PyResult<Queriable<Fr>> {
+    match class_name(queriable)? {
+        "Internal" => Ok(Queriable::Internal(internal_signal(
+            queriable.getattr("signal")?,
+        )?)),
+        "Forward" => Ok(Queriable::Forward(
+            forward_signal(queriable.getattr("signal")?)?,
+            queriable.getattr("rotation")?.extract()?,
+        )),
+        "Shared" => Ok(Queriable::Shared(
+            shared_signal(queriable.getattr("signal")?)?,
+            queriable.getattr("rotation")?.extract()?,
+        )),
+        "Fixed" => Ok(Queriable::Fixed(
+            fixed_signal(queriable.getattr("signal")?)?,
+            queriable.getattr("rotation")?.extract()?,
+        )),
+        "StepTypeNext" => {
+            let step_type = queriable.getattr("step_type")?;
+            Ok(Queriable::StepTypeNext(StepTypeHandler::new_with_id(
+                id(step_type)?,
+                step_type.getattr("name")?.extract()?,
+            )))
+        }
+        name => Err(PyTypeError::new_err(format!("Unknown Queriable {}.", name))),
+    }
+}
+
+fn exprs_from_py(exprs: &PyAny, params: &PyDict) -> PyResult<Vec<Expr<Fr>>> {
+    exprs
+        .downcast::<PyList>()?
+        .iter()
+        .map(|expr| expr_from_py(expr, params))
+        .collect()
+}
+
+// `params` binds the `Param`s of step type templates.
+pub fn expr_from_py(expr: &PyAny, params: &PyDict) -> PyResult<Expr<Fr>> {
+    match class_name(expr)? {
+        "Const" => Ok(Expr::Const(fr_from_py(expr.getattr("value")?)?)),
+        "Param" => {
+            let name = expr.getattr("name")?;
+            let value = params.get_item(name).ok_or_else(|| {
+                PyValueError::new_err(format!("Parameter {} is not bound.", name))
+            })?;
+            Ok(Expr::Const(fr_from_py(value)?))
+        }
+        "Sum" => Ok(Expr::Sum(exprs_from_py(expr.getattr("exprs")?, params)?)),
+        "Mul" => Ok(Expr::Mul(exprs_from_py(expr.getattr("exprs")?, params)?)),
+        "Neg" => Ok(Expr::Neg(Box::new(expr_from_py(
+            expr.getattr("expr")?,
+            params,
+        )?))),
+        "Pow" => Ok(Expr::Pow(
+            Box::new(expr_from_py(expr.getattr("expr")?, params)?),
+            expr.getattr("pow")?.extract()?,
+        )),
+        _ => Ok(Expr::Query(queriable_from_py(expr)?)),
+    }
+}
+
+fn expose_offset_from_py(offset: &PyAny) -> PyResult<ExposeOffset> {
+    match class_name(offset)? {
+        "First" => Ok(ExposeOffset::First),
+        "Last" => Ok(ExposeOffset::Last),
+        "Step" => Ok(ExposeOffset::Step(offset.getattr("offset")?.extract()?)),
+        name => Err(PyTypeError::new_err(format!(
+            "Unknown ExposeOffset {}.",
+            name
+        ))),
+    }
+}
+
+fn step_type_from_py(step_type: &PyAny) -> PyResult<StepType<Fr>> {
+    let mut result = StepType::new(id(step_type)?, step_type.getattr("name")?.extract()?);
+    let params = step_type.getattr("params")?.downcast::<PyDict>()?;
+
+    for signal in step_type.getattr("signals")?.downcast::<PyList>()? {
+        result.signals.push(internal_signal(signal)?);
+    }
+    for constraint in step_type.getattr("constraints")?.downcast::<PyList>()? {
+        result.constraints.push(Constraint {
+            annotation: constraint.getattr("annotation")?.extract()?,
+            expr: expr_from_py(constraint.getattr("expr")?, params)?,
+        });
+    }
+    for constraint in step_type
+        .getattr("transition_constraints")?
+        .downcast::<PyList>()?
+    {
+        result.transition_constraints.push(TransitionConstraint {
+            annotation: constraint.getattr("annotation")?.extract()?,
+            expr: expr_from_py(constraint.getattr("expr")?, params)?,
+        });
+    }
+    result.annotations = step_type.getattr("annotations")?.extract()?;
+
+    Ok(result)
+}
+
+pub fn circuit_from_py(ast: &PyAny) -> PyResult<Circuit<Fr, ()>> {
+    let mut circuit = Circuit::<Fr, ()>::default();
+
+    for step_type in ast.getattr("step_types")?.downcast::<PyDict>()?.values() {
+        let step_type = step_type_from_py(step_type)?;
+        circuit
+            .step_types
+            .insert(step_type.uuid(), Rc::new(step_type));
+    }
+    for signal in ast.getattr("forward_signals")?.downcast::<PyList>()? {
+        circuit.forward_signals.push(forward_signal(signal)?);
+    }
+    for signal in ast.getattr("shared_signals")?.downcast::<PyList>()? {
+        circuit.shared_signals.push(shared_signal(signal)?);
+    }
+    for signal in ast.getattr("fixed_signals")?.downcast::<PyList>()? {
+        circuit.fixed_signals.push(fixed_signal(signal)?);
+    }
+    for exposed in ast.getattr("exposed")?.downcast::<PyList>()? {
+        let (queriable, offset): (&PyAny, &PyAny) = exposed.extract()?;
+        circuit.exposed.push((
+            queriable_from_py(queriable)?,
+            expose_offset_from_py(offset)?,
+        ));
+    }
+    circuit.annotations = ast.getattr("annotations")?.extract()?;
+    circuit.first_step = ast.getattr("first_step")?.extract()?;
+    circuit.last_step = ast.getattr("last_step")?.extract()?;
+    circuit.num_steps = ast.getattr("num_steps")?.extract()?;
+    circuit.q_enable = ast.getattr("q_enable")?.extract()?;
+    circuit.id = ast.getattr("id")?.extract()?;
+
+    Ok(circuit)
+}
+
+// Queriables that can appear as witness assignment targets, keyed by signal UUID, so that the
+// witness conversion only reads signal ids from Python.
+pub fn signal_queriables(ast: &Circuit<Fr, ()>) -> HashMap<UUID, Queriable<Fr>> {
+    let mut signals = HashMap::new();
+
+    for signal in ast.forward_signals.iter() {
+        signals.insert(signal.uuid(), Queriable::Forward(signal.clone(), false));
+    }
+    for signal in ast.shared_signals.iter() {
+        signals.insert(signal.uuid(), Queriable::Shared(signal.clone(), 0));
+    }
+    for signal in ast.fixed_signals.iter() {
+        signals.insert(signal.uuid(), Queriable::Fixed(signal.clone(), 0));
+    }
+    for step_type in ast.step_types.values() {
+        for signal in step_type.signals.iter() {
+            signals.insert(signal.uuid(), Queriable::Internal(signal.clone()));
+        }
+    }
+
+    signals
+}
+
+// The queriable of `signals` for the assignment target `lhs`, with the kind and rotation of `lhs`,
+// as the JSON witness deserializer reads them.
+fn assigned_queriable(
+    signals: &HashMap<UUID, Queriable<Fr>>,
+    lhs: &PyAny,
+) -> PyResult<Queriable<Fr>> {
+    let signal_id = id(lhs.getattr("signal")?)?;
+    match (class_name(lhs)?, signals.get(&signal_id)) {
+        ("Forward", Some(Queriable::Forward(signal, _))) => Ok(Queriable::Forward(
+            signal.clone(),
+            lhs.getattr("rotation")?.extract()?,
+        )),
+        ("Shared", Some(Queriable::Shared(signal, _))) => Ok(Queriable::Shared(
+            signal.clone(),
+            lhs.getattr("rotation")?.extract()?,
+        )),
+        ("Fixed", Some(Queriable::Fixed(signal, _))) => Ok(Queriable::Fixed(
+            signal.clone(),
+            lhs.getattr("rotation")?.extract()?,
+        )),
+        ("Internal", Some(queriable @ Queriable::Internal(_))) => Ok(queriable.clone()),
+        (kind, _) => Err(PyKeyError::new_err(format!(
+            "{} signal {} is not in the circuit.",
+            kind, signal_id
+        ))),
+    }
+}
+
+pub fn witness_from_py(
+    signals: &HashMap<UUID, Queriable<Fr>>,
+    witness: &PyAny,
+) -> PyResult<TraceWitness<Fr>> {
+    witness_steps_from_py(signals, witness, |_| true)
+}
+
+// Same as `witness_from_py`, but only converts the assignments of the steps for which
+// `convert_step` is true. The other steps keep their step type, without assignments.
+pub fn witness_steps_from_py(
+    signals: &HashMap<UUID, Queriable<Fr>>,
+    witness: &PyAny,
+    convert_step: impl Fn(usize) -> bool,
+) -> PyResult<TraceWitness<Fr>> {
+    let step_instances = witness.getattr("step_instances")?.downcast::<PyList>()?;
+    // Memoized step instances are shared between steps, so each Python object is converted once.
+    let mut converted: HashMap<usize, StepInstance<Fr>> = HashMap::new();
+    let mut result = Vec::with_capacity(step_instances.len());
+
+    for (index, step_instance) in step_instances.iter().enumerate() {
+        if !convert_step(index) {
+            result.push(StepInstance {
+                step_type_uuid: step_instance.getattr("step_type_uuid")?.extract()?,
+                assignments: HashMap::new(),
+            });
+            continue;
+        }
+        let key = step_instance.as_ptr() as usize;
+        if let Some(converted) = converted.get(&key) {
+            result.push(converted.clone());
+            continue;
+        }
+
+        let assignments = step_instance.getattr("assignments")?.downcast::<PyDict>()?;
+        let mut converted_assignments = HashMap::with_capacity(assignments.len());
+        for (lhs, rhs) in assignments.iter() {
+            converted_assignments.insert(assigned_queriable(signals, lhs)?, fr_from_py(rhs)?);
+        }
+        let step_instance = StepInstance {
+            step_type_uuid: step_instance.getattr("step_type_uuid")?.extract()?,
+            assignments: converted_assignments,
+        };
+
+        converted.insert(key, step_instance.clone());
+        result.push(step_instance);
+    }
+
+    Ok(TraceWitness {
+        step_instances: result,
+    })
+}
@@ -0,0 +1,152 @@
+use chiquito::backend::halo2::ChiquitoHalo2Circuit;
+use halo2_proofs::{
+    halo2curves::bn256::{Bn256, Fr, G1Affine},
+    plonk::{
+        create_proof, keygen_pk, keygen_vk, verify_proof, Circuit as Halo2Circuit, ProvingKey,
+        VerifyingKey,
+    },
+    poly::{
+        commitment::{Params, ParamsProver},
+        kzg::{
+            commitment::{KZGCommitmentScheme, ParamsKZG},
+            multiopen::{ProverSHPLONK, VerifierSHPLONK},
+            strategy::SingleStrategy,
+        },
+    },
+    transcript::{
+        Blake2bRead, Blake2bWrite, Challenge255, TranscriptReadBuffer, TranscriptWriterBuffer,
+    },
+    SerdeFormat,
+};
+use rand::rngs::OsRng;
+use std::{
+    fs::{self, File},
+    io::{self, BufReader, BufWriter, Write},
+    path::{Path, PathBuf},
+};
+
+use crate::registry::CircuitEntry;
+
+pub struct Keys {
+    pub k: u32,
+    pub params: ParamsKZG<Bn256>,
+    pub pk: ProvingKey<G1Affine>,
+    // Serialized size of the proving key, as an estimate of its memory use.
+    pub bytes: usize,
+}
+
+// Writes through a temporary file so that concurrent processes sharing a cache directory never
+// observe a partially written key.
+fn write_atomic(path: &Path, write: impl FnOnce(&mut BufWriter<File>) -> io::Result<()>) {
+    let tmp = path.with_extension(format!("tmp{}", std::process::id()));
+    let mut writer = BufWriter::new(File::create(&tmp).expect("Key cache write failed."));
+    write(&mut writer).expect("Key cache write failed.");
+    writer.flush().expect("Key cache write failed.");
+    drop(writer);
+    fs::rename(&tmp, path).expect("Key cache write failed.");
+}
+
+fn load_params(cache_dir: &Path, k: u32) -> ParamsKZG<Bn256> {
+    let path = cache_dir.join(format!("params_k{}.bin", k));
+    if let Ok(file) = File::open(&path) {
+        if let Ok(params) = ParamsKZG::<Bn256>::read(&mut BufReader::new(file)) {
+            return params;
+        }
+    }
+
+    let params = ParamsKZG::<Bn256>::setup(k, OsRng);
+    write_atomic(&path, |writer| params.write(writer));
+
+    params
+}
+
+fn read_pk(path: &Path, circuit: &ChiquitoHalo2Circuit<Fr>) -> Option<ProvingKey<G1Affine>> {
+    let file = File::open(path).ok()?;
+    ProvingKey::<G1Affine>::read::<_, ChiquitoHalo2Circuit<Fr>>(
+        &mut BufReader::new(file),
+        SerdeFormat::RawBytes,
+        circuit.params(),
+    )
+    .ok()
+}
+
+// `fingerprint` identifies the circuit structure independently of the per-process signal and
+// step type UUIDs; the placement is added to the cache key since it changes the columns. A cached
+// proving key is only reused if its verifying key matches the one generated for the compiled
+// circuit, because column order may differ between processes, so keygen_vk runs on every setup.
+pub fn setup(entry: &CircuitEntry, k: u32, cache_dir: &str, fingerprint: &str) -> Keys {
+    let cache_dir = PathBuf::from(cache_dir);
+    let params = load_params(&cache_dir, k);
+    let circuit = ChiquitoHalo2Circuit::new(entry.compiled.clone(), None);
+
+    let vk = keygen_vk(&params, &circuit).expect("keygen_vk failed.");
+    let placement = match entry.layout.max_width {
+        Some(max_width) => format!("{}{}", entry.layout.strategy, max_width),
+        None => entry.layout.strategy.to_string(),
+    };
+    let pk_path = cache_dir.join(format!("{}_{}_k{}.pk", fingerprint, placement, k));
+
+    let pk = match read_pk(&pk_path, &circuit) {
+        Some(pk) if pk.get_vk().transcript_repr() == vk.transcript_repr() => pk,
+        _ => {
+            let pk = keygen_pk(&params, vk, &circuit).expect("keygen_pk failed.");
+            write_atomic(&pk_path, |writer| pk.write(writer, SerdeFormat::RawBytes));
+            pk
+        }
+    };
+
+    let bytes = fs::metadata(&pk_path).map_or(0, |metadata| metadata.len() as usize);
+
+    Keys {
+        k,
+        params,
+        pk,
+        bytes,
+    }
+}
+
+pub fn prove(keys: &Keys, circuit: ChiquitoHalo2Circuit<Fr>) -> Vec<u8> {
+    let instance = circuit.instance();
+    let instance: Vec<&[Fr]> = instance.iter().map(|column| column.as_slice()).collect();
+    let mut transcript = Blake2bWrite::<_, G1Affine, Challenge255<_>>::init(vec![]);
+
+    create_proof::<
+        KZGCommitmentScheme<Bn256>,
+        ProverSHPLONK<'_, Bn256>,
+        Challenge255<G1Affine>,
+        _,
+        Blake2bWrite<Vec<u8>, G1Affine, Challenge255<G1Affine>>,
+        _,
+    >(
+        &keys.params,
+        &keys.pk,
+        &[circuit],
+        &[&instance],
+        OsRng,
+        &mut transcript,
+    )
+    .expect("create_proof failed.");
+
+    transcript.finalize()
+}
+
+pub fn verify(keys: &Keys, proof: &[u8], instance: &[Vec<Fr>]) -> bool {
+    let vk: &VerifyingKey<G1Affine> = keys.pk.get_vk();
+    let instance: Vec<&[Fr]> = instance.iter().map(|column| column.as_slice()).collect();
+    let mut transcript = Blake2bRead::<_, G1Affine, Challenge255<_>>::init(proof);
+
+    verify_proof::<
+        KZGCommitmentScheme<Bn256>,
+        VerifierSHPLONK<'_, Bn256>,
+        Challenge255<G1Affine>,
+        Blake2bRead<&[u8], G1Affine, Challenge255<G1Affine>>,
+        SingleStrategy<'_, Bn256>,
+    >(
+        keys.params.verifier_params(),
+        vk,
+        SingleStrategy::new(&keys.params),
+        &[&instance],
+        &mut transcript,
+    )
+    .is_ok()
+}
@@ -1,13 +1,97 @@
-use chiquito::{
-    ast::Circuit,
-    frontend::pychiquito::{chiquito_ast_to_halo2, chiquito_halo2_mock_prover},
-    wit_gen::TraceWitness,
-};
-use halo2_proofs::halo2curves::bn256::Fr;
+mod check;
+mod compact;
+mod convert;
+mod keys;
+mod placement;
+mod prover;
+mod registry;
+mod witness_encoding;
+mod witness_file;
+
+use chiquito::{ast::Circuit, wit_gen::TraceWitness};
+use halo2_proofs::halo2curves::{bn256::Fr, group::ff::PrimeField};
 use pyo3::{
+    create_exception,
+    exceptions::{PyKeyError, PyValueError},
     prelude::*,
-    types::{PyLong, PyString},
+    types::{PyBytes, PyDict, PyLong, PyString},
 };
+use std::{rc::Rc, time::Instant};
+
+// Field elements cross the boundary as four little-endian u64 limbs, the same representation the
+// Python `F.__json__` uses. `F` is the bn128 base field, larger than Fr, so values are reduced
+// modulo the Fr modulus, like the JSON witness deserializer does. Every witness and AST path
+// reads field elements through this function or `fr_from_bytes`.
+fn fr_from_limbs(limbs: [u64; 4]) -> Fr {
+    Fr::from_raw(limbs)
+}
+
+// Same as `fr_from_limbs`, for 32 little-endian bytes.
+fn fr_from_bytes(bytes: &[u8; 32]) -> Fr {
+    let mut limbs = [0u64; 4];
+    for (i, limb) in limbs.iter_mut().enumerate() {
+        *limb = u64::from_le_bytes(bytes[i * 8..i * 8 + 8].try_into().unwrap());
+    }
+    fr_from_limbs(limbs)
+}
+
+fn fr_to_limbs(value: &Fr) -> [u64; 4] {
+    let bytes = value.to_repr();
+    let mut limbs = [0u64; 4];
+    for (i, limb) in limbs.iter_mut().enumerate() {
+        *limb = u64::from_le_bytes(bytes.as_ref()[i * 8..i * 8 + 8].try_into().unwrap());
+    }
+    limbs
+}
+
+// Raised for released or evicted circuits, which Python handles by registering the AST again and
+// repeating the call. Other KeyErrors, e.g. for witnesses naming unknown signals, are not retried.
+create_exception!(rust_chiquito, CircuitNotRegistered, PyKeyError);
+
+// Functions taking `ast_uuid` call this before reading any other argument, so that a call failing
+// with CircuitNotRegistered has not consumed the iterables passed to it and can be repeated.
+fn get_entry(ast_uuid: &PyLong) -> PyResult<Rc<registry::CircuitEntry>> {
+    let uuid: u128 = ast_uuid.extract()?;
+    registry::get(uuid).ok_or_else(|| {
+        CircuitNotRegistered::new_err(format!("Circuit {} is not registered.", uuid))
+    })
+}
+
+fn get_keys(entry: &registry::CircuitEntry) -> PyResult<Rc<keys::Keys>> {
+    entry
+        .keys
+        .borrow()
+        .clone()
+        .ok_or_else(|| PyValueError::new_err("Keys are not set up, call halo2_setup_keys first."))
+}
+
+// Witnesses are accepted either as JSON strings, as `TraceWitness` objects, which are converted
+// directly using the signals of the registered circuit, as `CompressedWitness` objects, or as
+// `WitnessFile` objects, whose file is memory-mapped by path.
+fn witness_source(
+    entry: &registry::CircuitEntry,
+    witness: &PyAny,
+) -> PyResult<prover::WitnessSource> {
+    if let Ok(witness_json) = witness.downcast::<PyString>() {
+        return Ok(prover::WitnessSource::Json(
+            witness_json.to_str()?.to_string(),
+        ));
+    }
+    let start = Instant::now();
+    let converted = match witness.get_type().name()? {
+        "WitnessFile" => {
+            let path: String = witness.getattr("path")?.extract()?;
+            witness_file::read_witness_file(&entry.signals, entry.ast.id, &path)?
+        }
+        "CompressedWitness" => {
+            let witness_json: &str = witness.getattr("json")?.extract()?;
+            witness_encoding::decode_witness(&entry.signals, witness_json)?
+        }
+        _ => convert::witness_from_py(&entry.signals, witness)?,
+    };
+
+    Ok(prover::WitnessSource::Converted(converted, start.elapsed()))
+}
 
 #[pyfunction]
 fn convert_and_print_ast(json: &PyString) {
@@ -25,26 +109,231 @@ fn convert_and_print_trace_witness(json: &PyString) {
     println!("{:?}", trace_witness);
 }
 
+// `strategy` is one of single_row, max_width (with `max_width`) or cost, see placement.rs.
+#[pyfunction]
+#[pyo3(signature = (json, strategy="single_row", max_width=None))]
+fn ast_to_halo2(json: &PyString, strategy: &str, max_width: Option<usize>) -> PyResult<u128> {
+    let placement = placement::Placement::new(strategy, max_width)?;
+    let (ast, ast_deserialize) =
+        registry::parse_ast(json.to_str().expect("PyString convertion failed."));
+    let uuid = registry::register(ast, ast_deserialize, placement)?;
+
+    Ok(uuid)
+}
+
+// Same as `ast_to_halo2`, reading the `ASTCircuit` object directly instead of its JSON.
+#[pyfunction]
+#[pyo3(signature = (ast, strategy="single_row", max_width=None))]
+fn ast_object_to_halo2(ast: &PyAny, strategy: &str, max_width: Option<usize>) -> PyResult<u128> {
+    let placement = placement::Placement::new(strategy, max_width)?;
+    let start = Instant::now();
+    let ast = convert::circuit_from_py(ast)?;
+    let uuid = registry::register(ast, start.elapsed(), placement)?;
+
+    Ok(uuid)
+}
+
+// Same as `ast_to_halo2`, reading the compact AST of `Circuit.get_compact_ast_json`.
+#[pyfunction]
+#[pyo3(signature = (json, strategy="single_row", max_width=None))]
+fn compact_ast_to_halo2(
+    json: &PyString,
+    strategy: &str,
+    max_width: Option<usize>,
+) -> PyResult<u128> {
+    let placement = placement::Placement::new(strategy, max_width)?;
+    let start = Instant::now();
+    let ast = compact::parse_compact_ast(json.to_str()?)?;
+    let uuid = registry::register(ast, start.elapsed(), placement)?;
+
+    Ok(uuid)
+}
+
+// Placement chosen for the registered circuit: strategy, max_width, step_height, column counts,
+// rows and k.
+#[pyfunction]
+fn halo2_layout(py: Python, ast_uuid: &PyLong) -> PyResult<PyObject> {
+    let entry = get_entry(ast_uuid)?;
+
+    entry.layout.to_object(py)
+}
+
+#[pyfunction]
+fn halo2_mock_prover(py: Python, witness: &PyAny, ast_uuid: &PyLong) -> PyResult<PyObject> {
+    let entry = get_entry(ast_uuid)?;
+    let witness = witness_source(&entry, witness)?;
+
+    prover::mock_prove(&entry, witness).to_object(py)
+}
+
+// Accepts any Python iterable of witnesses. The compiled circuit is shared by all witnesses; halo2
+// synthesis, including fixed columns, still runs once per witness (see prover::mock_prove_batch).
+#[pyfunction]
+fn halo2_mock_prover_batch(
+    py: Python,
+    witnesses: &PyAny,
+    ast_uuid: &PyLong,
+) -> PyResult<Vec<PyObject>> {
+    let entry = get_entry(ast_uuid)?;
+    let witnesses = witnesses
+        .iter()?
+        .map(|witness| witness.and_then(|w| witness_source(&entry, w)))
+        .collect::<PyResult<Vec<_>>>()?;
+
+    prover::mock_prove_batch(py, &entry, witnesses)
+        .iter()
+        .map(|report| report.to_object(py))
+        .collect()
+}
+
+// Checks the witness against the AST constraints in parallel and reports the first
+// `max_failures` failures, see check.rs. `steps` is None to check every step.
+#[pyfunction]
+fn halo2_fast_check(
+    py: Python,
+    witness: &PyAny,
+    max_failures: usize,
+    steps: Option<Vec<usize>>,
+    ast_uuid: &PyLong,
+) -> PyResult<PyObject> {
+    let entry = get_entry(ast_uuid)?;
+    // With `steps`, only the assignments the check reads are converted from `TraceWitness`
+    // objects, so checking the steps affected by an incremental update doesn't convert the whole
+    // witness. The other witness sources are decoded in full.
+    let (witness, witness_deserialize) = match &steps {
+        Some(steps) if witness.get_type().name()? == "TraceWitness" => {
+            let start = Instant::now();
+            let queried = entry.check_plan.queried_steps(steps);
+            let witness = convert::witness_steps_from_py(&entry.signals, witness, |step| {
+                queried.contains(&step)
+            })?;
+            (witness, start.elapsed())
+        }
+        _ => witness_source(&entry, witness)?.into_witness_timed(),
+    };
+
+    check::check(
+        py,
+        &entry.check_plan,
+        entry.step_height,
+        witness,
+        witness_deserialize,
+        max_failures,
+        steps,
+    )
+    .to_object(py)
+}
+
+#[pyfunction]
+fn halo2_setup_keys(
+    k: u32,
+    cache_dir: &PyString,
+    fingerprint: &PyString,
+    ast_uuid: &PyLong,
+) -> PyResult<()> {
+    let entry = get_entry(ast_uuid)?;
+    if k < entry.k {
+        return Err(PyValueError::new_err(format!(
+            "k = {} is too small for this circuit, it needs at least k = {}.",
+            k, entry.k
+        )));
+    }
+    let (cache_dir, fingerprint) = (cache_dir.to_str()?, fingerprint.to_str()?);
+
+    let keys = keys::setup(&entry, k, cache_dir, fingerprint);
+    entry.keys.replace(Some(Rc::new(keys)));
+
+    Ok(())
+}
+
+#[pyfunction]
+fn halo2_instances(witness: &PyAny, ast_uuid: &PyLong) -> PyResult<Vec<Vec<[u64; 4]>>> {
+    let entry = get_entry(ast_uuid)?;
+    let witness = witness_source(&entry, witness)?.into_witness();
+    let circuit = prover::assign(&entry, witness);
+
+    Ok(circuit
+        .instance()
+        .iter()
+        .map(|column| column.iter().map(fr_to_limbs).collect())
+        .collect())
+}
+
 #[pyfunction]
-fn ast_to_halo2(json: &PyString) -> u128 {
-    let uuid = chiquito_ast_to_halo2(json.to_str().expect("PyString convertion failed."));
+fn halo2_prove(py: Python, witness: &PyAny, ast_uuid: &PyLong) -> PyResult<Py<PyBytes>> {
+    let entry = get_entry(ast_uuid)?;
+    let keys = get_keys(&entry)?;
+    let witness = witness_source(&entry, witness)?.into_witness();
+    let circuit = prover::assign(&entry, witness);
 
-    uuid
+    let proof = keys::prove(&keys, circuit);
+
+    Ok(PyBytes::new(py, &proof).into())
 }
 
 #[pyfunction]
-fn halo2_mock_prover(witness_json: &PyString, ast_uuid: &PyLong) {
-    chiquito_halo2_mock_prover(
-        witness_json.to_str().expect("PyString convertion failed."),
-        ast_uuid.extract().expect("PyLong convertion failed."),
-    );
+fn halo2_verify(
+    proof: &PyBytes,
+    instances: Vec<Vec<[u64; 4]>>,
+    ast_uuid: &PyLong,
+) -> PyResult<bool> {
+    let entry = get_entry(ast_uuid)?;
+    let keys = get_keys(&entry)?;
+    let instances: Vec<Vec<Fr>> = instances
+        .into_iter()
+        .map(|column| column.into_iter().map(fr_from_limbs).collect())
+        .collect();
+
+    Ok(keys::verify(&keys, proof.as_bytes(), &instances))
+}
+
+#[pyfunction]
+fn release_rust_ast(ast_uuid: &PyLong) -> PyResult<bool> {
+    Ok(registry::remove(ast_uuid.extract()?))
+}
+
+#[pyfunction]
+fn set_rust_registry_capacity(capacity: usize) -> PyResult<()> {
+    if capacity == 0 {
+        return Err(PyValueError::new_err("Registry capacity must be positive."));
+    }
+    registry::set_capacity(capacity);
+
+    Ok(())
+}
+
+#[pyfunction]
+fn rust_registry_stats(py: Python) -> PyResult<PyObject> {
+    let stats = registry::stats();
+    let dict = PyDict::new(py);
+    dict.set_item("capacity", stats.capacity)?;
+    dict.set_item("evictions", stats.evictions)?;
+    dict.set_item("entries", stats.entries)?;
+
+    Ok(dict.into())
 }
 
 #[pymodule]
-fn rust_chiquito(_py: Python, m: &PyModule) -> PyResult<()> {
+fn rust_chiquito(py: Python, m: &PyModule) -> PyResult<()> {
+    m.add(
+        "CircuitNotRegistered",
+        py.get_type::<CircuitNotRegistered>(),
+    )?;
     m.add_function(wrap_pyfunction!(convert_and_print_ast, m)?)?;
     m.add_function(wrap_pyfunction!(convert_and_print_trace_witness, m)?)?;
     m.add_function(wrap_pyfunction!(ast_to_halo2, m)?)?;
+    m.add_function(wrap_pyfunction!(compact_ast_to_halo2, m)?)?;
+    m.add_function(wrap_pyfunction!(ast_object_to_halo2, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_layout, m)?)?;
     m.add_function(wrap_pyfunction!(halo2_mock_prover, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_mock_prover_batch, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_fast_check, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_setup_keys, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_instances, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_prove, m)?)?;
+    m.add_function(wrap_pyfunction!(halo2_verify, m)?)?;
+    m.add_function(wrap_pyfunction!(release_rust_ast, m)?)?;
+    m.add_function(wrap_pyfunction!(set_rust_registry_capacity, m)?)?;
+    m.add_function(wrap_pyfunction!(rust_registry_stats, m)?)?;
     Ok(())
 }
@@ -0,0 +1,186 @@
+use chiquito::{
+    ast::Circuit,
+    backend::halo2::{chiquito2Halo2, ChiquitoHalo2},
+    compiler::{
+        cell_manager::{MaxWidthCellManager, SingleRowCellManager},
+        compile, config,
+        step_selector::SimpleStepSelectorBuilder,
+    },
+    ir::{assignments::AssignmentGenerator, Circuit as IRCircuit, ColumnType},
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use pyo3::{exceptions::PyValueError, prelude::*, types::PyDict};
+
+use crate::registry::k_for_rows;
+
+// How the compiler places signals in advice columns.
+//
+// - SingleRow: every step takes one row. Forward and shared signals get a column each, and the
+//   internal signals of all step types share columns by position.
+// - MaxWidth(width): forward signals, then the internal signals of each step type, fill rows of at
+//   most `width` columns. Steps get several rows, all of the height of the tallest step type.
+// - Cost: the MaxWidth width (or SingleRow) that minimizes the estimated proving area, columns
+//   times 2^k.
+#[derive(Clone, Copy)]
+pub enum Placement {
+    SingleRow,
+    MaxWidth(usize),
+    Cost,
+}
+
+pub struct Layout {
+    pub strategy: &'static str,
+    pub max_width: Option<usize>,
+    pub step_height: usize,
+    pub advice_columns: usize,
+    pub fixed_columns: usize,
+    pub rows: usize,
+    pub k: u32,
+}
+
+impl Placement {
+    pub fn new(strategy: &str, max_width: Option<usize>) -> PyResult<Self> {
+        match (strategy, max_width) {
+            ("single_row", _) => Ok(Placement::SingleRow),
+            ("max_width", Some(max_width)) if max_width > 0 => Ok(Placement::MaxWidth(max_width)),
+            ("max_width", _) => Err(PyValueError::new_err(
+                "The max_width placement needs a positive max_width.",
+            )),
+            ("cost", _) => Ok(Placement::Cost),
+            (strategy, _) => Err(PyValueError::new_err(format!(
+                "Unknown placement strategy {}, expected single_row, max_width or cost.",
+                strategy
+            ))),
+        }
+    }
+}
+
+fn max_internal_signals(ast: &Circuit<Fr, ()>) -> usize {
+    ast.step_types
+        .values()
+        .map(|step_type| step_type.signals.len())
+        .max()
+        .unwrap_or(0)
+}
+
+// Signal cells of the widest step, which MaxWidthCellManager lays out row by row.
+fn step_cells(ast: &Circuit<Fr, ()>) -> usize {
+    (ast.forward_signals.len() + max_internal_signals(ast)).max(1)
+}
+
+// (step height, signal advice columns) of MaxWidthCellManager with `same_height`.
+fn max_width_shape(ast: &Circuit<Fr, ()>, max_width: usize) -> (usize, usize) {
+    let cells = step_cells(ast);
+
+    ((cells + max_width - 1) / max_width, cells.min(max_width))
+}
+
+// Proving area of the MaxWidth placement: columns, including one step selector column per step
+// type, times 2^k.
+fn cost(ast: &Circuit<Fr, ()>, max_width: usize) -> u128 {
+    let (step_height, columns) = max_width_shape(ast, max_width);
+    let columns = columns + ast.step_types.len() + ast.fixed_signals.len() + 1;
+
+    columns as u128 * (1u128 << k_for_rows(ast.num_steps * step_height))
+}
+
+// Widest first, so that ties keep fewer rows.
+fn cheapest_max_width(ast: &Circuit<Fr, ()>) -> usize {
+    (1..=step_cells(ast))
+        .rev()
+        .min_by_key(|max_width| cost(ast, *max_width))
+        .unwrap()
+}
+
+fn count_columns(circuit: &IRCircuit<Fr>) -> (usize, usize) {
+    let advice = circuit
+        .columns
+        .iter()
+        .filter(|column| matches!(column.ctype, ColumnType::Advice | ColumnType::Halo2Advice))
+        .count();
+
+    (advice, circuit.columns.len() - advice)
+}
+
+pub fn compile_with(
+    ast: &Circuit<Fr, ()>,
+    placement: Placement,
+) -> PyResult<(
+    ChiquitoHalo2<Fr>,
+    Option<AssignmentGenerator<Fr, ()>>,
+    Layout,
+)> {
+    let placement = match placement {
+        // MaxWidthCellManager doesn't place shared and fixed signals.
+        Placement::Cost if !ast.shared_signals.is_empty() || !ast.fixed_signals.is_empty() => {
+            Placement::SingleRow
+        }
+        Placement::Cost => match cheapest_max_width(ast) {
+            max_width if max_width >= step_cells(ast) => Placement::SingleRow,
+            max_width => Placement::MaxWidth(max_width),
+        },
+        Placement::MaxWidth(_)
+            if !ast.shared_signals.is_empty() || !ast.fixed_signals.is_empty() =>
+        {
+            return Err(PyValueError::new_err(
+                "The max_width placement doesn't support shared or fixed signals.",
+            ))
+        }
+        placement => placement,
+    };
+
+    let (chiquito, assignment_generator, strategy, max_width, step_height) = match placement {
+        Placement::MaxWidth(max_width) => {
+            let (chiquito, assignment_generator) = compile(
+                config(
+                    MaxWidthCellManager::new(max_width, true),
+                    SimpleStepSelectorBuilder {},
+                ),
+                ast,
+            );
+            let (step_height, _) = max_width_shape(ast, max_width);
+            (
+                chiquito,
+                assignment_generator,
+                "max_width",
+                Some(max_width),
+                step_height,
+            )
+        }
+        _ => {
+            let (chiquito, assignment_generator) = compile(
+                config(SingleRowCellManager {}, SimpleStepSelectorBuilder {}),
+                ast,
+            );
+            (chiquito, assignment_generator, "single_row", None, 1)
+        }
+    };
+    let (advice_columns, fixed_columns) = count_columns(&chiquito);
+    let rows = ast.num_steps * step_height;
+    let layout = Layout {
+        strategy,
+        max_width,
+        step_height,
+        advice_columns,
+        fixed_columns,
+        rows,
+        k: k_for_rows(rows),
+    };
+
+    Ok((chiquito2Halo2(chiquito), assignment_generator, layout))
+}
+
+impl Layout {
+    pub fn to_object(&self, py: Python) -> PyResult<PyObject> {
+        let dict = PyDict::new(py);
+        dict.set_item("strategy", self.strategy)?;
+        dict.set_item("max_width", self.max_width)?;
+        dict.set_item("step_height", self.step_height)?;
+        dict.set_item("advice_columns", self.advice_columns)?;
+        dict.set_item("fixed_columns", self.fixed_columns)?;
+        dict.set_item("rows", self.rows)?;
+        dict.set_item("k", self.k)?;
+
+        Ok(dict.into())
+    }
+}
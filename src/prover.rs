@@ -0,0 +1,298 @@
+use chiquito::{backend::halo2::ChiquitoHalo2Circuit, util::UUID, wit_gen::TraceWitness};
+use halo2_proofs::{
+    dev::{FailureLocation, MockProver, VerifyFailure},
+    halo2curves::bn256::Fr,
+};
+use pyo3::{
+    prelude::*,
+    types::{IntoPyDict, PyDict},
+};
+use rayon::prelude::*;
+use std::time::{Duration, Instant};
+
+use crate::registry::CircuitEntry;
+
+fn parse_witness(witness_json: &str) -> TraceWitness<Fr> {
+    serde_json::from_str(witness_json).expect("Json deserialization to TraceWitness failed.")
+}
+
+// A witness either still serialized as JSON, or already converted from the Python objects along
+// with the time the conversion took.
+pub enum WitnessSource {
+    Json(String),
+    Converted(TraceWitness<Fr>, Duration),
+}
+
+impl WitnessSource {
+    pub fn into_witness_timed(self) -> (TraceWitness<Fr>, Duration) {
+        match self {
+            WitnessSource::Json(witness_json) => {
+                let start = Instant::now();
+                let witness = parse_witness(&witness_json);
+
+                (witness, start.elapsed())
+            }
+            WitnessSource::Converted(witness, conversion) => (witness, conversion),
+        }
+    }
+
+    pub fn into_witness(self) -> TraceWitness<Fr> {
+        self.into_witness_timed().0
+    }
+}
+
+// Witness assignment needs the entry's AssignmentGenerator and runs on the calling thread; the
+// resulting halo2 circuit owns its data and can be verified on any thread.
+pub fn assign(entry: &CircuitEntry, witness: TraceWitness<Fr>) -> ChiquitoHalo2Circuit<Fr> {
+    ChiquitoHalo2Circuit::new(
+        entry.compiled.clone(),
+        entry
+            .assignment_generator
+            .as_ref()
+            .map(|g| g.generate_with_witness(witness)),
+    )
+}
+
+fn mock_verify_timed(
+    k: u32,
+    circuit: &ChiquitoHalo2Circuit<Fr>,
+) -> (Result<(), Vec<VerifyFailure>>, Duration, Duration) {
+    let start = Instant::now();
+    let prover = MockProver::<Fr>::run(k, circuit, circuit.instance()).unwrap();
+    let synthesis = start.elapsed();
+
+    let start = Instant::now();
+    let result = prover.verify_par();
+
+    (result, synthesis, start.elapsed())
+}
+
+pub struct FailureReport {
+    pub kind: &'static str,
+    pub message: String,
+    pub row: Option<usize>,
+    pub region: Option<String>,
+    pub step_index: Option<usize>,
+    pub step_type_uuid: Option<UUID>,
+    pub step_type: Option<String>,
+    pub annotation: Option<String>,
+}
+
+pub struct MockProverReport {
+    pub passed: bool,
+    pub failures: Vec<FailureReport>,
+    pub timings: Vec<(&'static str, f64)>,
+}
+
+impl FailureReport {
+    fn new(entry: &CircuitEntry, step_type_uuids: &[UUID], failure: &VerifyFailure) -> Self {
+        let (kind, location, annotation) = match failure {
+            VerifyFailure::ConstraintNotSatisfied {
+                constraint,
+                location,
+                ..
+            } => (
+                "ConstraintNotSatisfied",
+                Some(location.clone()),
+                Some(constraint.to_string()),
+            ),
+            VerifyFailure::ConstraintPoisoned { constraint } => {
+                ("ConstraintPoisoned", None, Some(constraint.to_string()))
+            }
+            VerifyFailure::CellNotAssigned { region, offset, .. } => (
+                "CellNotAssigned",
+                Some(FailureLocation::InRegion {
+                    region: region.clone(),
+                    offset: *offset,
+                }),
+                None,
+            ),
+            VerifyFailure::Lookup { location, .. } => ("Lookup", Some(location.clone()), None),
+            VerifyFailure::Permutation { location, .. } => {
+                ("Permutation", Some(location.clone()), None)
+            }
+            _ => ("Other", None, None),
+        };
+        // The halo2 backend lays out all steps in a single region starting at row 0, so region
+        // offsets are absolute rows.
+        let (row, region) = match location {
+            Some(FailureLocation::InRegion { region, offset }) => {
+                (Some(offset), Some(region.to_string()))
+            }
+            Some(FailureLocation::OutsideRegion { row }) => (Some(row), None),
+            None => (None, None),
+        };
+        let step_index = row
+            .map(|row| row / entry.step_height)
+            .filter(|step_index| *step_index < step_type_uuids.len());
+        let step_type_uuid = step_index.map(|step_index| step_type_uuids[step_index]);
+        let step_type = step_type_uuid.and_then(|step_type_uuid| {
+            entry
+                .ast
+                .step_types
+                .get(&step_type_uuid)
+                .map(|step_type| step_type.name.clone())
+        });
+
+        FailureReport {
+            kind,
+            message: failure.to_string(),
+            row,
+            region,
+            step_index,
+            step_type_uuid,
+            step_type,
+            annotation,
+        }
+    }
+
+    fn to_object(&self, py: Python) -> PyResult<PyObject> {
+        let dict = PyDict::new(py);
+        dict.set_item("kind", self.kind)?;
+        dict.set_item("message", &self.message)?;
+        dict.set_item("row", self.row)?;
+        dict.set_item("region", &self.region)?;
+        dict.set_item("step_index", self.step_index)?;
+        dict.set_item("step_type_uuid", self.step_type_uuid)?;
+        dict.set_item("step_type", &self.step_type)?;
+        dict.set_item("annotation", &self.annotation)?;
+
+        Ok(dict.into())
+    }
+}
+
+impl MockProverReport {
+    fn new(
+        entry: &CircuitEntry,
+        step_type_uuids: &[UUID],
+        result: Result<(), Vec<VerifyFailure>>,
+        timings: [(&'static str, Duration); 3],
+    ) -> Self {
+        let failures = match &result {
+            Ok(()) => vec![],
+            Err(failures) => failures
+                .iter()
+                .map(|failure| FailureReport::new(entry, step_type_uuids, failure))
+                .collect(),
+        };
+        let timings = [
+            ("ast_deserialize", entry.ast_deserialize),
+            ("compile", entry.compile),
+        ]
+        .iter()
+        .chain(timings.iter())
+        .map(|(phase, duration)| (*phase, duration.as_secs_f64()))
+        .collect();
+
+        MockProverReport {
+            passed: result.is_ok(),
+            failures,
+            timings,
+        }
+    }
+
+    pub fn to_object(&self, py: Python) -> PyResult<PyObject> {
+        let dict = PyDict::new(py);
+        dict.set_item("passed", self.passed)?;
+        dict.set_item(
+            "failures",
+            self.failures
+                .iter()
+                .map(|failure| failure.to_object(py))
+                .collect::<PyResult<Vec<_>>>()?,
+        )?;
+        dict.set_item("timings", self.timings.clone().into_py_dict(py))?;
+
+        Ok(dict.into())
+    }
+}
+
+fn step_type_uuids(witness: &TraceWitness<Fr>) -> Vec<UUID> {
+    witness
+        .step_instances
+        .iter()
+        .map(|step_instance| step_instance.step_type_uuid)
+        .collect()
+}
+
+pub fn mock_prove(entry: &CircuitEntry, witness: WitnessSource) -> MockProverReport {
+    let (witness, witness_deserialize) = witness.into_witness_timed();
+    let step_type_uuids = step_type_uuids(&witness);
+
+    let start = Instant::now();
+    let circuit = assign(entry, witness);
+    let assignment = start.elapsed();
+    let (result, synthesis, verification) = mock_verify_timed(entry.k, &circuit);
+
+    MockProverReport::new(
+        entry,
+        &step_type_uuids,
+        result,
+        [
+            ("witness_deserialize", witness_deserialize),
+            ("synthesis", assignment + synthesis),
+            ("verification", verification),
+        ],
+    )
+}
+
+// JSON witness parsing and verification run in parallel; witness assignment needs the entry and
+// runs sequentially on the calling thread. Only AST compilation is shared by the batch: halo2's
+// MockProver has no way to reuse the fixed columns and permutation assembly of an earlier run, so
+// each witness clones the compiled circuit and synthesizes it again. The batch saves the
+// Python<->Rust round trips and verifies witnesses in parallel.
+pub fn mock_prove_batch(
+    py: Python,
+    entry: &CircuitEntry,
+    witnesses: Vec<WitnessSource>,
+) -> Vec<MockProverReport> {
+    let witnesses: Vec<_> = py.allow_threads(|| {
+        witnesses
+            .into_par_iter()
+            .map(WitnessSource::into_witness_timed)
+            .collect()
+    });
+    let assigned: Vec<_> = witnesses
+        .into_iter()
+        .map(|(witness, witness_deserialize)| {
+            let step_type_uuids = step_type_uuids(&witness);
+            let start = Instant::now();
+            let circuit = assign(entry, witness);
+            (
+                circuit,
+                step_type_uuids,
+                witness_deserialize,
+                start.elapsed(),
+            )
+        })
+        .collect();
+    let k = entry.k;
+    let results: Vec<_> = py.allow_threads(|| {
+        assigned
+            .par_iter()
+            .map(|(circuit, ..)| mock_verify_timed(k, circuit))
+            .collect()
+    });
+
+    assigned
+        .iter()
+        .zip(results)
+        .map(
+            |(
+                (_, step_type_uuids, witness_deserialize, assignment),
+                (result, synthesis, verification),
+            )| {
+                MockProverReport::new(
+                    entry,
+                    step_type_uuids,
+                    result,
+                    [
+                        ("witness_deserialize", *witness_deserialize),
+                        ("synthesis", *assignment + synthesis),
+                        ("verification", verification),
+                    ],
+                )
+            },
+        )
+        .collect()
+}
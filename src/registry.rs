@@ -0,0 +1,228 @@
+use chiquito::{
+    ast::{
+        expr::{query::Queriable, Expr},
+        Circuit,
+    },
+    backend::halo2::ChiquitoHalo2,
+    ir::assignments::AssignmentGenerator,
+    util::{uuid, UUID},
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use pyo3::prelude::*;
+use std::{
+    cell::RefCell,
+    collections::HashMap,
+    mem::size_of,
+    rc::Rc,
+    time::{Duration, Instant},
+};
+
+use crate::{
+    check::CheckPlan,
+    convert::signal_queriables,
+    keys::Keys,
+    placement::{compile_with, Layout, Placement},
+};
+
+// Rows halo2 reserves at the end of every circuit for blinding factors.
+const UNUSABLE_ROWS: usize = 10;
+const MIN_K: u32 = 7;
+
+pub struct CircuitEntry {
+    pub ast: Circuit<Fr, ()>,
+    pub compiled: ChiquitoHalo2<Fr>,
+    pub assignment_generator: Option<AssignmentGenerator<Fr, ()>>,
+    pub k: u32,
+    pub step_height: usize,
+    pub layout: Layout,
+    pub ast_bytes: usize,
+    pub signals: HashMap<UUID, Queriable<Fr>>,
+    pub check_plan: CheckPlan,
+    pub ast_deserialize: Duration,
+    pub compile: Duration,
+    pub keys: RefCell<Option<Rc<Keys>>>,
+}
+
+pub const DEFAULT_CAPACITY: usize = 64;
+
+// Compiled circuits keyed by the UUID handed back to Python, bounded to `capacity` entries. When
+// full, the least recently used circuit is evicted; Python re-registers evicted circuits on demand.
+pub struct Registry {
+    entries: HashMap<UUID, (Rc<CircuitEntry>, u64)>,
+    capacity: usize,
+    clock: u64,
+    evictions: u64,
+}
+
+pub struct RegistryStats {
+    pub capacity: usize,
+    pub evictions: u64,
+    // (uuid, estimated AST bytes, proving key bytes) per registered circuit.
+    pub entries: Vec<(UUID, usize, usize)>,
+}
+
+impl Registry {
+    fn tick(&mut self) -> u64 {
+        self.clock += 1;
+        self.clock
+    }
+
+    fn evict_to(&mut self, capacity: usize) {
+        while self.entries.len() > capacity {
+            let lru = *self
+                .entries
+                .iter()
+                .min_by_key(|(_, (_, last_used))| *last_used)
+                .unwrap()
+                .0;
+            self.entries.remove(&lru);
+            self.evictions += 1;
+        }
+    }
+}
+
+thread_local! {
+    static REGISTRY: RefCell<Registry> = RefCell::new(Registry {
+        entries: HashMap::new(),
+        capacity: DEFAULT_CAPACITY,
+        clock: 0,
+        evictions: 0,
+    });
+}
+
+pub fn k_for_rows(rows: usize) -> u32 {
+    let mut k = MIN_K;
+    while (1usize << k) < rows + UNUSABLE_ROWS {
+        k += 1;
+    }
+    k
+}
+
+fn expr_nodes(expr: &Expr<Fr>) -> usize {
+    match expr {
+        Expr::Sum(exprs) | Expr::Mul(exprs) => 1 + exprs.iter().map(expr_nodes).sum::<usize>(),
+        Expr::Neg(expr) | Expr::Pow(expr, _) => 1 + expr_nodes(expr),
+        _ => 1,
+    }
+}
+
+// Rough in-memory size of the AST: expression nodes, signals and annotation strings. The compiled
+// circuit grows with the same quantities.
+fn estimate_ast_bytes(ast: &Circuit<Fr, ()>) -> usize {
+    let annotations: usize = ast.annotations.values().map(|a| a.len()).sum();
+    let step_types: usize = ast
+        .step_types
+        .values()
+        .map(|step_type| {
+            let exprs: usize = step_type
+                .constraints
+                .iter()
+                .map(|c| expr_nodes(&c.expr) + c.annotation.len())
+                .chain(
+                    step_type
+                        .transition_constraints
+                        .iter()
+                        .map(|c| expr_nodes(&c.expr) + c.annotation.len()),
+                )
+                .sum();
+            exprs * size_of::<Expr<Fr>>()
+                + step_type
+                    .annotations
+                    .values()
+                    .map(|a| a.len())
+                    .sum::<usize>()
+        })
+        .sum();
+    let signals = ast.forward_signals.len() + ast.shared_signals.len() + ast.fixed_signals.len();
+
+    annotations + step_types + signals * size_of::<Queriable<Fr>>()
+}
+
+pub fn parse_ast(ast_json: &str) -> (Circuit<Fr, ()>, Duration) {
+    let start = Instant::now();
+    let ast: Circuit<Fr, ()> =
+        serde_json::from_str(ast_json).expect("Json deserialization to Circuit failed.");
+
+    (ast, start.elapsed())
+}
+
+pub fn register(
+    ast: Circuit<Fr, ()>,
+    ast_deserialize: Duration,
+    placement: Placement,
+) -> PyResult<UUID> {
+    let start = Instant::now();
+    let (compiled, assignment_generator, layout) = compile_with(&ast, placement)?;
+    let compile = start.elapsed();
+    let (k, step_height) = (layout.k, layout.step_height);
+    let uuid = uuid();
+    let ast_bytes = estimate_ast_bytes(&ast);
+    let signals = signal_queriables(&ast);
+    let check_plan = CheckPlan::new(&ast);
+
+    let entry = Rc::new(CircuitEntry {
+        ast,
+        compiled,
+        assignment_generator,
+        k,
+        step_height,
+        layout,
+        ast_bytes,
+        signals,
+        check_plan,
+        ast_deserialize,
+        compile,
+        keys: RefCell::new(None),
+    });
+
+    REGISTRY.with(|registry| {
+        let mut registry = registry.borrow_mut();
+        let capacity = registry.capacity;
+        registry.evict_to(capacity - 1);
+        let now = registry.tick();
+        registry.entries.insert(uuid, (entry, now));
+    });
+
+    Ok(uuid)
+}
+
+pub fn get(uuid: UUID) -> Option<Rc<CircuitEntry>> {
+    REGISTRY.with(|registry| {
+        let mut registry = registry.borrow_mut();
+        let now = registry.tick();
+        registry.entries.get_mut(&uuid).map(|(entry, last_used)| {
+            *last_used = now;
+            entry.clone()
+        })
+    })
+}
+
+pub fn remove(uuid: UUID) -> bool {
+    REGISTRY.with(|registry| registry.borrow_mut().entries.remove(&uuid).is_some())
+}
+
+pub fn set_capacity(capacity: usize) {
+    REGISTRY.with(|registry| {
+        let mut registry = registry.borrow_mut();
+        registry.capacity = capacity;
+        registry.evict_to(capacity);
+    })
+}
+
+pub fn stats() -> RegistryStats {
+    REGISTRY.with(|registry| {
+        let registry = registry.borrow();
+        RegistryStats {
+            capacity: registry.capacity,
+            evictions: registry.evictions,
+            entries: registry
+                .entries
+                .iter()
+                .map(|(uuid, (entry, _))| {
+                    let keys_bytes = entry.keys.borrow().as_ref().map_or(0, |keys| keys.bytes);
+                    (*uuid, entry.ast_bytes, keys_bytes)
+                })
+                .collect(),
+        }
+    })
+}
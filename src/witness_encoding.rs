@@ -0,0 +1,108 @@
+use chiquito::{
+    ast::expr::query::Queriable,
+    util::UUID,
+    wit_gen::{StepInstance, TraceWitness},
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use pyo3::{
+    exceptions::{PyKeyError, PyValueError},
+    prelude::*,
+};
+use serde::Deserialize;
+use std::collections::HashMap;
+
+use crate::fr_from_limbs;
+
+// Decodes the columnar witnesses of python/chiquito/witness_encoding.py, which documents the
+// encodings.
+
+#[derive(Deserialize)]
+enum Column<T> {
+    Constant(T),
+    RunLength(Vec<(T, usize)>),
+    Dictionary(Vec<T>, Vec<usize>),
+    SmallInt(Vec<Option<u64>>),
+    Raw(Vec<T>),
+}
+
+#[derive(Deserialize)]
+struct EncodedWitness {
+    num_steps: usize,
+    step_types: Column<UUID>,
+    signals: Vec<(UUID, Column<Option<[u64; 4]>>)>,
+}
+
+impl<T: Clone> Column<T> {
+    fn decode(
+        self,
+        num_steps: usize,
+        small_int: impl Fn(Option<u64>) -> PyResult<T>,
+    ) -> PyResult<Vec<T>> {
+        let values = match self {
+            Column::Constant(value) => vec![value; num_steps],
+            Column::RunLength(runs) => runs
+                .into_iter()
+                .flat_map(|(value, count)| std::iter::repeat(value).take(count))
+                .collect(),
+            Column::Dictionary(dictionary, indexes) => indexes
+                .into_iter()
+                .map(|index| {
+                    dictionary.get(index).cloned().ok_or_else(|| {
+                        PyValueError::new_err(format!("Dictionary index {} out of range.", index))
+                    })
+                })
+                .collect::<PyResult<_>>()?,
+            Column::SmallInt(values) => {
+                values.into_iter().map(small_int).collect::<PyResult<_>>()?
+            }
+            Column::Raw(values) => values,
+        };
+        if values.len() != num_steps {
+            return Err(PyValueError::new_err(format!(
+                "Column has {} values, expected {}.",
+                values.len(),
+                num_steps
+            )));
+        }
+
+        Ok(values)
+    }
+}
+
+pub fn decode_witness(
+    signals: &HashMap<UUID, Queriable<Fr>>,
+    witness_json: &str,
+) -> PyResult<TraceWitness<Fr>> {
+    let encoded: EncodedWitness = serde_json::from_str(witness_json)
+        .map_err(|e| PyValueError::new_err(format!("Invalid compressed witness: {}.", e)))?;
+    let num_steps = encoded.num_steps;
+
+    let step_types = encoded.step_types.decode(num_steps, |value| {
+        value
+            .map(UUID::from)
+            .ok_or_else(|| PyValueError::new_err("Missing step type id."))
+    })?;
+    let mut step_instances: Vec<_> = step_types
+        .into_iter()
+        .map(|step_type_uuid| StepInstance {
+            step_type_uuid,
+            assignments: HashMap::new(),
+        })
+        .collect();
+
+    for (signal_id, column) in encoded.signals {
+        let queriable = signals.get(&signal_id).ok_or_else(|| {
+            PyKeyError::new_err(format!("Signal {} is not in the circuit.", signal_id))
+        })?;
+        let values = column.decode(num_steps, |value| Ok(value.map(|n| [n, 0, 0, 0])))?;
+        for (step_instance, value) in step_instances.iter_mut().zip(values) {
+            if let Some(limbs) = value {
+                step_instance
+                    .assignments
+                    .insert(queriable.clone(), fr_from_limbs(limbs));
+            }
+        }
+    }
+
+    Ok(TraceWitness { step_instances })
+}
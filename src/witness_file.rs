@@ -0,0 +1,149 @@
+use chiquito::{
+    ast::expr::query::Queriable,
+    util::UUID,
+    wit_gen::{StepInstance, TraceWitness},
+};
+use halo2_proofs::halo2curves::bn256::Fr;
+use memmap2::Mmap;
+use pyo3::{
+    exceptions::{PyIOError, PyKeyError, PyValueError},
+    prelude::*,
+};
+use std::{collections::HashMap, fs::File};
+
+use crate::fr_from_bytes;
+
+// Reads the witness files written by python/chiquito/witness_file.py, which documents the format,
+// through a read-only memory map. chiquito's AssignmentGenerator takes a whole TraceWitness, so
+// the witness is still built in memory here: the file bounds the memory of trace generation in
+// Python, not of proving.
+
+const MAGIC: &[u8; 8] = b"CHQWITNS";
+const VERSION: u32 = 1;
+const HEADER_SIZE: usize = 64;
+const SECTION_ALIGN: usize = 64;
+const VALUE_SIZE: usize = 32;
+
+fn align(offset: usize) -> usize {
+    (offset + SECTION_ALIGN - 1) / SECTION_ALIGN * SECTION_ALIGN
+}
+
+struct Layout {
+    capacity: usize,
+    signal_ids: usize,
+    step_types: usize,
+    bitmaps: usize,
+    bitmap_size: usize,
+    values: usize,
+    size: usize,
+}
+
+impl Layout {
+    fn new(signals: usize, capacity: usize) -> Self {
+        let signal_ids = HEADER_SIZE;
+        let step_types = align(signal_ids + 16 * signals);
+        let bitmap_size = align((capacity + 7) / 8);
+        let bitmaps = align(step_types + 16 * capacity);
+        let values = align(bitmaps + bitmap_size * signals);
+
+        Layout {
+            capacity,
+            signal_ids,
+            step_types,
+            bitmaps,
+            bitmap_size,
+            values,
+            size: values + VALUE_SIZE * capacity * signals,
+        }
+    }
+
+    fn assigned(&self, map: &[u8], signal: usize, step: usize) -> bool {
+        map[self.bitmaps + self.bitmap_size * signal + step / 8] & (1 << (step % 8)) != 0
+    }
+
+    fn value(&self, signal: usize, step: usize) -> usize {
+        self.values + VALUE_SIZE * (self.capacity * signal + step)
+    }
+}
+
+fn read_u32(map: &[u8], offset: usize) -> u32 {
+    u32::from_le_bytes(map[offset..offset + 4].try_into().unwrap())
+}
+
+fn read_u64(map: &[u8], offset: usize) -> usize {
+    u64::from_le_bytes(map[offset..offset + 8].try_into().unwrap()) as usize
+}
+
+fn read_u128(map: &[u8], offset: usize) -> u128 {
+    u128::from_le_bytes(map[offset..offset + 16].try_into().unwrap())
+}
+
+// `circuit_id` is the id of the registered AST, checked against the id the file was written for.
+pub fn read_witness_file(
+    signals: &HashMap<UUID, Queriable<Fr>>,
+    circuit_id: UUID,
+    path: &str,
+) -> PyResult<TraceWitness<Fr>> {
+    let file = File::open(path)
+        .map_err(|e| PyIOError::new_err(format!("Cannot open {}: {}.", path, e)))?;
+    // Safety: the file must not be truncated while mapped, which the writer never does once closed.
+    let map = unsafe { Mmap::map(&file) }
+        .map_err(|e| PyIOError::new_err(format!("Cannot map {}: {}.", path, e)))?;
+
+    if map.len() < HEADER_SIZE || &map[..8] != MAGIC {
+        return Err(PyValueError::new_err(format!(
+            "{} is not a chiquito witness file.",
+            path
+        )));
+    }
+    let version = read_u32(&map, 8);
+    if version != VERSION {
+        return Err(PyValueError::new_err(format!(
+            "{} has witness file version {}, expected {}.",
+            path, version, VERSION
+        )));
+    }
+    let num_signals = read_u64(&map, 16);
+    let capacity = read_u64(&map, 24);
+    let num_steps = read_u64(&map, 32);
+    let file_circuit_id = read_u128(&map, 40);
+    if file_circuit_id != circuit_id {
+        return Err(PyValueError::new_err(format!(
+            "{} was written for circuit {}, not {}.",
+            path, file_circuit_id, circuit_id
+        )));
+    }
+    let layout = Layout::new(num_signals, capacity);
+    if map.len() < layout.size || num_steps > capacity {
+        return Err(PyValueError::new_err(format!("{} is truncated.", path)));
+    }
+
+    let columns = (0..num_signals)
+        .map(|i| {
+            let signal_id = read_u128(&map, layout.signal_ids + 16 * i);
+            signals.get(&signal_id).cloned().ok_or_else(|| {
+                PyKeyError::new_err(format!("Signal {} is not in the circuit.", signal_id))
+            })
+        })
+        .collect::<PyResult<Vec<_>>>()?;
+
+    let mut step_instances = Vec::with_capacity(num_steps);
+    for step in 0..num_steps {
+        let mut assignments = HashMap::with_capacity(columns.len());
+        for (signal, queriable) in columns.iter().enumerate() {
+            if !layout.assigned(&map, signal, step) {
+                continue;
+            }
+            let offset = layout.value(signal, step);
+            let repr: [u8; VALUE_SIZE] = map[offset..offset + VALUE_SIZE].try_into().unwrap();
+            let value = fr_from_bytes(&repr);
+            assignments.insert(queriable.clone(), value);
+        }
+        step_instances.push(StepInstance {
+            step_type_uuid: read_u128(&map, layout.step_types + 16 * step),
+            assignments,
+        });
+    }
+
+    Ok(TraceWitness { step_instances })
+}
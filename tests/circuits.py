@@ -0,0 +1,166 @@
+from chiquito.dsl import Circuit, StepType, StepTypeTemplate
+from chiquito.cb import eq
+from chiquito.util import F
+from chiquito.chiquito_ast import Last
+
+
+# Same circuit as examples/fibonacci.py.
+class FiboFirstStep(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a, 1))
+        self.constr(eq(self.circuit.b, 1))
+        self.constr(eq(self.circuit.a + self.circuit.b, self.c))
+        self.transition(eq(self.circuit.b, self.circuit.a.next()))
+        self.transition(eq(self.c, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+    def wg(self, args):
+        a_value, b_value, n_value = args
+        self.assign(self.circuit.a, F(a_value))
+        self.assign(self.circuit.b, F(b_value))
+        self.assign(self.c, F(a_value + b_value))
+        self.assign(self.circuit.n, F(n_value))
+
+
+class FiboStep(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a + self.circuit.b, self.c))
+        self.transition(eq(self.circuit.b, self.circuit.a.next()))
+        self.transition(eq(self.c, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+    def wg(self, args):
+        a_value, b_value, n_value = args
+        self.assign(self.circuit.a, F(a_value))
+        self.assign(self.circuit.b, F(b_value))
+        self.assign(self.c, F(a_value + b_value))
+        self.assign(self.circuit.n, F(n_value))
+
+
+class Padding(StepType):
+    def setup(self):
+        self.transition(eq(self.circuit.b, self.circuit.b.next()))
+        self.transition(eq(self.circuit.n, self.circuit.n.next()))
+
+    def wg(self, args):
+        a_value, b_value, n_value = args
+        self.assign(self.circuit.a, F(a_value))
+        self.assign(self.circuit.b, F(b_value))
+        self.assign(self.circuit.n, F(n_value))
+
+
+class Fibonacci(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.b = self.forward("b")
+        self.n = self.forward("n")
+
+        self.fibo_first_step = self.step_type(FiboFirstStep(self, "fibo_first_step"))
+        self.fibo_step = self.step_type(FiboStep(self, "fibo_step"))
+        self.padding = self.step_type(Padding(self, "padding"))
+
+        self.pragma_num_steps(10)
+        self.pragma_first_step(self.fibo_first_step)
+        self.pragma_last_step(self.padding)
+
+        self.expose(self.b, Last())
+        self.expose(self.n, Last())
+
+    def trace(self, n):
+        self.add(self.fibo_first_step, (1, 1, n))
+        a = 1
+        b = 2
+        for i in range(1, n):
+            self.add(self.fibo_step, (a, b, n))
+            prev_a = a
+            a = b
+            b += prev_a
+        while self.needs_padding():
+            self.add(self.padding, (a, b, n))
+
+
+# `wg` only assigns d, the solver derives c from 2 * c = d and e from c + e = 3.
+class Halve(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.d = self.internal("d")
+        self.e = self.internal("e")
+        self.pragma_solve_witness()
+        self.constr(eq(2 * self.c, self.d))
+        self.constr(eq(self.c + self.e, 3))
+
+    def wg(self, d):
+        self.assign(self.d, F(d))
+
+
+class Halving(Circuit):
+    def setup(self):
+        self.halve = self.step_type(Halve(self, "halve"))
+        self.pragma_num_steps(4)
+
+    def trace(self, values):
+        self.add(self.halve, values[0])
+        self.add_many(self.halve, {self.halve.d: values[1:]})
+
+
+# a' = a * factor + offset, with one template instance per offset.
+class Round(StepTypeTemplate):
+    def setup(self):
+        self.pragma_solve_witness()
+        self.constr(
+            eq(
+                self.circuit.a * self.param("factor") + self.param("offset"),
+                self.circuit.b,
+            )
+        )
+        self.transition(eq(self.circuit.b, self.circuit.a.next()))
+
+    def wg(self, a):
+        self.assign(self.circuit.a, F(a))
+
+
+class Rounds(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.b = self.forward("b")
+        self.rounds = [
+            self.step_type(Round(self, f"round_{i}", factor=2, offset=i))
+            for i in range(3)
+        ]
+        self.pragma_num_steps(3)
+
+    def trace(self, a):
+        for round in self.rounds:
+            self.add(round, a)
+            a = a * 2 + round.params["offset"].n
+
+
+# acc is a phase 1 signal accumulating the values of x with the challenge: acc = acc * r + x.
+class Accumulate(StepType):
+    def setup(self):
+        pass
+
+    def wg(self, x):
+        self.assign(self.circuit.x, F(x))
+        self.assign_deferred(
+            self.circuit.acc,
+            lambda challenges, previous: (
+                0 if previous is None else previous.assignments[self.circuit.acc].n
+            )
+            * challenges[0].n
+            + x,
+        )
+
+
+class Accumulator(Circuit):
+    def setup(self):
+        self.x = self.forward("x")
+        self.acc = self.forward_with_phase("acc", 1)
+        self.accumulate = self.step_type(Accumulate(self, "accumulate"))
+        self.pragma_num_steps(3)
+
+    def trace(self, xs):
+        for x in xs:
+            self.add(self.accumulate, x)
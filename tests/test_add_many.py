@@ -0,0 +1,99 @@
+import pytest
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+from chiquito.util import F
+
+
+class Square(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a * self.circuit.a, self.c))
+        self.transition(eq(self.circuit.a + 1, self.circuit.a.next()))
+
+    def wg(self, a):
+        self.assign(self.circuit.a, F(a))
+        self.assign(self.c, F(a * a))
+
+
+class Other(StepType):
+    def setup(self):
+        self.d = self.internal("d")
+
+    def wg(self, args):
+        pass
+
+
+class Squares(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.square = self.step_type(Square(self, "square"))
+        self.other = self.step_type(Other(self, "other"))
+        self.pragma_num_steps(4)
+
+    def trace(self, columns):
+        self.add(self.square, 0)
+        self.add_many(self.square, columns(self.square))
+
+
+def values(witness):
+    return [
+        sorted(F(rhs).n for rhs in step_instance.assignments.values())
+        for step_instance in witness.step_instances
+    ]
+
+
+def test_same_as_add():
+    witness = Squares().gen_witness(
+        lambda square: {square.circuit.a: [1, 2, 3], square.c: [1, 4, 9]}
+    )
+    assert values(witness) == [[0, 0], [1, 1], [2, 4], [3, 9]]
+    circuit = Squares()
+    witness = circuit.gen_witness(lambda square: {square.circuit.a: [1], square.c: [1]})
+    assert [s.step_type_uuid for s in witness.step_instances] == [
+        circuit.square.step_type.id
+    ] * 2
+
+
+def test_column_types():
+    class Column:
+        def __init__(self, values):
+            self.values = values
+
+        def tolist(self):
+            return self.values
+
+    limbs = [[n, 0, 0, 0] for n in (1, 2, 3)]
+    witness = Squares().gen_witness(
+        lambda square: {square.circuit.a: Column(limbs), square.c: iter([1, 4, 9])}
+    )
+    assert values(witness) == [[0, 0], [1, 1], [2, 4], [3, 9]]
+    with pytest.raises(ValueError, match="4 limbs"):
+        Squares().gen_witness(lambda square: {square.c: [[1, 0]]})
+
+
+def test_rejects_other_signals():
+    with pytest.raises(ValueError, match="Cannot assign"):
+        Squares().gen_witness(lambda square: {square.circuit.a.next(): [1]})
+    with pytest.raises(ValueError, match="Cannot assign"):
+        Squares().gen_witness(lambda square: {square.circuit.other.d: [1]})
+
+
+def test_rejects_bad_lengths():
+    with pytest.raises(ValueError, match="different lengths"):
+        Squares().gen_witness(lambda square: {square.circuit.a: [1, 2], square.c: [1]})
+    with pytest.raises(ValueError, match="exceeds 4"):
+        Squares().gen_witness(lambda square: {square.circuit.a: [1, 2, 3, 4]})
+
+
+def test_numpy():
+    np = pytest.importorskip("numpy")
+    witness = Squares().gen_witness(
+        lambda square: {
+            square.circuit.a: np.arange(1, 4),
+            square.c: np.array(
+                [[n * n, 0, 0, 0] for n in range(1, 4)], dtype=np.uint64
+            ),
+        }
+    )
+    assert values(witness) == [[0, 0], [1, 1], [2, 4], [3, 9]]
@@ -0,0 +1,202 @@
+import json
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import Constraint, Typing, eq
+from chiquito.compact_ast import compact_ast
+from chiquito.expr import Const, Sum, Mul, Neg, Pow, bind_params
+from chiquito.query import Internal, Forward, Shared, Fixed, StepTypeNext
+from chiquito.util import F, from_limbs
+
+from circuits import Fibonacci, Rounds
+
+BIG = 2**200 + 7
+
+
+class Last(StepType):
+    def setup(self):
+        self.constr(eq(self.circuit.a, self.circuit.s.next()))
+
+    def wg(self, args):
+        pass
+
+
+class First(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a * BIG, self.c))
+        self.constr(eq((self.circuit.a - self.c) ** 2, self.circuit.x))
+        # Annotated by hand, StepTypeNext has no `str`.
+        self.transition(
+            Constraint(
+                "next step is last then c == 0",
+                StepTypeNext(self.circuit.last.step_type) * self.c,
+                Typing.AntiBooly,
+            )
+        )
+
+    def wg(self, args):
+        pass
+
+
+class Mixed(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.s = self.shared("s")
+        self.x = self.fixed("x")
+        self.last = self.step_type(Last(self, "last"))
+        self.first = self.step_type(First(self, "first"))
+        self.pragma_first_step(self.first)
+        self.pragma_last_step(self.last)
+        self.pragma_num_steps(2)
+
+
+# Nested tuples with signals and step types by id, from the AST and from the compact form.
+def from_expr(expr):
+    match expr:
+        case Const(value):
+            return ("k", value.n)
+        case Sum(exprs):
+            return ("+", [from_expr(sub_expr) for sub_expr in exprs])
+        case Mul(exprs):
+            return ("*", [from_expr(sub_expr) for sub_expr in exprs])
+        case Neg(sub_expr):
+            return ("-", from_expr(sub_expr))
+        case Pow(sub_expr, pow):
+            return ("^", from_expr(sub_expr), pow)
+        case StepTypeNext():
+            return ("n", expr.step_type.id)
+        case Internal():
+            return ("q", expr.signal.id, 0)
+        case Forward() | Shared() | Fixed():
+            return ("q", expr.signal.id, int(expr.rotation))
+
+
+def from_compact(compact, expr, params={}):
+    match expr:
+        case {"k": n}:
+            return ("k", n)
+        case {"c": limbs}:
+            return ("k", from_limbs(limbs).n)
+        case {"+": exprs}:
+            return (
+                "+",
+                [from_compact(compact, sub_expr, params) for sub_expr in exprs],
+            )
+        case {"*": exprs}:
+            return (
+                "*",
+                [from_compact(compact, sub_expr, params) for sub_expr in exprs],
+            )
+        case {"-": sub_expr}:
+            return ("-", from_compact(compact, sub_expr, params))
+        case {"^": [sub_expr, pow]}:
+            return ("^", from_compact(compact, sub_expr, params), pow)
+        case {"n": step_type}:
+            return ("n", compact["step_types"][step_type][0])
+        case {"q": [signal, rotation]}:
+            return ("q", compact["signals"][signal][1], rotation)
+        case {"p": name}:
+            return params[name]
+
+
+# Constraints and transition constraints of a step type, with its parameters bound.
+def step_type_constraints(compact, step_type):
+    (_, _, _, constraints, transition_constraints, params) = step_type
+    if isinstance(constraints, int):
+        (_, _, _, constraints, transition_constraints, _) = compact["step_types"][
+            constraints
+        ]
+    params = {name: from_compact(compact, value) for name, value in params}
+    return [
+        (annotation, from_compact(compact, expr, params))
+        for annotation, expr in constraints + transition_constraints
+    ]
+
+
+def decode_step_types(compact):
+    strings = compact["strings"]
+    return {
+        step_type[0]: (
+            strings[step_type[1]],
+            [compact["signals"][signal][1] for signal in step_type[2]],
+            [
+                (strings[annotation], expr)
+                for annotation, expr in step_type_constraints(compact, step_type)
+            ],
+        )
+        for step_type in compact["step_types"]
+    }
+
+
+def ast_step_types(ast):
+    return {
+        step_type.id: (
+            step_type.name,
+            [signal.id for signal in step_type.signals],
+            [
+                (
+                    constraint.annotation,
+                    from_expr(bind_params(constraint.expr, step_type.params)),
+                )
+                for constraint in step_type.constraints
+                + step_type.transition_constraints
+            ],
+        )
+        for step_type in ast.step_types.values()
+    }
+
+
+def test_round_trip():
+    for circuit in (Fibonacci(), Mixed(), Rounds()):
+        compact = json.loads(circuit.get_compact_ast_json())
+        assert decode_step_types(compact) == ast_step_types(circuit.ast)
+        assert compact["id"] == circuit.ast.id
+        assert compact["num_steps"] == circuit.ast.num_steps
+
+
+def test_signal_table():
+    circuit = Mixed()
+    compact = compact_ast(circuit.ast)
+    strings = compact["strings"]
+    assert len(strings) == len(set(strings))
+    signals = [(kind, strings[name]) for kind, _, _, name in compact["signals"]]
+    assert signals == [("f", "a"), ("s", "s"), ("x", "x"), ("i", "c")]
+    assert [compact["signals"][s][1] for s in compact["forward_signals"]] == [
+        circuit.a.signal.id
+    ]
+    assert compact["first_step"] == 1
+    assert compact["last_step"] == 0
+
+
+def test_constants():
+    circuit = Mixed()
+    compact = compact_ast(circuit.ast)
+    (_, big, squared, step_type_next) = [
+        expr
+        for (_, _, _, constraints, transition_constraints, _) in compact["step_types"]
+        for (_, expr) in constraints + transition_constraints
+    ]
+    # a * BIG - c, BIG doesn't fit a u64.
+    assert big["+"][0]["*"][1] == {"c": F(BIG).__json__()}
+    assert squared["+"][0]["^"][1] == 2
+    assert step_type_next["*"][0] == {"n": compact["last_step"]}
+
+
+def test_template_constraints_once():
+    circuit = Rounds()
+    compact = compact_ast(circuit.ast)
+    step_types = compact["step_types"]
+    assert [step_type[3:5] for step_type in step_types[1:]] == [[0, 0], [0, 0]]
+    (((_, expr),), _) = step_types[0][3:5]
+    assert "p" in json.dumps(expr)
+    strings = compact["strings"]
+    for offset, step_type in enumerate(step_types):
+        params = {strings[name]: value for name, value in step_type[5]}
+        assert params == {"factor": {"k": 2}, "offset": {"k": offset}}
+        (_, constant) = step_type_constraints(compact, step_type)[0]
+        assert ("k", offset) in constant[1]
+
+
+def test_smaller_than_json():
+    circuit = Fibonacci()
+    assert len(circuit.get_compact_ast_json()) < len(circuit.get_ast_json())
@@ -0,0 +1,150 @@
+from chiquito.dsl import Circuit, StepType, StepTypeTemplate
+from chiquito.cb import eq
+from chiquito.util import F
+
+
+class Double(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a + self.circuit.a, self.c))
+        self.transition(eq(self.c, self.circuit.a.next()))
+
+    def wg(self, a):
+        self.assign(self.circuit.a, F(a))
+        self.assign(self.c, F(2 * a))
+
+
+class Triple(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a * 3, self.c))
+        self.transition(eq(self.c, self.circuit.a.next()))
+
+    def wg(self, a):
+        self.assign(self.circuit.a, F(a))
+        self.assign(self.c, F(3 * a))
+
+
+class Lanes(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.lanes = [self.step_type(Double(self, f"lane_{i}")) for i in range(3)]
+        self.triple = self.step_type(Triple(self, "triple"))
+        self.pragma_first_step(self.lanes[0])
+        self.pragma_last_step(self.lanes[2])
+        self.pragma_num_steps(4)
+        self.pragma_dedup_step_types()
+
+    def trace(self, a):
+        for lane in self.lanes:
+            self.add(lane, a)
+            a *= 2
+        self.add(self.triple, a)
+
+
+def test_merges_identical_step_types():
+    circuit = Lanes()
+    (first, second, third) = [lane.step_type for lane in circuit.lanes]
+    assert list(circuit.ast.step_types) == [first.id, circuit.triple.step_type.id]
+    assert second.id == third.id == first.id
+    assert circuit.merged_step_types == {
+        merged_id: first.id for merged_id in circuit.merged_step_types
+    }
+    assert len(circuit.merged_step_types) == 2
+    assert circuit.ast.first_step == circuit.ast.last_step == first.id
+    assert len(circuit.ast.annotations) == 1 + 2
+
+
+def test_witness_uses_kept_step_type():
+    circuit = Lanes()
+    witness = circuit.gen_witness(1)
+    kept = circuit.lanes[0].step_type
+    assert [s.step_type_uuid for s in witness.step_instances[:3]] == [kept.id] * 3
+    for step_instance in witness.step_instances[:3]:
+        assert {lhs.uuid() for lhs in step_instance.assignments} == {
+            circuit.a.signal.id,
+            kept.signals[0].id,
+        }
+    assert witness.step_instances[3].step_type_uuid == circuit.triple.step_type.id
+
+
+def test_remap_earlier_witness():
+    class Undeduped(Lanes):
+        def setup(self):
+            super().setup()
+            self.dedup_step_types = False
+
+    circuit = Undeduped()
+    witness = circuit.gen_witness(1)
+    merged = circuit.ast.dedup_step_types()
+    kept = circuit.lanes[0].step_type.id
+    remapped = witness.remap_step_types(merged)
+    assert [s.step_type_uuid for s in remapped.step_instances] == [
+        kept,
+        kept,
+        kept,
+        circuit.triple.step_type.id,
+    ]
+    # Internal signals of merged step types now have the ids of the kept ones.
+    assert {
+        lhs.uuid(): F(rhs).n
+        for lhs, rhs in remapped.step_instances[1].assignments.items()
+    } == {circuit.a.signal.id: 2, circuit.lanes[0].step_type.signals[0].id: 4}
+
+
+class DoubleLane(StepTypeTemplate):
+    def setup(self):
+        self.c = self.internal("c")
+        self.constr(eq(self.circuit.a + self.circuit.a, self.c))
+        self.transition(eq(self.c, self.circuit.a.next()))
+
+    def wg(self, a):
+        self.assign(self.circuit.a, F(a))
+        self.assign(self.c, F(2 * a))
+
+
+class OtherDoubleLane(DoubleLane):
+    pass
+
+
+# A plain step type first, then instances of two templates with the same structure.
+class TemplateLanes(Circuit):
+    def setup(self):
+        self.a = self.forward("a")
+        self.lanes = [self.step_type(Double(self, "double"))]
+        for template in (DoubleLane, OtherDoubleLane):
+            self.lanes += [
+                self.step_type(template(self, f"{template.__name__}_{i}"))
+                for i in range(2)
+            ]
+        self.pragma_num_steps(5)
+
+    def trace(self, a):
+        for lane in self.lanes:
+            self.add(lane, a)
+            a *= 2
+
+
+def test_keeps_template_signals():
+    circuit = TemplateLanes()
+    (double, first, second, other_first, other_second) = [
+        lane.step_type for lane in circuit.lanes
+    ]
+    assert first.signals is second.signals
+    signal_ids = [signal.id for signal in first.signals + other_first.signals]
+    annotations = (dict(first.annotations), dict(other_first.annotations))
+    circuit.ast.dedup_step_types()
+    # Template signals are not renamed, the plain step type takes their ids.
+    assert [signal.id for signal in first.signals + other_first.signals] == signal_ids
+    assert (first.annotations, other_first.annotations) == annotations
+    assert double.signals[0].id == first.signals[0].id
+    assert double.id == second.id == first.id
+    assert other_second.id == other_first.id != first.id
+    assert list(circuit.ast.step_types) == [first.id, other_first.id]
+    witness = circuit.gen_witness(1)
+    for step_instance in witness.step_instances:
+        step_type = circuit.ast.step_types[step_instance.step_type_uuid]
+        assert {lhs.uuid() for lhs in step_instance.assignments} == {
+            circuit.a.signal.id,
+            step_type.signals[0].id,
+        }
@@ -0,0 +1,50 @@
+import pytest
+
+from chiquito.util import F
+
+from circuits import Accumulator
+
+
+def values(witness, signal):
+    return [
+        F(step_instance.assignments[signal]).n
+        for step_instance in witness.step_instances
+    ]
+
+
+def test_resolve():
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3])
+    assert witness.has_deferred()
+    resolved = witness.resolve([F(10)])
+    assert not resolved.has_deferred()
+    assert values(resolved, circuit.acc) == [1, 12, 123]
+    assert values(witness.resolve([F(2)]), circuit.acc) == [1, 4, 11]
+    # Phase 0 values are shared between resolutions.
+    assert values(resolved, circuit.x) == [1, 2, 3]
+
+
+def test_remap_keeps_deferred():
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3])
+    remapped = witness.remap_step_types({})
+    assert remapped.has_deferred()
+    assert values(remapped.resolve([F(10)]), circuit.acc) == [1, 12, 123]
+
+
+def test_evil_witness_keeps_deferred():
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3])
+    evil = witness.evil_witness_test([1], [0], [F(5)])
+    assert evil.has_deferred()
+    resolved = evil.resolve([F(10)])
+    assert values(resolved, circuit.x) == [1, 5, 3]
+    assert values(resolved, circuit.acc) == [1, 12, 123]
+    assert values(witness, circuit.x) == [1, 2, 3]
+
+
+def test_json_rejects_deferred():
+    witness = Accumulator().gen_witness([1, 2, 3])
+    with pytest.raises(ValueError, match="deferred"):
+        witness.get_witness_json()
+    witness.resolve([F(10)]).get_witness_json()
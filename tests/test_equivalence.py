@@ -0,0 +1,42 @@
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+
+from circuits import Fibonacci
+
+
+def test_same_circuit():
+    assert Fibonacci().check_equivalence(Fibonacci(), seed=1)
+
+
+def circuit(constraints):
+    class Step(StepType):
+        def setup(self):
+            self.c = self.internal("c")
+            for constraint in constraints(self.circuit.a, self.circuit.b, self.c):
+                self.constr(constraint)
+
+        def wg(self, args):
+            pass
+
+    class Checked(Circuit):
+        def setup(self):
+            self.a = self.forward("a")
+            self.b = self.forward("b")
+            self.step_type(Step(self, "step"))
+            self.pragma_num_steps(1)
+
+    return Checked()
+
+
+def test_rewrites_are_equivalent():
+    original = circuit(lambda a, b, c: [eq(a + b, c), eq(a * b, 6)])
+    rewritten = circuit(lambda a, b, c: [eq(2 * (a * b), 12), eq(c, b + a)])
+    assert original.check_equivalence(rewritten, seed=1)
+
+
+def test_changed_constraint():
+    original = circuit(lambda a, b, c: [eq(a + b, c), eq(a * b, 6)])
+    changed = circuit(lambda a, b, c: [eq(a + b, c), eq(a * c, 6)])
+    report = original.check_equivalence(changed, seed=1)
+    assert not report
+    assert len(report.mismatches) == 2
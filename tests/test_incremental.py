@@ -0,0 +1,92 @@
+import pytest
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+from chiquito.util import F
+from chiquito.wit_gen import ResumePoint
+
+from circuits import Fibonacci
+
+
+class Count(StepType):
+    def setup(self):
+        self.transition(
+            eq(self.circuit.total + self.circuit.x, self.circuit.total.next())
+        )
+
+    def wg(self, args):
+        total, x = args
+        self.assign(self.circuit.total, F(total))
+        self.assign(self.circuit.x, F(x))
+
+
+# Running sum of `xs`, with a resume point after every step.
+class Sum(Circuit):
+    def setup(self):
+        self.total = self.forward("total")
+        self.x = self.forward("x")
+        self.count = self.step_type(Count(self, "count"))
+        self.pragma_num_steps(6)
+
+    def trace(self, xs):
+        self.trace_from((0, 0), xs)
+
+    def trace_from(self, state, xs):
+        (step, total) = state
+        for x in xs[step:]:
+            self.add(self.count, (total, x))
+            total += x
+            step += 1
+            self.resume_point((step, total))
+
+
+def test_resume():
+    circuit = Sum()
+    previous = circuit.gen_witness([1, 2, 3, 4, 5])
+    assert [r.step_index for r in previous.resume_points] == [1, 2, 3, 4, 5]
+
+    resume = previous.resume_points[2]
+    witness = circuit.gen_witness_incremental(previous, resume, [1, 2, 3, 10, 5, 6])
+    assert witness.step_instances[:3] == previous.step_instances[:3]
+    assert all(
+        new is old
+        for new, old in zip(witness.step_instances[:3], previous.step_instances)
+    )
+    assert [r.step_index for r in witness.resume_points] == [1, 2, 3, 4, 5, 6]
+    assert [
+        F(step_instance.assignments[circuit.total]).n
+        for step_instance in witness.step_instances
+    ] == [0, 1, 3, 6, 16, 21]
+    assert witness == circuit.gen_witness([1, 2, 3, 10, 5, 6])
+
+
+def test_diff():
+    circuit = Sum()
+    previous = circuit.gen_witness([1, 2, 3, 4, 5])
+    witness = circuit.gen_witness_incremental(
+        previous, previous.resume_points[2], [1, 2, 3, 4]
+    )
+    diff = witness.diff(previous)
+    # Step 3 keeps its values, step 4 is removed.
+    assert diff.changed == []
+    assert diff.removed == [4]
+    assert diff.affected_steps() == [3]
+
+    witness = circuit.gen_witness_incremental(
+        previous, previous.resume_points[1], [1, 2, 4, 4, 5, 6]
+    )
+    diff = witness.diff(previous)
+    assert diff.changed == [2, 3, 4, 5]
+    assert diff.removed == []
+    assert diff.affected_steps() == [1, 2, 3, 4, 5]
+    assert not circuit.gen_witness([1, 2]).diff(circuit.gen_witness([1, 2]))
+
+
+def test_errors():
+    circuit = Sum()
+    previous = circuit.gen_witness([1, 2])
+    with pytest.raises(ValueError, match="outside the previous witness"):
+        circuit.gen_witness_incremental(previous, ResumePoint(3, (3, 3)), [1, 2])
+    with pytest.raises(TypeError, match="trace_from"):
+        fibonacci = Fibonacci()
+        fibonacci.gen_witness_incremental(fibonacci.gen_witness(2), ResumePoint(0), 2)
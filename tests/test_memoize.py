@@ -0,0 +1,73 @@
+import pickle
+
+import pytest
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+from chiquito.util import F
+
+
+class Square(StepType):
+    def setup(self):
+        self.memoize(maxsize=2)
+        self.constr(eq(self.circuit.a * self.circuit.a, self.circuit.b))
+
+    def wg(self, a):
+        self.circuit.wg_calls += 1
+        self.assign(self.circuit.a, F(a))
+        self.assign(self.circuit.b, F(a * a))
+
+
+class Squares(Circuit):
+    def setup(self):
+        self.wg_calls = 0
+        self.a = self.forward("a")
+        self.b = self.forward("b")
+        self.square = self.step_type(Square(self, "square"))
+        self.pragma_num_steps(8)
+
+    def trace(self, values):
+        for a in values:
+            self.add(self.square, a)
+
+
+def test_shares_step_instances():
+    circuit = Squares()
+    witness = circuit.gen_witness([3, 3, 4, 3])
+    (first, second, third, fourth) = witness.step_instances
+    assert first is second and first is fourth
+    assert third is not first
+    assert circuit.wg_calls == 2
+    assert (circuit.square.memo_hits, circuit.square.memo_misses) == (2, 2)
+
+
+def test_lru_eviction():
+    circuit = Squares()
+    witness = circuit.gen_witness([1, 2, 1, 3, 1, 2])
+    # 1 is used again before 3 is added, so 2 is evicted instead.
+    assert circuit.wg_calls == 4
+    assert witness.step_instances[4] is witness.step_instances[0]
+    assert witness.step_instances[5] is not witness.step_instances[1]
+    assert list(circuit.square.memo) == [1, 2]
+
+
+def test_unhashable_args():
+    circuit = Squares()
+    circuit.square.wg = lambda args: Square.wg(circuit.square, args[0])
+    witness = circuit.gen_witness([[3], [3]])
+    assert witness.step_instances[0] is not witness.step_instances[1]
+    assert circuit.wg_calls == 2
+    assert len(circuit.square.memo) == 0
+
+
+def test_positive_size():
+    with pytest.raises(ValueError, match="positive"):
+        Squares().square.memoize(maxsize=0)
+
+
+def test_memo_not_pickled():
+    circuit = Squares()
+    circuit.gen_witness([3, 3])
+    square = pickle.loads(pickle.dumps(circuit)).square
+    assert len(square.memo) == 0 and square.memo_size == 2
+    assert (square.memo_hits, square.memo_misses) == (0, 0)
@@ -0,0 +1,108 @@
+import pytest
+
+from chiquito.prover import RustCircuit
+from chiquito import prover
+from chiquito.util import F
+
+from circuits import Accumulator, Fibonacci
+
+
+class CircuitNotRegistered(KeyError):
+    pass
+
+
+# Stands in for the Rust extension: a registry of ids, with `evict` and `fail` to make the next
+# `halo2_mock_prover` call raise.
+class FakeRust:
+    CircuitNotRegistered = CircuitNotRegistered
+
+    def __init__(self):
+        self.registered = set()
+        self.next_id = 1
+        self.calls = []
+        self.fail = None
+
+    def ast_object_to_halo2(self, ast, strategy, max_width):
+        rust_ast_id = self.next_id
+        self.next_id += 1
+        self.registered.add(rust_ast_id)
+        return rust_ast_id
+
+    def release_rust_ast(self, rust_ast_id):
+        self.registered.discard(rust_ast_id)
+
+    def evict(self, rust_ast_id):
+        self.registered.discard(rust_ast_id)
+
+    def halo2_mock_prover(self, witness, rust_ast_id):
+        self.calls.append(rust_ast_id)
+        if rust_ast_id not in self.registered:
+            raise CircuitNotRegistered(rust_ast_id)
+        if self.fail is not None:
+            (error, self.fail) = (self.fail, None)
+            raise error
+        return {"passed": True}
+
+    def halo2_mock_prover_batch(self, witnesses, rust_ast_id):
+        self.calls.append(rust_ast_id)
+        return [{"passed": True, "failures": [], "timings": {}} for _ in witnesses]
+
+
+@pytest.fixture
+def rust(monkeypatch):
+    rust = FakeRust()
+    monkeypatch.setattr(prover, "rust_chiquito", lambda: rust)
+    return rust
+
+
+def test_registers_once(rust):
+    circuit = RustCircuit(Fibonacci().ast)
+    witness = Fibonacci().gen_witness(3)
+    circuit.call("halo2_mock_prover", witness)
+    circuit.call("halo2_mock_prover", witness)
+    assert rust.calls == [1, 1]
+
+
+def test_registers_again_after_eviction(rust):
+    circuit = RustCircuit(Fibonacci().ast)
+    witness = Fibonacci().gen_witness(3)
+    circuit.call("halo2_mock_prover", witness)
+    rust.evict(circuit.id)
+    assert circuit.call("halo2_mock_prover", witness) == {"passed": True}
+    assert rust.calls == [1, 1, 2]
+    assert rust.registered == {2}
+
+
+def test_other_key_errors_propagate(rust):
+    circuit = RustCircuit(Fibonacci().ast)
+    witness = Fibonacci().gen_witness(3)
+    rust.fail = KeyError("signal")
+    with pytest.raises(KeyError, match="signal"):
+        circuit.call("halo2_mock_prover", witness)
+    assert rust.calls == [1]
+    assert circuit.id == 1
+
+
+def test_close(rust):
+    circuit = RustCircuit(Fibonacci().ast)
+    circuit.register()
+    circuit.close()
+    assert rust.registered == set()
+    with pytest.raises(ValueError, match="closed"):
+        circuit.call("halo2_mock_prover", Fibonacci().gen_witness(3))
+
+
+def test_rejects_deferred(rust):
+    circuit = RustCircuit(Accumulator().ast)
+    with pytest.raises(ValueError, match="deferred"):
+        circuit.call("halo2_mock_prover", Accumulator().gen_witness([1, 2, 3]))
+    assert rust.calls == []
+
+
+def test_batch_rejects_deferred(rust):
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3])
+    resolved = witness.resolve([F(10)])
+    assert len(circuit.halo2_mock_prover_batch(iter([resolved, resolved]))) == 2
+    with pytest.raises(ValueError, match="deferred"):
+        circuit.halo2_mock_prover_batch(iter([resolved, witness]))
@@ -0,0 +1,44 @@
+import pytest
+
+from chiquito.dsl import Circuit, SNAPSHOT_HEADER
+from chiquito.util import F
+
+from circuits import Fibonacci
+
+
+def values(witness):
+    return [
+        [F(rhs).n for rhs in step_instance.assignments.values()]
+        for step_instance in witness.step_instances
+    ]
+
+
+def test_round_trip(tmp_path):
+    circuit = Fibonacci()
+    path = tmp_path / "fibo.snapshot"
+    snapshot = circuit.freeze(path)
+    assert snapshot.startswith(SNAPSHOT_HEADER)
+    assert path.read_bytes() == snapshot
+
+    for loaded in (Circuit.load(snapshot), Circuit.load(str(path))):
+        assert type(loaded) is Fibonacci
+        assert loaded.get_ast_json() == circuit.get_ast_json()
+        witness = loaded.gen_witness(7)
+        assert values(witness) == values(circuit.gen_witness(7))
+        # Handles created in `setup` refer to the loaded AST.
+        assert {lhs.uuid() for lhs in witness.step_instances[0].assignments} <= {
+            signal.id for signal in loaded.ast.forward_signals
+        } | {signal.id for signal in loaded.fibo_first_step.step_type.signals}
+
+
+def test_runtime_state_not_captured():
+    circuit = Fibonacci()
+    circuit.get_rust_circuit()
+    loaded = Circuit.load(circuit.freeze())
+    assert loaded.rust_circuit is None
+
+
+def test_other_version():
+    snapshot = Fibonacci().freeze()
+    with pytest.raises(ValueError, match="Not a circuit snapshot"):
+        Circuit.load(b"CHIQUITO_SNAPSHOT_0\n" + snapshot[len(SNAPSHOT_HEADER) :])
@@ -0,0 +1,98 @@
+import pytest
+
+from chiquito.dsl import Circuit, StepType
+from chiquito.cb import eq
+from chiquito.util import F, SCALAR_MODULUS
+
+from circuits import Halving, Rounds
+
+
+def values(step_instance):
+    return {
+        lhs.signal.annotation: F(rhs).n
+        for lhs, rhs in step_instance.assignments.items()
+    }
+
+
+def test_solves_in_scalar_field():
+    witness = Halving().gen_witness([1, 3, 5, 7])
+    for step_instance in witness.step_instances:
+        step = values(step_instance)
+        assert step["c"] < SCALAR_MODULUS
+        assert (2 * step["c"] - step["d"]) % SCALAR_MODULUS == 0
+        assert (step["c"] + step["e"] - 3) % SCALAR_MODULUS == 0
+
+
+def test_solves_add_many():
+    witness = Halving().gen_witness([2, 4, 6, 8])
+    assert [values(s)["c"] for s in witness.step_instances] == [1, 2, 3, 4]
+
+
+def test_solves_with_template_params():
+    circuit = Rounds()
+    witness = circuit.gen_witness(1)
+    assert [(values(s)["a"], values(s)["b"]) for s in witness.step_instances] == [
+        (1, 2),
+        (2, 5),
+        (5, 12),
+    ]
+
+
+class Zero(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.d = self.internal("d")
+        self.pragma_solve_witness()
+        self.constr(eq(self.c * self.d, 1))
+
+    def wg(self, d):
+        self.assign(self.d, F(d))
+
+
+class ZeroCircuit(Circuit):
+    def setup(self):
+        self.zero = self.step_type(Zero(self, "zero"))
+        self.pragma_num_steps(1)
+
+    def trace(self, d):
+        self.add(self.zero, d)
+
+
+def test_zero_coefficient():
+    assert values(ZeroCircuit().gen_witness(2).step_instances[0])["c"] == pow(
+        2, -1, SCALAR_MODULUS
+    )
+    with pytest.raises(ValueError, match="coefficient"):
+        ZeroCircuit().gen_witness(0)
+
+
+class Fallback(StepType):
+    def setup(self):
+        self.c = self.internal("c")
+        self.d = self.internal("d")
+        self.e = self.internal("e")
+        self.f = self.internal("f")
+        self.pragma_solve_witness()
+        self.constr(eq(self.c * self.d, self.f))
+        self.constr(eq(self.c + self.e, 5))
+
+    def wg(self, args):
+        (d, e, f) = args
+        self.assign(self.d, F(d))
+        self.assign(self.e, F(e))
+        self.assign(self.f, F(f))
+
+
+class FallbackCircuit(Circuit):
+    def setup(self):
+        self.fallback = self.step_type(Fallback(self, "fallback"))
+        self.pragma_num_steps(3)
+
+    def trace(self, rows):
+        for row in rows:
+            self.add(self.fallback, row)
+
+
+def test_zero_coefficient_fallback():
+    witness = FallbackCircuit().gen_witness([(2, 1, 8), (0, 2, 0), (3, 2, 9)])
+    assert [values(s)["c"] for s in witness.step_instances] == [4, 3, 3]
@@ -0,0 +1,80 @@
+import os
+
+from chiquito.util import F
+from chiquito.witness_cache import WitnessCache
+
+from circuits import Accumulator, Fibonacci
+
+
+def assignments(witness):
+    return [
+        (
+            step_instance.step_type_uuid,
+            {lhs.uuid(): F(rhs).n for lhs, rhs in step_instance.assignments.items()},
+        )
+        for step_instance in witness.step_instances
+    ]
+
+
+def test_hit(tmp_path):
+    cache = WitnessCache(str(tmp_path))
+    circuit = Fibonacci()
+    assert cache.get(circuit, 7) is None
+    witness = circuit.gen_witness(7, cache=cache)
+    assert cache.stats.writes == 1
+    # A new `setup` run gives new ids, entries are resolved by position in the AST.
+    other = Fibonacci()
+    cached = other.gen_witness(7, cache=cache)
+    assert cache.stats.hits == 1
+    assert assignments(cached) == assignments(other.gen_witness(7))
+    assert len(assignments(cached)) == len(assignments(witness))
+
+
+def test_args_and_namespace(tmp_path):
+    cache = WitnessCache(str(tmp_path))
+    circuit = Fibonacci()
+    circuit.gen_witness(7, cache=cache)
+    assert cache.get(circuit, 8) is None
+    assert WitnessCache(str(tmp_path), namespace="v2").get(circuit, 7) is None
+
+
+def test_corrupt_entry(tmp_path):
+    cache = WitnessCache(str(tmp_path))
+    circuit = Fibonacci()
+    circuit.gen_witness(7, cache=cache)
+    path = cache.path(cache.key(circuit, 7))
+    with open(path, "wb") as f:
+        f.write(b"not zlib")
+    assert cache.get(circuit, 7) is None
+    assert cache.stats.misses == 2
+    assert not os.path.exists(path)
+
+
+def test_eviction(tmp_path):
+    cache = WitnessCache(str(tmp_path))
+    circuit = Fibonacci()
+    circuit.gen_witness(1, cache=cache)
+    os.utime(cache.path(cache.key(circuit, 1)), (1, 1))
+    entry_size = cache.size()
+
+    # Room for two entries, the least recently used are removed first.
+    cache.max_bytes = entry_size * 5 // 2
+    for n in range(2, 5):
+        circuit.gen_witness(n, cache=cache)
+        os.utime(cache.path(cache.key(circuit, n)), (n, n))
+    assert cache.stats.evictions == 2
+    assert cache.size() <= cache.max_bytes
+    assert cache.get(circuit, 1) is None
+    assert cache.get(circuit, 4) is not None
+
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_skips_deferred(tmp_path):
+    cache = WitnessCache(str(tmp_path))
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3], cache=cache)
+    assert witness.has_deferred()
+    assert cache.stats.writes == 0
+    assert cache.size() == 0
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from chiquito.util import F
+from chiquito.wit_gen import StepInstance, TraceWitness
+from chiquito.witness_encoding import (
+    compress_witness,
+    decode_column,
+    decode_values,
+    encode_column,
+    limbs,
+)
+
+from circuits import Accumulator, Fibonacci
+
+
+@pytest.mark.parametrize(
+    "values, encoding",
+    [
+        ([7] * 8, "Constant"),
+        ([1] * 4 + [2] * 4, "RunLength"),
+        ([1, 2, 3, None], "SmallInt"),
+        ([2**100, 2**101] * 4, "Dictionary"),
+        ([2**100 + i for i in range(4)], "Raw"),
+    ],
+)
+def test_column_round_trip(values, encoding):
+    column = encode_column(values, limbs)
+    assert list(column) == [encoding]
+    assert decode_values(column, len(values)) == [
+        None if value is None else F(value) for value in values
+    ]
+
+
+def test_unknown_column():
+    with pytest.raises(ValueError, match="Unknown column encoding"):
+        decode_column({"Delta": [1, 2]}, 2)
+
+
+def test_compressed_round_trip():
+    witness = Fibonacci().gen_witness(7)
+    encoded = json.loads(witness.compress().json)
+    num_steps = encoded["num_steps"]
+    assert num_steps == len(witness.step_instances)
+    assert decode_column(encoded["step_types"], num_steps) == [
+        step_instance.step_type_uuid for step_instance in witness.step_instances
+    ]
+    for signal_id, column in encoded["signals"]:
+        assert decode_values(column, num_steps) == [
+            next(
+                (
+                    F(rhs)
+                    for lhs, rhs in step_instance.assignments.items()
+                    if lhs.uuid() == signal_id
+                ),
+                None,
+            )
+            for step_instance in witness.step_instances
+        ]
+
+
+def test_smaller_than_json():
+    witness = Fibonacci().gen_witness(7)
+    assert len(compress_witness(witness)) < len(witness.get_witness_json())
+
+
+def test_rejects_later_rows():
+    circuit = Fibonacci()
+    witness = TraceWitness(
+        [StepInstance(circuit.fibo_step.step_type.id, {circuit.a.next(): F(1)})]
+    )
+    with pytest.raises(ValueError, match="later row"):
+        witness.compress()
+
+
+def test_rejects_deferred():
+    with pytest.raises(ValueError, match="deferred"):
+        Accumulator().gen_witness([1, 2, 3]).compress()
@@ -0,0 +1,78 @@
+import struct
+
+import pytest
+
+from chiquito.util import F
+from chiquito.wit_gen import StepInstance
+from chiquito.witness_file import HEADER, WitnessFile, WitnessFileWriter
+
+from circuits import Accumulator, Fibonacci
+
+
+def assignments(witness):
+    return [
+        (
+            step_instance.step_type_uuid,
+            {lhs.uuid(): F(rhs).n for lhs, rhs in step_instance.assignments.items()},
+        )
+        for step_instance in witness.step_instances
+    ]
+
+
+def test_round_trip(tmp_path):
+    circuit = Fibonacci()
+    witness = circuit.gen_witness(7)
+    with circuit.gen_witness_file(7, tmp_path / "fibo.witness") as witness_file:
+        assert len(witness_file) == len(witness.step_instances)
+        assert witness_file.circuit_id == circuit.ast.id
+        assert assignments(witness_file.to_trace_witness(circuit.ast)) == assignments(
+            witness
+        )
+
+
+def test_header(tmp_path):
+    circuit = Fibonacci()
+    path = tmp_path / "fibo.witness"
+    circuit.gen_witness_file(3, path).close()
+    with open(path, "rb") as f:
+        (magic, version, _, signals, capacity, num_steps, circuit_id) = HEADER.unpack(
+            f.read(HEADER.size)
+        )
+    assert (magic, version, capacity, num_steps) == (b"CHQWITNS", 1, 10, 10)
+    assert signals == 3 + 2
+    assert int.from_bytes(circuit_id, "little") == circuit.ast.id
+
+
+def test_other_circuit(tmp_path):
+    path = tmp_path / "fibo.witness"
+    Fibonacci().gen_witness_file(3, path).close()
+    with WitnessFile(path) as witness_file:
+        with pytest.raises(ValueError, match="was written for circuit"):
+            witness_file.step_instance(0, Fibonacci().ast)
+
+
+def test_not_a_witness_file(tmp_path):
+    path = tmp_path / "other.witness"
+    path.write_bytes(struct.pack("<8s56x", b"OTHERFMT"))
+    with pytest.raises(ValueError, match="not a chiquito witness file"):
+        WitnessFile(path)
+
+
+def test_rejects_later_rows(tmp_path):
+    circuit = Fibonacci()
+    step_instance = StepInstance(
+        circuit.fibo_step.step_type.id, {circuit.a.next(): F(1)}
+    )
+    with WitnessFileWriter(tmp_path / "fibo.witness", circuit.ast) as writer:
+        with pytest.raises(ValueError, match="cannot be assigned in a witness file"):
+            writer.append(step_instance)
+
+
+def test_rejects_deferred(tmp_path):
+    circuit = Accumulator()
+    witness = circuit.gen_witness([1, 2, 3])
+    with WitnessFileWriter(tmp_path / "acc.witness", circuit.ast) as writer:
+        with pytest.raises(ValueError, match="deferred"):
+            writer.extend(witness.step_instances)
+        writer.extend(witness.resolve([F(10)]).step_instances)
+        assert len(writer) == 3